@@ -0,0 +1,133 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+from typing import Iterator, List, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+
+from .history import Sample
+from .logs import fmt_duration
+from .runserver.memory import fmt_bytes
+from .runserver.smoke import Target, parse_targets
+from .runserver.stats import Histogram
+
+__all__ = ("Bench", "BenchResult", "parse_targets")
+
+# Width of the longest bar in the latency histogram.
+BAR_WIDTH = 40
+
+
+class BenchResult:
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.errors: Counter[str] = Counter()
+        self.statuses: Counter[int] = Counter()
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def add(self, duration: float, status: Optional[int], size: int, error: Optional[str]) -> None:
+        self.latency.add(duration, error is not None)
+        if status is not None:
+            self.statuses[status] += 1
+        if error is not None:
+            self.errors[error] += 1
+        self.bytes += size
+
+    def samples(self, name: str) -> List[Sample]:
+        """Samples to record to the performance history, see ``History.record``."""
+        lat = self.latency
+        samples: List[Sample] = [
+            (name, "requests", lat.count), (name, "errors", lat.errors), (name, "bytes", self.bytes)]
+        if lat.count:
+            samples += [(name, "rps", lat.count / self.elapsed), (name, "p50", lat.percentile(50)),
+                        (name, "p95", lat.percentile(95)), (name, "p99", lat.percentile(99)), (name, "max", lat.max)]
+        return samples
+
+    def report(self) -> str:
+        lat = self.latency
+        if not lat.count:
+            return "no requests completed in {:0.1f}s".format(self.elapsed)
+        lines = [
+            "{} requests in {:0.1f}s, {:0.1f} requests/s, {} received ({}/s)".format(
+                lat.count, self.elapsed, lat.count / self.elapsed, fmt_bytes(self.bytes),
+                fmt_bytes(self.bytes / self.elapsed)),
+            "latency: mean {}, p50 {}, p90 {}, p99 {}, max {}".format(
+                fmt_duration(lat.total / lat.count), fmt_duration(lat.percentile(50)),
+                fmt_duration(lat.percentile(90)), fmt_duration(lat.percentile(99)), fmt_duration(lat.max)),
+        ]
+        counts = lat.counts(per_doubling=1)
+        largest = max(count for _, count in counts)
+        for upper, count in counts:
+            lines.append("  ≤{:>9} {:<{w}} {:>7} {:>5.1f}%".format(
+                fmt_duration(upper), "█" * max(1, round(count / largest * BAR_WIDTH)), count,
+                count / lat.count * 100, w=BAR_WIDTH))
+        lines.append("status codes: " + ", ".join("{} ×{}".format(s, n) for s, n in sorted(self.statuses.items())))
+        if self.errors:
+            lines.append("errors: {} ({:0.1f}%)".format(lat.errors, lat.errors / lat.count * 100))
+            lines += ["  {} ×{}".format(error, n) for error, n in self.errors.most_common()]
+        return "\n".join(lines)
+
+
+class Bench:
+    """
+    Send requests from ``concurrency`` workers sharing one pool of keep-alive connections.
+
+    Each worker sends its next request as soon as its last one completes, unless ``rate`` limits the requests sent
+    per second across all workers. Requests started during ``warmup`` aren't included in the results.
+    """
+
+    def __init__(self, targets: List[Target], concurrency: int = 10, duration: float = 10, rate: Optional[float] = None,
+                 warmup: float = 1, timeout: float = 10):
+        self.targets = targets
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.warmup = warmup
+        self.timeout = timeout
+        self.result = BenchResult()
+        self._next_target: Iterator[Target] = itertools.cycle(targets)
+        self._next_slot = 0.0
+        self._measure_from = 0.0
+        self._end = 0.0
+
+    async def run(self) -> BenchResult:
+        start = time.perf_counter()
+        self._next_slot = start
+        self._measure_from = start + self.warmup
+        self._end = self._measure_from + self.duration
+        connector = TCPConnector(limit=self.concurrency, limit_per_host=0)
+        async with ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout)) as session:
+            await asyncio.gather(*(self._worker(session) for _ in range(self.concurrency)))
+        self.result.elapsed = time.perf_counter() - self._measure_from
+        return self.result
+
+    async def _wait_for_slot(self) -> None:
+        if self.rate is None:
+            return
+        now = time.perf_counter()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self, session: ClientSession) -> None:
+        while True:
+            await self._wait_for_slot()
+            start = time.perf_counter()
+            if start >= self._end:
+                return
+            method, url = next(self._next_target)
+            status = None
+            size = 0
+            error = None
+            try:
+                async with session.request(method, url, allow_redirects=False) as r:
+                    status = r.status
+                    size = len(await r.read())
+                if status >= 400:
+                    error = "{} {}".format(status, r.reason)
+            except (ClientError, asyncio.TimeoutError, OSError) as e:
+                error = "{}: {}".format(type(e).__name__, e) if str(e) else type(e).__name__
+            if start >= self._measure_from:
+                self.result.add(time.perf_counter() - start, status, size, error)
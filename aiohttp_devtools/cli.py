@@ -1,13 +1,19 @@
+import asyncio
 import sys
+import time
 import traceback
-from typing import Any
+from typing import Any, Optional, TextIO, Tuple
 
 import click
 from aiohttp.web import run_app
+from yarl import URL
 
 from . import __version__
+from .bench import Bench, parse_targets
 from .exceptions import AiohttpDevException
+from .history import HISTORY_FILE, History, fmt_diff, fmt_trends
 from .logs import main_logger, setup_logging
+from .replay import Replay, load_recording, report
 from .runserver import INFER_HOST
 from .runserver import runserver as _runserver
 from .runserver import serve_static
@@ -15,6 +21,8 @@ from .runserver import serve_static
 _dir_existing = click.Path(exists=True, dir_okay=True, file_okay=False)
 _file_dir_existing = click.Path(exists=True, dir_okay=True, file_okay=True)
 _dir_may_exist = click.Path(dir_okay=True, file_okay=False, writable=True, resolve_path=True)
+_file_existing = click.Path(exists=True, dir_okay=False, file_okay=True)
+_file_writable = click.Path(dir_okay=False, file_okay=True, writable=True, resolve_path=True)
 
 
 @click.group()
@@ -29,6 +37,10 @@ livereload_help = ('Whether to inject livereload.js into html page footers to au
 browser_cache_help = ("When disabled (the default), sends no-cache headers to "
                       "disable browser caching.")
 bind_address_help = "Network address to listen, default localhost. env variable: AIO_BIND_ADDRESS"
+queue_logs_help = ("Write log output from a separate thread so a slow terminal can't hold up requests, "
+                   "messages are dropped if output can't keep up. env variable: AIO_QUEUE_LOGS")
+log_ndjson_help = ("Append requests, restarts, reloads and file changes to this file as newline delimited JSON with "
+                   "monotonic timestamps. env variable: AIO_LOG_NDJSON")
 
 
 @cli.command()
@@ -39,11 +51,14 @@ bind_address_help = "Network address to listen, default localhost. env variable:
 @click.option('-v', '--verbose', is_flag=True, help=verbose_help)
 @click.option("--browser-cache/--no-browser-cache", envvar="AIO_BROWSER_CACHE", default=False,
               help=browser_cache_help)
-def serve(path: str, livereload: bool, bind_address: str, port: int, verbose: bool, browser_cache: bool) -> None:
+@click.option("--queue-logs/--no-queue-logs", envvar="AIO_QUEUE_LOGS", default=False, help=queue_logs_help)
+@click.option("--log-ndjson", envvar="AIO_LOG_NDJSON", type=_file_writable, help=log_ndjson_help)
+def serve(path: str, livereload: bool, bind_address: str, port: int, verbose: bool, browser_cache: bool,
+          queue_logs: bool, log_ndjson: Optional[str]) -> None:
     """
     Serve static files from a directory.
     """
-    setup_logging(verbose)
+    setup_logging(verbose, queue_logs, log_ndjson)
     run_app(**serve_static(static_path=path, livereload=livereload, bind_address=bind_address, port=port,
                            browser_cache=browser_cache))
 
@@ -64,6 +79,41 @@ app_factory_help = ('name of the app factory to create an aiohttp.web.Applicatio
                     'or just an instance of aiohttp.Application. env variable AIO_APP_FACTORY')
 port_help = 'Port to serve app from, default 8000. env variable: AIO_PORT'
 aux_port_help = 'Port to serve auxiliary app (reload and static) on, default port + 1. env variable: AIO_AUX_PORT'
+fingerprint_static_help = ("Add a hash of each file's contents to urls built by aiohttp-jinja2's static() so static "
+                           "files can be cached by the browser until they change. env variable: AIO_FINGERPRINT_STATIC")
+bench_mode_help = ("Serve the app as it would be in production: no debug mode, livereload injection, "
+                   "no-cache headers, access logs or runtime stats. File watching and restarts still work. "
+                   "env variable: AIO_BENCH_MODE")
+log_sample_help = ("Only log 1 in every N requests to the terminal, errors and slow requests are always logged. "
+                   "--log-ndjson still gets every request. env variable: AIO_LOG_SAMPLE")
+log_slow_help = ("Requests taking at least this many milliseconds are always logged when sampling, default 500. "
+                 "env variable: AIO_LOG_SLOW")
+collapse_logs_help = ('Log identical consecutive requests to the terminal once, followed by a "×N" summary line. '
+                      "env variable: AIO_COLLAPSE_LOGS")
+profile_requests_help = ("Profile requests with an X-Adev-Profile header or _profile query parameter, saving "
+                         "cProfile stats and flamegraph stacks viewable at /_devtools/profiles/. "
+                         "env variable: AIO_PROFILE_REQUESTS")
+loop_lag_threshold_help = ("Report when the app's event loop is blocked for more than this many milliseconds, "
+                           "with the blocking code's stack and the request being handled. "
+                           "env variable: AIO_LOOP_LAG_THRESHOLD")
+trace_memory_help = ("Trace memory allocations with tracemalloc, top allocation sites and how they've changed are "
+                     "shown at /_devtools/memory/snapshot and /_devtools/memory/diff, memory use is logged on each "
+                     "restart. env variable: AIO_TRACE_MEMORY")
+time_hooks_help = ("Time the app's on_startup, cleanup_ctx, on_shutdown and on_cleanup callbacks, the slowest are "
+                   "logged after startup and shutdown, not available with --bench-mode. env variable: AIO_TIME_HOOKS")
+smoke_routes_help = ("File of urls to time after each restart, one per line, optionally prefixed with a method, eg. "
+                     '"POST /login". A warning is logged for routes which have got slower. '
+                     "env variable: AIO_SMOKE_ROUTES")
+smoke_threshold_help = ("Percentage slower than the previous build a smoke benchmark route must be to be reported, "
+                        "default 50. env variable: AIO_SMOKE_THRESHOLD")
+history_help = ("Record restart timings, smoke benchmark and per-route latencies to this SQLite file, keyed by git "
+                'commit, see "adev history". env variable: AIO_HISTORY')
+record_traffic_help = ('Append the requests the app handles to this file, so they can be replayed with "adev replay". '
+                       "env variable: AIO_RECORD_TRAFFIC")
+har_help = ("Keep the last requests to the app and aux server, with headers, sizes and timings, and write them to this "
+            "HTTP Archive (HAR) file when /_devtools/har is requested, not available with --bench-mode. "
+            "env variable: AIO_HAR")
+har_entries_help = "Number of requests kept for the HAR file, default 1000. env variable: AIO_HAR_ENTRIES"
 ssl_context_factory_help = ("name of the ssl context factory to create ssl.SSLContext with. "
                             "env variable: AIO_SSL_CONTEXT_FACTORY")
 ssl_rootcert_file_help = ("path to a rootCA certificate file for self-signed cert chain (if needed). "
@@ -87,6 +137,26 @@ ssl_rootcert_file_help = ("path to a rootCA certificate file for self-signed cer
 @click.option('-v', '--verbose', is_flag=True, help=verbose_help)
 @click.option("--browser-cache/--no-browser-cache", envvar="AIO_BROWSER_CACHE", default=None,
               help=browser_cache_help)
+@click.option("--fingerprint-static/--no-fingerprint-static", envvar="AIO_FINGERPRINT_STATIC", default=None,
+              help=fingerprint_static_help)
+@click.option("--bench-mode/--no-bench-mode", envvar="AIO_BENCH_MODE", default=None, help=bench_mode_help)
+@click.option("--queue-logs/--no-queue-logs", envvar="AIO_QUEUE_LOGS", default=None, help=queue_logs_help)
+@click.option("--log-ndjson", envvar="AIO_LOG_NDJSON", type=_file_writable, help=log_ndjson_help)
+@click.option("--log-sample", envvar="AIO_LOG_SAMPLE", type=click.IntRange(min=1), help=log_sample_help)
+@click.option("--log-slow", envvar="AIO_LOG_SLOW", type=click.IntRange(min=0), help=log_slow_help)
+@click.option("--collapse-logs/--no-collapse-logs", envvar="AIO_COLLAPSE_LOGS", default=None, help=collapse_logs_help)
+@click.option("--profile-requests/--no-profile-requests", envvar="AIO_PROFILE_REQUESTS", default=None,
+              help=profile_requests_help)
+@click.option("--loop-lag-threshold", envvar="AIO_LOOP_LAG_THRESHOLD", type=click.IntRange(min=1),
+              help=loop_lag_threshold_help)
+@click.option("--trace-memory/--no-trace-memory", envvar="AIO_TRACE_MEMORY", default=None, help=trace_memory_help)
+@click.option("--time-hooks/--no-time-hooks", envvar="AIO_TIME_HOOKS", default=None, help=time_hooks_help)
+@click.option("--smoke-routes", envvar="AIO_SMOKE_ROUTES", type=_file_existing, help=smoke_routes_help)
+@click.option("--smoke-threshold", envvar="AIO_SMOKE_THRESHOLD", type=click.IntRange(min=1), help=smoke_threshold_help)
+@click.option("--history", envvar="AIO_HISTORY", type=_file_writable, help=history_help)
+@click.option("--record-traffic", envvar="AIO_RECORD_TRAFFIC", type=_file_writable, help=record_traffic_help)
+@click.option("--har", envvar="AIO_HAR", type=_file_writable, help=har_help)
+@click.option("--har-entries", envvar="AIO_HAR_ENTRIES", type=click.IntRange(min=1), help=har_entries_help)
 @click.option("--ssl-context-factory", "ssl_context_factory_name", envvar="AIO_SSL_CONTEXT_FACTORY", default=None,
               help=ssl_context_factory_help)
 @click.option("--ssl-rootcert", "ssl_rootcert_file_path", envvar="AIO_SSL_ROOTCERT", default=None,
@@ -103,7 +173,7 @@ def runserver(**config: Any) -> None:
     module.
     """
     active_config = {k: v for k, v in config.items() if v is not None}
-    setup_logging(config['verbose'])
+    setup_logging(config["verbose"], bool(config["queue_logs"]), config["log_ndjson"])
     # Rewrite argv for the application.
     sys.argv[1:] = active_config.pop('project_args')
     try:
@@ -114,3 +184,140 @@ def runserver(**config: Any) -> None:
             main_logger.warning('AiohttpDevException traceback:\n%s', tb)
         main_logger.error('Error: %s', e)
         sys.exit(2)
+
+
+routes_help = ('File of urls to request, one per line, optionally prefixed with a method, eg. "POST /login". '
+               "Lines starting with # are ignored.")
+base_url_help = 'Url paths starting with "/" are relative to, default "http://localhost:8000".'
+concurrency_help = "Number of requests in flight at once, each uses a connection from a shared keep-alive pool."
+duration_help = "Seconds to send requests for after the warmup."
+rate_help = "Maximum requests per second across all connections, default unlimited."
+warmup_help = "Seconds to send requests for before recording results, so the app and connections are warmed up."
+timeout_help = "Seconds before a request is counted as an error."
+bench_history_help = ('Record the results to this SQLite file, keyed by git commit, see "adev history". '
+                      "env variable: AIO_HISTORY")
+
+
+@cli.command()
+@click.argument("urls", nargs=-1)
+@click.option("-r", "--routes", "routes_file", type=click.File(), help=routes_help)
+@click.option("--base-url", default="http://localhost:8000", help=base_url_help)
+@click.option("-c", "--concurrency", default=10, type=click.IntRange(min=1), help=concurrency_help)
+@click.option("-d", "--duration", default=10.0, type=click.FloatRange(min=0, min_open=True), help=duration_help)
+@click.option("--rate", type=click.FloatRange(min=0, min_open=True), help=rate_help)
+@click.option("-w", "--warmup", default=1.0, type=click.FloatRange(min=0), help=warmup_help)
+@click.option("--timeout", default=10.0, type=click.FloatRange(min=0, min_open=True), help=timeout_help)
+@click.option("--history", "history_file", envvar="AIO_HISTORY", type=_file_writable, help=bench_history_help)
+def bench(urls: Tuple[str, ...], routes_file: Optional[TextIO], base_url: str, concurrency: int, duration: float,
+          rate: Optional[float], warmup: float, timeout: float, history_file: Optional[str]) -> None:
+    """
+    Send load to an app, eg. one running with "adev runserver", and report its performance.
+
+    Takes any number of urls or paths to request in turn, eg. "adev bench / /api/users".
+    Reports throughput, a histogram of latencies, status codes, errors and the bytes received.
+    """
+    setup_logging(False)
+    try:
+        targets = parse_targets(urls, routes_file, base_url)
+    except AiohttpDevException as e:
+        main_logger.error("Error: %s", e)
+        sys.exit(2)
+    main_logger.info("sending requests to %d url%s from %d connections for %0.1fs after %0.1fs warmup...",
+                     len(targets), "" if len(targets) == 1 else "s", concurrency, duration, warmup)
+    runner = Bench(targets, concurrency=concurrency, duration=duration, rate=rate, warmup=warmup, timeout=timeout)
+    result = asyncio.run(runner.run())
+    click.echo(result.report())
+    if history_file:
+        name = ", ".join("{} {}".format(method, URL(url).path_qs) for method, url in targets)
+        History(history_file).record("bench", result.samples(name))
+    if not result.latency.count or result.latency.errors == result.latency.count:
+        sys.exit(1)
+
+
+replay_base_url_help = 'Server to send the requests to, default "http://localhost:8000".'
+fast_help = "Send each request as soon as the previous one completes, rather than with the original timing."
+max_gap_help = "Longest pause in seconds between requests when replaying with the original timing, default 5."
+
+
+@cli.command()
+@click.argument("recording", type=click.File())
+@click.option("--base-url", default="http://localhost:8000", help=replay_base_url_help)
+@click.option("--fast", is_flag=True, help=fast_help)
+@click.option("--max-gap", default=5.0, type=click.FloatRange(min=0), help=max_gap_help)
+@click.option("--timeout", default=10.0, type=click.FloatRange(min=0, min_open=True), help=timeout_help)
+def replay(recording: TextIO, base_url: str, fast: bool, max_gap: float, timeout: float) -> None:
+    """
+    Replay requests recorded by "adev runserver --record-traffic" and compare their latencies with the recording.
+
+    Takes the file requests were recorded to. Recorded latencies are measured in the app while replayed latencies
+    also include the client and connection, so differences of a fraction of a millisecond aren't meaningful.
+    """
+    setup_logging(False)
+    try:
+        requests = load_recording(recording)
+    except AiohttpDevException as e:
+        main_logger.error("Error: %s", e)
+        sys.exit(2)
+    main_logger.info("replaying %d request%s %s...", len(requests), "" if len(requests) == 1 else "s",
+                     "as fast as possible" if fast else "with the original timing")
+    runner = Replay(requests, base_url, fast=fast, max_gap=max_gap, timeout=timeout)
+    start = time.perf_counter()
+    results = asyncio.run(runner.run())
+    click.echo(report(results, time.perf_counter() - start))
+    if all(r.error is not None for r in results):
+        sys.exit(1)
+
+
+history_file_help = ('SQLite file recorded to with "--history", default "{}". '
+                     "env variable: AIO_HISTORY").format(HISTORY_FILE)
+source_help = 'Only show samples from this source: "bench", "smoke", "routes", "startup" or "shutdown".'
+name_help = 'Only show series with this name, eg. a route, "*" matches any characters, eg. "GET /users/*".'
+metric_help = 'Only show this metric, eg. "p95", "rps" or "duration".'
+commits_help = "Number of commits to show for each series, default 10."
+
+
+@cli.group()
+@click.option("-f", "--file", "history_file", envvar="AIO_HISTORY", default=HISTORY_FILE, type=_file_existing,
+              help=history_file_help)
+@click.pass_context
+def history(ctx: click.Context, history_file: str) -> None:
+    """
+    Query the performance history recorded by "adev runserver --history" and "adev bench --history".
+    """
+    ctx.obj = History(history_file)
+
+
+@history.command()
+@click.option("--source", help=source_help)
+@click.option("--name", help=name_help)
+@click.option("--metric", help=metric_help)
+@click.option("-n", "--commits", default=10, type=click.IntRange(min=1), help=commits_help)
+@click.pass_obj
+def trend(obj: History, source: Optional[str], name: Optional[str], metric: Optional[str], commits: int) -> None:
+    """
+    Show how each series has changed over the last commits it was recorded for, oldest first.
+
+    Commits with uncommitted changes are marked with "+", values are the mean of the samples recorded for each commit.
+    """
+    click.echo(fmt_trends(obj.trends(source, name, metric, commits)))
+
+
+@history.command()
+@click.argument("commit_a")
+@click.argument("commit_b")
+@click.option("--source", help=source_help)
+@click.option("--name", help=name_help)
+@click.option("--metric", help=metric_help)
+@click.pass_obj
+def diff(obj: History, commit_a: str, commit_b: str, source: Optional[str], name: Optional[str],
+         metric: Optional[str]) -> None:
+    """
+    Compare each series recorded for two commits, largest increase first.
+
+    Commits may be abbreviated, eg. "adev history diff 1a2b3c4 5d6e7f8".
+    """
+    try:
+        rows = obj.diff(commit_a, commit_b, source, name, metric)
+    except AiohttpDevException as e:
+        raise click.ClickException(str(e))
+    click.echo(fmt_diff(rows, commit_a, commit_b))
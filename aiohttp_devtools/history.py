@@ -0,0 +1,193 @@
+import asyncio
+import sqlite3
+import subprocess
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .exceptions import AiohttpDevException
+from .logs import fmt_duration
+
+# Default file for "adev history", use the same path with "--history" to record to it.
+HISTORY_FILE = ".adev-history.sqlite3"
+# Metrics which are durations in seconds, others are counts or rates.
+DURATION_METRICS = {"p50", "p95", "p99", "max", "mean", "median", "duration"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    git_commit TEXT,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_series ON samples (source, name, metric, ts);
+CREATE INDEX IF NOT EXISTS samples_commit ON samples (git_commit);
+"""
+
+Sample = Tuple[str, str, float]
+
+
+class Series(NamedTuple):
+    source: str
+    name: str
+    metric: str
+
+
+def git_commit(path: Union[Path, str]) -> Tuple[Optional[str], bool]:
+    """
+    :return: hash of the commit checked out in the repo containing ``path`` and whether there are uncommitted
+      changes, or (None, False) if it isn't in a git repo
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+class History:
+    """
+    Performance history stored in a local SQLite file, each sample is keyed by the git commit and time it was
+    recorded at so trends can be followed and commits compared with "adev history".
+
+    Samples belong to a series identified by source (eg. "bench", "routes"), name (eg. a route) and metric
+    (eg. "p95"). Samples are recorded against ``commit``, if it's not set the commit is looked up each time
+    samples are recorded. The dev server sets it with ``update_commit()`` before each start of the app, since
+    it can change during a session, so the app process doesn't have to run git itself.
+    """
+
+    def __init__(self, path: Union[Path, str], root_path: Union[Path, str] = "."):
+        self.path = Path(path)
+        self.root_path = root_path
+        self.commit: Optional[Tuple[Optional[str], bool]] = None
+
+    def update_commit(self) -> None:
+        self.commit = git_commit(self.root_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # the app process and adev's main process may both write, so wait rather than fail if it's locked
+        conn = sqlite3.connect(str(self.path), timeout=5)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def record(self, source: str, samples: Iterable[Sample]) -> None:
+        """:param samples: (name, metric, value) of each sample"""
+        samples = list(samples)
+        if not samples:
+            return
+        commit, dirty = self.commit if self.commit is not None else git_commit(self.root_path)
+        ts = time.time()
+        rows = [(ts, commit, dirty, source, name, metric, value) for name, metric, value in samples]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT INTO samples (ts, git_commit, dirty, source, name, metric, value) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    async def record_async(self, source: str, samples: Iterable[Sample]) -> None:
+        """Record samples from a thread, so the event loop isn't blocked by git or writing to the file."""
+        await asyncio.get_running_loop().run_in_executor(None, self.record, source, list(samples))
+
+    def _where(self, source: Optional[str], name: Optional[str], metric: Optional[str]) -> Tuple[str, List[str]]:
+        clauses, params = ["1"], []
+        for column, value in (("source", source), ("name", name), ("metric", metric)):
+            if value is not None:
+                # names can contain "*" to match any characters, eg. "GET /users/*"
+                clauses.append("{} GLOB ?".format(column))
+                params.append(value)
+        return " AND ".join(clauses), params
+
+    def trends(self, source: Optional[str] = None, name: Optional[str] = None, metric: Optional[str] = None,
+               commits: int = 10) -> Dict[Series, List[Tuple[str, float]]]:
+        """
+        :return: the mean value of each matching series for each of the last ``commits`` commits it was recorded
+          for, oldest first
+        """
+        where, params = self._where(source, name, metric)
+        query = (
+            "SELECT source, name, metric, git_commit, MAX(dirty), AVG(value), MIN(ts) FROM samples WHERE {} "
+            "GROUP BY source, name, metric, git_commit ORDER BY source, name, metric, MIN(ts)"
+        ).format(where)
+        trends: Dict[Series, List[Tuple[str, float]]] = {}
+        with closing(self._connect()) as conn:
+            for source_, name_, metric_, commit, dirty, value, _ in conn.execute(query, params):
+                trends.setdefault(Series(source_, name_, metric_), []).append((fmt_commit(commit, dirty), value))
+        return {series: values[-commits:] for series, values in trends.items()}
+
+    def diff(self, commit_a: str, commit_b: str, source: Optional[str] = None, name: Optional[str] = None,
+             metric: Optional[str] = None) -> List[Tuple[Series, float, float]]:
+        """
+        Compare the mean of each series recorded for both commits, commits may be abbreviated.
+
+        :return: (series, value for commit_a, value for commit_b) of each series, largest increase first
+        """
+        where, params = self._where(source, name, metric)
+        query = (
+            "SELECT source, name, metric, AVG(value) FROM samples WHERE git_commit = ? AND {} "
+            "GROUP BY source, name, metric"
+        ).format(where)
+        with closing(self._connect()) as conn:
+            values = [
+                {Series(*row[:3]): row[3] for row in conn.execute(query, [self._resolve(conn, commit)] + params)}
+                for commit in (commit_a, commit_b)
+            ]
+        a, b = values
+        rows = [(series, a[series], b[series]) for series in a.keys() & b.keys()]
+        return sorted(rows, key=lambda r: _change(r[1], r[2]), reverse=True)
+
+    def _resolve(self, conn: sqlite3.Connection, commit: str) -> str:
+        """Find the recorded commit an abbreviated commit refers to, so samples of different commits aren't mixed."""
+        matches = [row[0] for row in conn.execute(
+            "SELECT DISTINCT git_commit FROM samples WHERE substr(git_commit, 1, ?) = ? ORDER BY git_commit",
+            (len(commit), commit))]
+        if len(matches) > 1:
+            raise AiohttpDevException("commit '{}' is ambiguous, it could be: {}".format(
+                commit, ", ".join(matches)))
+        return matches[0] if matches else commit
+
+
+def _change(before: float, after: float) -> float:
+    if before == 0:
+        return 0 if after == 0 else float("inf")
+    return after / before - 1
+
+
+def fmt_commit(commit: Optional[str], dirty: bool = False) -> str:
+    if commit is None:
+        return "(no git)"
+    return commit[:8] + ("+" if dirty else "")
+
+
+def fmt_value(metric: str, value: float) -> str:
+    if metric in DURATION_METRICS:
+        return fmt_duration(value)
+    return "{:g}".format(round(value, 1))
+
+
+def fmt_trends(trends: Dict[Series, List[Tuple[str, float]]]) -> str:
+    if not trends:
+        return "no samples recorded"
+    lines = []
+    for series, values in trends.items():
+        lines.append("{} {} {}:".format(*series))
+        lines.append("  " + ", ".join("{} {}".format(commit, fmt_value(series.metric, v)) for commit, v in values))
+    return "\n".join(lines)
+
+
+def fmt_diff(rows: List[Tuple[Series, float, float]], commit_a: str, commit_b: str) -> str:
+    if not rows:
+        return "no series recorded for both {} and {}".format(commit_a, commit_b)
+    names = ["{} {} {}".format(*series) for series, _, _ in rows]
+    width = max(len(n) for n in names)
+    lines = ["{:<{w}} {:>10} {:>10} {:>8}".format("series", commit_a[:10], commit_b[:10], "change", w=width)]
+    for name, (series, a, b) in zip(names, rows):
+        change = _change(a, b)
+        lines.append("{:<{w}} {:>10} {:>10} {:>8}".format(
+            name, fmt_value(series.metric, a), fmt_value(series.metric, b),
+            "{:+0.0f}%".format(change * 100) if change != float("inf") else "new", w=width))
+    return "\n".join(lines)
@@ -1,12 +1,18 @@
+import atexit
 import json
 import logging
 import logging.config
+import logging.handlers
 import platform
+import os
+import queue
 import re
+import threading
 import traceback
 from io import StringIO
+from time import monotonic
 from types import TracebackType
-from typing import Dict, Literal, Optional, Tuple, Type, Union
+from typing import Dict, List, Literal, Optional, Sequence, Set, Tuple, Type, TypedDict, Union
 
 import pygments
 from devtools import pformat
@@ -22,6 +28,8 @@ rs_aux_logger = logging.getLogger('adev.server.aux')
 
 tools_logger = logging.getLogger('adev.tools')
 main_logger = logging.getLogger('adev.main')
+# records with an "event" dict, only written to the NDJSON log
+events_logger = logging.getLogger('adev.events')
 
 LOG_FORMATS = {
     logging.DEBUG: sformat.dim,
@@ -31,6 +39,28 @@ LOG_FORMATS = {
 pyg_lexer = Python3TracebackLexer()
 pyg_formatter = Terminal256Formatter(style='vim')
 split_log = re.compile(r'^(\[.*?\])')
+# Maximum number of records waiting to be written when logging via a queue, further records are dropped.
+LOG_QUEUE_SIZE = 10000
+# Maximum time in seconds NDJSON lines are buffered before being written, the log queue's listener flushes its
+# handlers this often.
+NDJSON_FLUSH_INTERVAL = 1.0
+
+
+class AccessFields(TypedDict):
+    """Fields passed as ``record.access`` by the dev server's access loggers."""
+
+    ts: float
+    server: Literal["main", "aux"]
+    time: str
+    prefix: str
+    dim: bool
+    method: str
+    path: str
+    status: int
+    size: int
+    duration: float
+    # number of identical requests a collapsed line summarises, "duration" is then their average
+    repeats: int
 
 
 class DefaultFormatter(logging.Formatter):
@@ -60,20 +90,22 @@ class AccessFormatter(logging.Formatter):
 
     def formatMessage(self, record: logging.LogRecord) -> str:
         msg = super().formatMessage(record)
-        if msg[0] != '{':
+        access: Optional[AccessFields] = getattr(record, "access", None)
+        if access is None:
             return msg
-        # json from AccessLogger
-        obj = json.loads(msg)
         if self.stream_is_tty:
             # in future we can do clever things about colouring the message based on status code
             msg = '{} {} {}'.format(
-                sformat(obj['time'], sformat.magenta),
-                sformat(obj['prefix'], sformat.blue),
-                sformat(obj['msg'], sformat.dim if obj['dim'] else sformat.reset),
+                sformat(access["time"], sformat.magenta),
+                sformat(access["prefix"], sformat.blue),
+                sformat(msg, sformat.dim if access["dim"] else sformat.reset),
             )
         else:
-            msg = '{time} {prefix} {msg}'.format(**obj)
+            msg = "{} {} {}".format(access["time"], access["prefix"], msg)
         details = getattr(record, 'details', None)
+        if callable(details):
+            # rendered lazily by the logger so the work is only done if the record is emitted
+            details = details()
         if details:
             msg = 'details: {}\n{}'.format(pformat(details, highlight=self.stream_is_tty), msg)
         return msg
@@ -89,6 +121,13 @@ class AccessFormatter(logging.Formatter):
         return stack
 
 
+class TerminalFilter(logging.Filter):
+    """Skip access records the access logger sampled out or collapsed, they're only for other handlers."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return bool(getattr(record, "terminal", True))
+
+
 class HighlightStreamHandler(logging.StreamHandler):  # type: ignore[type-arg]
     def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
         stream_is_tty = isatty(self.stream) and platform.system().lower() != "windows"
@@ -123,6 +162,11 @@ def log_config(verbose: bool) -> Dict[str, object]:
                 'class': 'aiohttp_devtools.logs.AccessFormatter',
             },
         },
+        'filters': {
+            'terminal': {
+                '()': 'aiohttp_devtools.logs.TerminalFilter',
+            },
+        },
         'handlers': {
             'default': {
                 'level': log_level,
@@ -137,7 +181,8 @@ def log_config(verbose: bool) -> Dict[str, object]:
             'aiohttp_access': {
                 'level': log_level,
                 'class': 'aiohttp_devtools.logs.HighlightStreamHandler',
-                'formatter': 'aiohttp'
+                'formatter': 'aiohttp',
+                'filters': ['terminal'],
             },
             'aiohttp_server': {
                 'class': 'aiohttp_devtools.logs.HighlightStreamHandler',
@@ -145,6 +190,11 @@ def log_config(verbose: bool) -> Dict[str, object]:
             },
         },
         'loggers': {
+            events_logger.name: {
+                'handlers': [],
+                'level': 'INFO',
+                'propagate': False,
+            },
             rs_dft_logger.name: {
                 'handlers': ['default'],
                 'level': log_level,
@@ -174,6 +224,213 @@ def log_config(verbose: bool) -> Dict[str, object]:
     }
 
 
-def setup_logging(verbose: bool) -> None:
+_QueueItem = Optional[Tuple[Sequence[logging.Handler], logging.LogRecord]]
+
+
+class LogQueue:
+    """
+    Bounded queue of log records, emitted by their handlers in a listener thread.
+
+    Records are dropped rather than blocking the caller when the queue is full, the number dropped is
+    reported via ``report_handlers`` once the listener catches up.
+    """
+
+    def __init__(self, report_handlers: Sequence[logging.Handler], maxsize: int = LOG_QUEUE_SIZE):
+        self.queue: "queue.Queue[_QueueItem]" = queue.Queue(maxsize)
+        self.dropped = 0
+        # handlers records are dispatched to, flushed when the queue is stopped
+        self.handlers: Set[logging.Handler] = set()
+        self._report_handlers = report_handlers
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, handlers: Sequence[logging.Handler], record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait((handlers, record))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="adev-log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write out any queued records and stop the listener thread."""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._flush()
+
+    def _flush(self) -> None:
+        for handler in list(self.handlers):
+            handler.flush()
+
+    def _run(self) -> None:
+        flush_at = monotonic() + NDJSON_FLUSH_INTERVAL
+        while True:
+            try:
+                item = self.queue.get(timeout=max(flush_at - monotonic(), 0))
+            except queue.Empty:
+                pass
+            else:
+                if item is None:
+                    break
+                handlers, record = item
+                for handler in handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+                if self.dropped:
+                    self._report_dropped()
+            # flushed on a timer, so buffered records are written even if nothing else is logged
+            if monotonic() >= flush_at:
+                self._flush()
+                flush_at = monotonic() + NDJSON_FLUSH_INTERVAL
+        self._report_dropped()
+
+    def _report_dropped(self) -> None:
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            record = main_logger.makeRecord(main_logger.name, logging.WARNING, __file__, 0,
+                                            "%d log messages dropped, the terminal isn't keeping up", (dropped,), None)
+            for handler in self._report_handlers:
+                handler.handle(record)
+
+
+class QueueDispatchHandler(logging.handlers.QueueHandler):
+    """Send records to a ``LogQueue`` to be emitted by ``handlers`` in its listener thread."""
+
+    def __init__(self, log_queue: LogQueue, handlers: Sequence[logging.Handler]):
+        super().__init__(log_queue.queue)
+        self.log_queue = log_queue
+        self.handlers = handlers
+        log_queue.handlers.update(handlers)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # merge args now in case they're mutated before the record is written, formatting (including
+        # highlighting and pformat of details) is left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.log_queue.put(self.handlers, record)
+
+
+class NDJSONHandler(logging.Handler):
+    """
+    Write access records and events as newline delimited JSON.
+
+    Lines are buffered and written with a single ``write`` call at most every ``NDJSON_FLUSH_INTERVAL`` seconds,
+    when the next record is handled or by the ``LogQueue`` listener's flush. The file is opened in append mode so
+    the main app's process can write to the same file.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._buffer: List[str] = []
+        self._last_flush = monotonic()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        access: Optional[AccessFields] = getattr(record, "access", None)
+        if access is not None:
+            data: Dict[str, object] = {
+                "ts": access["ts"],
+                "event": "request",
+                "server": access["server"],
+                "method": access["method"],
+                "path": access["path"],
+                "status": access["status"],
+                "bytes": access["size"],
+                "duration_ms": round(access["duration"] * 1000, 3),
+            }
+            if access["repeats"] > 1:
+                # each of the collapsed requests has already been written
+                return
+        else:
+            event = getattr(record, "event", None)
+            if event is None:
+                return
+            data = event
+        try:
+            self._buffer.append(json.dumps(data, default=str) + "\n")
+        except Exception:
+            self.handleError(record)
+            return
+        if monotonic() - self._last_flush >= NDJSON_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = monotonic()
+        if self._buffer and self._fd >= 0:
+            data, self._buffer = "".join(self._buffer), []
+            os.write(self._fd, data.encode())
+
+    def close(self) -> None:
+        with self.lock:  # type: ignore[union-attr]
+            self.flush()
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+        super().close()
+
+
+def fmt_duration(seconds: float) -> str:
+    if seconds < 0.01:
+        return "{:0.2f}ms".format(seconds * 1000)
+    if seconds < 10:
+        return "{:0.0f}ms".format(seconds * 1000)
+    return "{:0.1f}s".format(seconds)
+
+
+def log_event(event: str, **fields: object) -> None:
+    """Record a dev server event, eg. a restart, in the NDJSON log if one is configured."""
+    if events_logger.handlers:
+        events_logger.info(event, extra={"event": {"ts": monotonic(), "event": event, **fields}})
+
+
+_log_queue: Optional[LogQueue] = None
+
+
+def stop_log_queue() -> None:
+    global _log_queue
+    if _log_queue is not None:
+        _log_queue.stop()
+        _log_queue = None
+
+
+def setup_logging(verbose: bool, queue_logs: bool = False, log_ndjson: Optional[str] = None) -> None:
+    """
+    Configure logging for the cli and dev server.
+
+    :param verbose: log at DEBUG level rather than INFO
+    :param queue_logs: write log records from a separate thread so terminal output never blocks the event loop
+    :param log_ndjson: path of a file to append requests and events to as NDJSON, always written from a
+      separate thread
+    """
+    global _log_queue
+    stop_log_queue()
     config = log_config(verbose)
     logging.config.dictConfig(config)
+    if not queue_logs and not log_ndjson:
+        return
+
+    _log_queue = LogQueue(main_logger.handlers)
+    if queue_logs:
+        for name in config["loggers"]:  # type: ignore[attr-defined]
+            logger = logging.getLogger(name)
+            if logger.handlers:
+                logger.handlers = [QueueDispatchHandler(_log_queue, logger.handlers)]
+    if log_ndjson:
+        handlers: List[logging.Handler] = [NDJSONHandler(log_ndjson)]
+        for logger in (logging.getLogger("aiohttp.access"), events_logger):
+            logger.addHandler(QueueDispatchHandler(_log_queue, handlers))
+    _log_queue.start()
+
+
+atexit.register(stop_log_queue)
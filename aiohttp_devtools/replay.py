@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import json
+import statistics
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from yarl import URL
+
+from .exceptions import AiohttpDevException
+from .logs import fmt_duration
+from .runserver.traffic import REPLAY_HEADER
+
+__all__ = ("RecordedRequest", "Replay", "ReplayResult", "load_recording", "report")
+
+
+class RecordedRequest(NamedTuple):
+    ts: float
+    method: str
+    path: str
+    headers: List[List[str]]
+    body: bytes
+    status: int
+    duration: float
+
+
+def load_recording(f: TextIO) -> List[RecordedRequest]:
+    """Read requests recorded by "adev runserver --record-traffic", in the order they were received."""
+    requests = []
+    for n, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            entry: Dict[str, Any] = json.loads(line)
+            if "body64" in entry:
+                body = base64.b64decode(entry["body64"])
+            else:
+                body = entry.get("body", "").encode()
+            requests.append(RecordedRequest(entry["ts"], entry["method"], entry["path"], entry["headers"], body,
+                                            entry["status"], entry["duration"]))
+        except (ValueError, KeyError, TypeError) as e:
+            raise AiohttpDevException("line {} is not a recorded request: {}".format(n, e)) from e
+    if not requests:
+        raise AiohttpDevException("no requests recorded")
+    return sorted(requests, key=lambda r: r.ts)
+
+
+class ReplayResult(NamedTuple):
+    request: RecordedRequest
+    duration: float
+    status: Optional[int]
+    error: Optional[str]
+
+
+def _change(before: float, after: float) -> str:
+    return "{:+0.0f}%".format((after / before - 1) * 100) if before else ""
+
+
+def report(results: List[ReplayResult], elapsed: float) -> str:
+    """
+    Build a table of each request's recorded and replayed latency.
+
+    Recorded latencies are measured in the app, replayed latencies also include the client and connection, so
+    small differences aren't meaningful.
+    """
+    rows = []
+    for r in results:
+        name = "{} {}".format(r.request.method, r.request.path)
+        if r.error is not None:
+            replayed, change, status = "-", "", r.error
+        else:
+            replayed, change = fmt_duration(r.duration), _change(r.request.duration, r.duration)
+            status = str(r.status)
+            if r.status != r.request.status:
+                status += " (was {})".format(r.request.status)
+        rows.append((name, fmt_duration(r.request.duration), replayed, change, status))
+    width = max(len("request"), max(len(row[0]) for row in rows))
+    lines = ["{:<{w}} {:>9} {:>9} {:>8}  {}".format("request", "recorded", "replayed", "change", "status", w=width)]
+    lines += ["{:<{w}} {:>9} {:>9} {:>8}  {}".format(*row, w=width) for row in rows]
+
+    ok = [r for r in results if r.error is None]
+    summary = "{} requests replayed in {:0.1f}s".format(len(results), elapsed)
+    if ok:
+        median_recorded = statistics.median(r.request.duration for r in ok)
+        median_replayed = statistics.median(r.duration for r in ok)
+        summary += ", median latency {} → {}".format(fmt_duration(median_recorded), fmt_duration(median_replayed))
+        if median_recorded:
+            summary += " ({})".format(_change(median_recorded, median_replayed))
+    changed = sum(r.status != r.request.status for r in ok)
+    if changed:
+        summary += ", {} with a different status".format(changed)
+    if len(ok) < len(results):
+        summary += ", {} failed".format(len(results) - len(ok))
+    lines.append(summary)
+    return "\n".join(lines)
+
+
+class Replay:
+    """
+    Send recorded requests to ``base_url``.
+
+    By default requests are sent at the same times relative to the first one as they were recorded, so requests
+    which overlapped, eg. a page's assets, overlap again. Gaps between requests longer than ``max_gap`` seconds,
+    eg. while the app was being edited, are shortened to ``max_gap``. With ``fast`` each request is sent as soon as
+    the previous one has completed.
+    """
+
+    def __init__(self, requests: List[RecordedRequest], base_url: str, fast: bool = False, max_gap: float = 5,
+                 timeout: float = 10):
+        self.requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.fast = fast
+        self.max_gap = max_gap
+        self.timeout = timeout
+
+    def offsets(self) -> List[float]:
+        """Seconds after the start of the replay each request is sent at."""
+        offsets = []
+        offset = 0.0
+        for prev, req in zip([self.requests[0]] + self.requests, self.requests):
+            offset += min(req.ts - prev.ts, self.max_gap)
+            offsets.append(offset)
+        return offsets
+
+    async def run(self) -> List[ReplayResult]:
+        async with ClientSession(timeout=ClientTimeout(total=self.timeout)) as session:
+            if self.fast:
+                return [await self._request(session, req) for req in self.requests]
+            start = time.perf_counter()
+            sends = (self._request(session, req, start + offset) for req, offset in zip(self.requests, self.offsets()))
+            return list(await asyncio.gather(*sends))
+
+    async def _request(self, session: ClientSession, req: RecordedRequest, at: Optional[float] = None
+                       ) -> ReplayResult:
+        if at is not None:
+            await asyncio.sleep(max(at - time.perf_counter(), 0))
+        headers = [(k, v) for k, v in req.headers] + [(REPLAY_HEADER, "1")]
+        url = URL(self.base_url + req.path, encoded=True)
+        start = time.perf_counter()
+        try:
+            async with session.request(req.method, url, headers=headers, data=req.body or None,
+                                       allow_redirects=False) as r:
+                await r.read()
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            error = "{}: {}".format(type(e).__name__, e) if str(e) else type(e).__name__
+            return ReplayResult(req, time.perf_counter() - start, None, error)
+        return ReplayResult(req, time.perf_counter() - start, r.status, None)
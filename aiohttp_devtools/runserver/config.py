@@ -3,15 +3,18 @@ import re
 import sys
 from importlib import import_module
 from pathlib import Path
-from typing import Awaitable, Callable, Literal, Optional, Union
+from typing import Awaitable, Callable, List, Literal, Optional, Union
 from types import ModuleType
 
 from aiohttp import web
 from ssl import SSLContext, SSLError, create_default_context as create_default_ssl_context
 
 import __main__
-from ..exceptions import AiohttpDevConfigError as AdevConfigError
+from ..exceptions import AiohttpDevConfigError as AdevConfigError, AiohttpDevException
+from ..history import History
 from ..logs import rs_dft_logger as logger
+from .har import HAR_ENTRIES
+from .smoke import Target, parse_targets
 
 AppFactory = Union[web.Application, Callable[[], web.Application], Callable[[], Awaitable[web.Application]]]
 
@@ -48,6 +51,23 @@ class Config:
                  main_port: int = 8000,
                  aux_port: Optional[int] = None,
                  browser_cache: bool = False,
+                 fingerprint_static: bool = False,
+                 bench_mode: bool = False,
+                 queue_logs: bool = False,
+                 log_ndjson: Optional[str] = None,
+                 log_sample: int = 1,
+                 log_slow: int = 500,
+                 collapse_logs: bool = False,
+                 profile_requests: bool = False,
+                 loop_lag_threshold: Optional[int] = None,
+                 trace_memory: bool = False,
+                 time_hooks: bool = False,
+                 smoke_routes: Optional[str] = None,
+                 smoke_threshold: int = 50,
+                 history: Optional[str] = None,
+                 record_traffic: Optional[str] = None,
+                 har: Optional[str] = None,
+                 har_entries: int = HAR_ENTRIES,
                  ssl_context_factory_name: Optional[str] = None,
                  ssl_rootcert_file_path: Optional[str] = None):
         if root_path:
@@ -90,10 +110,44 @@ class Config:
         self.main_port = main_port
         self.aux_port = aux_port or (main_port + 1)
         self.browser_cache = browser_cache
+        self.fingerprint_static = fingerprint_static
+        self.bench_mode = bench_mode
+        self.queue_logs = queue_logs
+        self.log_ndjson = log_ndjson
+        self.log_sample = log_sample
+        self.log_slow = log_slow
+        self.collapse_logs = collapse_logs
+        self.profile_requests = profile_requests
+        self.loop_lag_threshold = loop_lag_threshold
+        self.trace_memory = trace_memory
+        if time_hooks and bench_mode:
+            logger.warning("startup and shutdown hooks aren't timed in bench mode")
+            time_hooks = False
+        self.time_hooks = time_hooks
         self.ssl_context_factory_name = ssl_context_factory_name
         self.ssl_rootcert_file_path = ssl_rootcert_file_path
+        self.smoke_targets = self._load_smoke_routes(smoke_routes) if smoke_routes else []
+        self.smoke_threshold = smoke_threshold
+        self.history = History(Path(history).resolve(), self.root_path) if history else None
+        self.record_traffic = Path(record_traffic).resolve() if record_traffic else None
+        if har and bench_mode:
+            # the main app's requests are added to the HAR buffer by its access logger, which is disabled
+            logger.warning("HAR export disabled in bench mode, requests to the app aren't logged")
+            har = None
+        self.har = Path(har).resolve() if har else None
+        # only buffered if the HAR export is enabled
+        self.har_entries = har_entries if har else 0
         logger.debug('config loaded:\n%s', self)
 
+    def _load_smoke_routes(self, smoke_routes: str) -> List[Target]:
+        path = self._resolve_path(smoke_routes, "is_file", "smoke-routes")
+        base_url = "{}://{}:{}".format(self.protocol, self.host, self.main_port)
+        try:
+            with path.open() as f:
+                return parse_targets((), f, base_url)
+        except AiohttpDevException as e:
+            raise AdevConfigError("invalid smoke-routes file: {}".format(e)) from e
+
     @property
     def protocol(self) -> Literal["http", "https"]:
         return "http" if self.ssl_context_factory_name is None else "https"
@@ -247,5 +301,6 @@ class Config:
 
     def __str__(self) -> str:
         fields = ("py_file", "static_path", "static_url", "livereload", "shutdown_by_url",
-                  "path_prefix", "app_factory_name", "host", "bind_address", "main_port", "aux_port")
+                  "path_prefix", "app_factory_name", "host", "bind_address", "main_port", "aux_port", "bench_mode",
+                  "log_ndjson", "log_sample", "log_slow", "collapse_logs", "record_traffic", "har")
         return 'Config:\n' + '\n'.join('  {0}: {1!r}'.format(f, getattr(self, f)) for f in fields)
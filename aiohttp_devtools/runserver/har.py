@@ -0,0 +1,204 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from ssl import SSLContext
+from time import time as time_now
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping, Union
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+from yarl import URL
+
+from .. import __version__
+from ..logs import rs_dft_logger as logger
+
+# Request key the time the response started to be sent is stored under, to split the request's duration
+# into waiting for the app and sending the body.
+HAR_PREPARED = "_adev_har_prepared"
+# Request key set on requests which aren't added to the buffer, eg. fetching the aux app's entries.
+HAR_SKIP = "_adev_har_skip"
+# Default number of requests kept for the HAR export, older requests are dropped.
+HAR_ENTRIES = 1000
+
+
+class HarEntry:
+    """
+    A request in the HAR buffer.
+
+    Only references to the headers are kept when the request is logged, building the entry is deferred until it's
+    exported by calling ``render()``.
+    """
+
+    __slots__ = ("started", "server", "method", "url", "version", "request_headers", "request_size", "status",
+                 "reason", "response_headers", "response_size", "duration", "wait")
+
+    def __init__(self, request: web.BaseRequest, response: web.StreamResponse, time: float, server: str):
+        self.started = time_now() - time
+        self.server = server
+        self.method = request.method
+        self.url = request.url
+        self.version = request.version
+        self.request_headers: Mapping[str, str] = request.headers
+        self.request_size = request.content_length or 0
+        self.status = response.status
+        self.reason = response.reason
+        self.response_headers: Mapping[str, str] = response.headers
+        self.response_size = response.body_length
+        self.duration = time
+        self.wait = time
+        prepared = request.get(HAR_PREPARED)
+        if prepared is not None:
+            start = asyncio.get_running_loop().time() - time
+            self.wait = min(max(prepared - start, 0), time)
+
+    def render(self) -> Dict[str, Any]:
+        http_version = "HTTP/{}.{}".format(*self.version)
+        # aiohttp counts the bytes written including the headers, the body's size is only known from Content-Length
+        content_length = self.response_headers.get("Content-Length")
+        body_size = int(content_length) if content_length and content_length.isdigit() else -1
+        headers_size = self.response_size - body_size if body_size >= 0 else -1
+        return {
+            "startedDateTime": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "time": _ms(self.duration),
+            "request": {
+                "method": self.method,
+                "url": str(self.url),
+                "httpVersion": http_version,
+                "cookies": [],
+                "headers": _headers(self.request_headers),
+                "queryString": [{"name": k, "value": v} for k, v in self.url.query.items()],
+                "headersSize": -1,
+                "bodySize": self.request_size,
+            },
+            "response": {
+                "status": self.status,
+                "statusText": self.reason,
+                "httpVersion": http_version,
+                "cookies": [],
+                "headers": _headers(self.response_headers),
+                "content": {
+                    "size": body_size,
+                    "mimeType": self.response_headers.get("Content-Type", ""),
+                },
+                "redirectURL": self.response_headers.get("Location", ""),
+                "headersSize": headers_size,
+                "bodySize": body_size,
+                "_transferSize": self.response_size,
+            },
+            "cache": {},
+            # the server can't see the client's connection setup, "wait" is until the response headers were
+            # sent and "receive" is sending the body
+            "timings": {
+                "blocked": -1,
+                "dns": -1,
+                "connect": -1,
+                "send": 0,
+                "wait": _ms(self.wait),
+                "receive": _ms(self.duration - self.wait),
+            },
+            "_server": self.server,
+        }
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _headers(headers: Mapping[str, str]) -> List[Dict[str, str]]:
+    return [{"name": k, "value": v} for k, v in headers.items()]
+
+
+class HarBuffer:
+    """The last requests logged by the access loggers, recording is disabled until ``configure()`` is called."""
+
+    def __init__(self) -> None:
+        self.entries: Deque[HarEntry] = deque(maxlen=0)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.entries.maxlen)
+
+    def configure(self, max_entries: int) -> None:
+        self.entries = deque(self.entries, maxlen=max_entries)
+
+    def add(self, request: web.BaseRequest, response: web.StreamResponse, time: float, server: str) -> None:
+        if request.get(HAR_SKIP):
+            return
+        self.entries.append(HarEntry(request, response, time, server))
+
+    def render(self) -> List[Dict[str, Any]]:
+        return [entry.render() for entry in self.entries]
+
+
+async def on_response_prepare(request: web.Request, response: web.StreamResponse) -> None:
+    request[HAR_PREPARED] = asyncio.get_running_loop().time()
+
+
+def har_log(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "aiohttp-devtools", "version": __version__},
+            "pages": [],
+            "entries": sorted(entries, key=lambda e: e["startedDateTime"]),
+        }
+    }
+
+
+def entries_handler(buffer: HarBuffer) -> Callable[[web.Request], Awaitable[web.Response]]:
+    """Create a handler returning the aux app's buffered requests, so they're included in the main app's export."""
+    async def entries(request: web.Request) -> web.Response:
+        request[HAR_SKIP] = True
+        rendered = buffer.render()
+        if "clear" in request.query:
+            buffer.entries.clear()
+        return web.json_response(rendered)
+    return entries
+
+
+class HarExport:
+    """
+    Endpoint writing the requests buffered by the main app's access logger, along with those of the aux app
+    (eg. static files and livereload), to a HAR file for viewing page-load waterfalls in browser devtools or other
+    HAR viewers.
+
+    The buffer is kept, unless the ``clear`` query parameter is set, so each export includes the last requests
+    whenever it's written. Requests handled by the main app before the last restart aren't included.
+    """
+
+    def __init__(self, buffer: HarBuffer, path: Path, url: str, aux_url: str, ssl: Union[SSLContext, bool] = True):
+        self.buffer = buffer
+        self.path = path
+        self.url = url
+        self.aux_url = aux_url
+        self.ssl = ssl
+
+    async def export(self, request: web.Request) -> web.Response:
+        clear = "clear" in request.query
+        entries = self.buffer.render()
+        if clear:
+            self.buffer.entries.clear()
+        entries += await self._aux_entries(clear)
+        har = har_log(entries)
+        await asyncio.get_running_loop().run_in_executor(None, self._write, har)
+        logger.info("wrote %d requests to %s", len(entries), self.path)
+        return web.json_response(har, dumps=lambda v: json.dumps(v, indent=2))
+
+    async def _aux_entries(self, clear: bool) -> List[Dict[str, Any]]:
+        url = URL(self.aux_url).with_query({"clear": "1"} if clear else {})
+        try:
+            async with ClientSession(timeout=ClientTimeout(total=5)) as session:
+                async with session.get(url, ssl=self.ssl) as r:
+                    r.raise_for_status()
+                    entries: List[Dict[str, Any]] = await r.json()
+                    return entries
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.warning("HAR export: aux app requests not included, %s: %s", type(e).__name__, e)
+            return []
+
+    def _write(self, har: Dict[str, Any]) -> None:
+        self.path.write_text(json.dumps(har, indent=2), encoding="utf-8")
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get(self.url, self.export, name="_devtools.har")
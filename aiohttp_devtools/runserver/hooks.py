@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from ..history import History
+from ..logs import fmt_duration, rs_dft_logger as logger
+
+SIGNALS = ("on_startup", "on_shutdown", "on_cleanup")
+# Shutdown hooks still running after this many seconds are reported straight away, as they hold up restarts.
+SLOW_HOOK = 1.0
+# Number of the slowest hooks shown after startup and shutdown.
+REPORT_HOOKS = 5
+# Seconds the app process is given to stop before it's killed by AppTask._stop_dev_server.
+STOP_TIMEOUT = 5
+
+Receiver = Callable[[web.Application], Awaitable[None]]
+CleanupCtx = Callable[[web.Application], AsyncIterator[None]]
+
+
+class HookTimer:
+    """
+    Time each on_startup, cleanup_ctx, on_shutdown and on_cleanup callback of an app.
+
+    The slowest callbacks are logged once the app has started and again once it's been cleaned up.
+
+    Each callback is replaced by one timing it. Sub-apps' signals are frozen when they're added to the app, so
+    the callbacks aiohttp adds to run a sub-app's signals are timed instead, eg. "/sub on_startup" covers all
+    of the sub-app's startup callbacks.
+    """
+
+    def __init__(self, history: Optional[History] = None) -> None:
+        self.history = history
+        self.timings: List[Tuple[str, float]] = []
+        self._writes: List["asyncio.Future[None]"] = []
+
+    def install(self, app: web.Application, factory_time: Optional[float] = None) -> bool:
+        """
+        :param factory_time: seconds taken to create the app, included in the startup report
+        :return: whether the app's callbacks could be timed, they can't if the app's signals are already frozen
+        """
+        if app.cleanup_ctx.frozen or any(getattr(app, signame).frozen for signame in SIGNALS):
+            return False
+        subapps = _subapp_names(app)
+        for signame in SIGNALS:
+            signal = getattr(app, signame)
+            names = list(subapps)
+            signal[:] = [self._wrap(app, signame, receiver, names) for receiver in signal]
+        app.cleanup_ctx[:] = [self._wrap_ctx(cb) for cb in app.cleanup_ctx]
+        app.on_startup.append(self._startup_done)
+        app.on_cleanup.append(self._cleanup_done)
+        if factory_time is not None:
+            self.timings.append(("app factory", factory_time))
+        return True
+
+    def _wrap(self, app: web.Application, signame: str, receiver: Receiver, subapps: List[str]) -> Receiver:
+        if getattr(receiver, "__self__", None) is app.cleanup_ctx:
+            # runs the cleanup contexts, which are timed individually
+            return receiver
+        if "._reg_subapp_signals." in _name(receiver) and subapps:
+            # sub-apps are added in the same order as the callbacks running their signals
+            name = "{} {}".format(subapps.pop(0), signame)
+        else:
+            name = "{} {}".format(signame, _name(receiver))
+        shutdown = signame != "on_startup"
+
+        async def timed(app: web.Application) -> None:
+            await self._time(name, receiver(app), shutdown=shutdown)
+        return timed
+
+    def _wrap_ctx(self, cb: CleanupCtx) -> CleanupCtx:
+        name = "cleanup_ctx {}".format(_name(cb))
+
+        async def timed(app: web.Application) -> AsyncIterator[None]:
+            it = cb(app).__aiter__()
+            await self._time(name, it.__anext__())
+            yield
+            try:
+                await self._time(name, it.__anext__(), shutdown=True)
+            except StopAsyncIteration:
+                return
+            # cb has more than one yield, so does this, for aiohttp to report it
+            yield
+        return timed
+
+    async def _time(self, name: str, aw: Awaitable[Any], shutdown: bool = False) -> None:
+        start = time.perf_counter()
+        handle = None
+        if shutdown:
+            handle = asyncio.get_running_loop().call_later(SLOW_HOOK, self._still_running, name, start)
+        try:
+            await aw
+        finally:
+            if handle is not None:
+                handle.cancel()
+            self.timings.append((name, time.perf_counter() - start))
+
+    def _still_running(self, name: str, start: float) -> None:
+        logger.warning("%s has been running for %s, the app process is killed if it takes over %ds to stop",
+                       name, fmt_duration(time.perf_counter() - start), STOP_TIMEOUT)
+
+    async def _startup_done(self, app: web.Application) -> None:
+        self._report("startup")
+
+    async def _cleanup_done(self, app: web.Application) -> None:
+        self._report("shutdown")
+        # the process exits once the app has been cleaned up, so wait for the timings to be written
+        writes, self._writes = self._writes, []
+        await asyncio.gather(*writes)
+
+    def _report(self, title: str) -> None:
+        timings, self.timings = self.timings, []
+        if not timings:
+            return
+        total = sum(t for _, t in timings)
+        slowest = sorted(timings, key=lambda t: t[1], reverse=True)[:REPORT_HOOKS]
+        logger.info("%s took %s, slowest: %s", title, fmt_duration(total),
+                    ", ".join("{} {}".format(name, fmt_duration(t)) for name, t in slowest))
+        if self.history is not None:
+            # written in the background, so it isn't included in the app's startup
+            samples = [("total", "duration", total)] + [(n, "duration", t) for n, t in timings]
+            self._writes.append(asyncio.ensure_future(self.history.record_async(title, samples)))
+
+
+def _name(cb: Callable[..., Any]) -> str:
+    return getattr(cb, "__qualname__", None) or repr(cb)
+
+
+def _subapp_names(app: web.Application) -> List[str]:
+    """Prefixes (or domain rules) of an app's sub-apps, in the order they were added."""
+    names: List[str] = []
+    for resource in app.router.resources():
+        info: Dict[str, Any] = dict(resource.get_info())
+        if isinstance(info.get("app"), web.Application):
+            names.append(info.get("prefix") or resource.canonical)
+    return names
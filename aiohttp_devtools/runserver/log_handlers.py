@@ -1,17 +1,212 @@
+import asyncio
 import json
+import logging
 import warnings
-from datetime import datetime, timedelta
-from typing import Dict, Optional, Union, cast
+from threading import Lock
+from time import localtime, monotonic, strftime, time as time_now
+from typing import Any, Dict, Literal, Mapping, Optional, Tuple, Union, cast
 
 from aiohttp import web
 from aiohttp.abc import AbstractAccessLogger
 
+from ..logs import AccessFields, fmt_duration
+from .har import HarBuffer
+from .profiling import PROFILE_HEADER
+from .smoke import SMOKE_HEADER
+from .stats import gc_stats, route_stats
+
 dbtb = '/_debugtoolbar/'
 check = '?_checking_alive=1'
+# Bodies longer than this are truncated in error details, and not parsed as JSON.
+MAX_DETAILS_BODY = 4096
+# Seconds identical consecutive lines are collapsed for before a summary of them is logged.
+COLLAPSE_INTERVAL = 1.0
+# Garbage collection pauses during a request at least this long (in seconds) are shown in its log message.
+GC_NOTE_THRESHOLD = 0.001
+
+
+class _TimeCache:
+    """Formatting the time is relatively slow, and the result only changes once a second."""
+
+    __slots__ = ("_second", "_value")
+
+    def __init__(self) -> None:
+        self._second = -1
+        self._value = ""
+
+    def __call__(self, timestamp: float) -> str:
+        second = int(timestamp)
+        if second != self._second:
+            self._value = strftime("[%H:%M:%S]", localtime(second))
+            self._second = second
+        return self._value
+
+
+fmt_time = _TimeCache()
+
+
+class _RateLimiter:
+    """Allow at most ``limit`` events in any ``period`` seconds, counting those which aren't allowed."""
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.suppressed = 0
+        self._window_start = -period
+        self._count = 0
+        self._lock = Lock()
+
+    def allow(self) -> Tuple[bool, int]:
+        """
+        :return: tuple of whether the event is allowed and, if so, how many events were suppressed since the last
+          allowed event
+        """
+        now = monotonic()
+        with self._lock:
+            if now - self._window_start >= self.period:
+                self._window_start = now
+                self._count = 0
+            if self._count >= self.limit:
+                self.suppressed += 1
+                return False, 0
+            self._count += 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+# shared between connections since an AccessLogger is created for each one
+details_limiter = _RateLimiter(limit=10, period=10.0)
+
+
+class ErrorDetails:
+    """
+    Request and response details for an error response.
+
+    Only references and truncated bodies are captured when the request is logged, parsing bodies and copying
+    headers is deferred until the record is formatted by calling the instance.
+    """
+
+    __slots__ = ("duration", "request_headers", "request_body", "request_size", "response_headers", "response_body",
+                 "response_size", "response_charset", "suppressed", "_rendered")
+
+    def __init__(self, request: web.BaseRequest, response: web.StreamResponse, time: float, suppressed: int = 0):
+        self.duration = time
+        self.request_headers: Mapping[str, str] = request.headers
+        request_body = request._read_bytes
+        self.request_size = 0 if request_body is None else len(request_body)
+        self.request_body = None if request_body is None else request_body[:MAX_DETAILS_BODY]
+        self.response_headers: Mapping[str, str] = response.headers
+        body = response.body if isinstance(response, web.Response) else None
+        if isinstance(body, (bytes, bytearray)):
+            self.response_size = len(body)
+            self.response_body: Optional[bytes] = bytes(body[:MAX_DETAILS_BODY])
+            self.response_charset = response.charset or "utf-8"
+        else:
+            self.response_size = 0
+            self.response_body = None
+            self.response_charset = "utf-8"
+        self.suppressed = suppressed
+        self._rendered: Optional[Dict[str, object]] = None
+
+    def __call__(self) -> Dict[str, object]:
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self) -> Dict[str, object]:
+        details: Dict[str, object] = {
+            "request_duration_ms": round(self.duration * 1000, 3),
+            "request_headers": dict(self.request_headers),
+            "request_body": _details_body(self.request_body, self.request_size, "request body"),
+            "request_size": fmt_size(self.request_size),
+            "response_headers": dict(self.response_headers),
+        }
+        response_body = self.response_body
+        if response_body is None:
+            details["response_body"] = None
+        else:
+            text = response_body.decode(self.response_charset, errors="replace")
+            details["response_body"] = _details_body(text, self.response_size, "response body")
+        if self.suppressed:
+            details["suppressed"] = "{} earlier error details not shown".format(self.suppressed)
+        return details
+
+
+def _details_body(body: Union[str, bytes, None], size: int, name: str) -> object:
+    if body is None or size <= MAX_DETAILS_BODY:
+        return parse_body(body, name)
+    if isinstance(body, bytes):
+        body = body.decode(errors="replace")
+    return "{}... ({} truncated)".format(body, fmt_size(size - MAX_DETAILS_BODY))
+
+
+class _Repeats:
+    """Identical consecutive requests not yet logged when collapsing access logs."""
+
+    __slots__ = ("key", "count", "duration", "access", "logger", "timer")
+
+    def __init__(self) -> None:
+        self.key: Optional[Tuple[str, str, int]] = None
+        self.count = 0
+        self.duration = 0.0
+        self.access: Optional[AccessFields] = None
+        self.logger: Optional[logging.Logger] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, logger: logging.Logger, access: AccessFields) -> None:
+        self.count += 1
+        self.duration += access["duration"]
+        self.access = access
+        self.logger = logger
+        if self.timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self.timer = loop.call_later(COLLAPSE_INTERVAL, self.flush)
+
+    def flush(self) -> None:
+        """Log a summary line for the repeated requests, if there are any."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        access, logger, count = self.access, self.logger, self.count
+        self.key = self.access = self.logger = None
+        self.count = 0
+        if not count or access is None or logger is None:
+            return
+        duration = self.duration / count
+        self.duration = 0.0
+        summary: AccessFields = {
+            **access,
+            "time": fmt_time(time_now()),
+            "dim": True,
+            "duration": duration,
+            "repeats": count,
+        }
+        msg = "{} {} {} ×{} avg {:0.0f}ms".format(
+            access["method"], access["path"], access["status"], count, duration * 1000)
+        logger.info(msg, extra={"access": summary})
 
 
 class _AccessLogger(AbstractAccessLogger):
     prefix: str
+    server: Literal["main", "aux"]
+    # log 1 in every `sample` requests which aren't errors or slow, set by configure_access_log
+    sample = 1
+    slow = 0.5
+    collapse = False
+    # state is kept on the class as an instance is created for each connection
+    _seen: int
+    _repeats: _Repeats
+    # requests kept for the HAR export, disabled unless configured by configure_access_log
+    har: HarBuffer
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._seen = 0
+        cls._repeats = _Repeats()
+        cls.har = HarBuffer()
 
     def get_msg(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> Optional[str]:
         raise NotImplementedError()
@@ -20,54 +215,94 @@ class _AccessLogger(AbstractAccessLogger):
         pass
 
     def log(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> None:
+        if self.har.enabled:
+            self.har.add(request, response, time, self.server)
         msg = self.get_msg(request, response, time)
         if not msg:
             return
-        now = datetime.now()
-        start_time = now - timedelta(seconds=time)
+        # sampling and collapsing only apply to the terminal, the record is still passed to other handlers, eg.
+        # the NDJSON file, so they get every request
+        terminal = True
+        cls = type(self)
+        if self.sample > 1 and response.status < 400 and time < self.slow:
+            cls._seen += 1
+            terminal = cls._seen % self.sample == 0
         pqs = request.path_qs
-        # log messages are encoded to JSON, so they can be easily coloured or not by the logger which knows whether
-        # the stream "isatty"
-        msg = json.dumps({
-            'time': start_time.strftime('[%H:%M:%S]'),
-            'prefix': self.prefix,
-            'msg': msg,
-            'dim': (response.status, response.body_length) == (304, 0) or pqs.startswith(dbtb) or pqs.endswith(check)
-        })
-        self.logger.info(msg, extra=self.extra(request, response, time))
+        # fields are passed on the record, so they can be easily coloured or not by the formatter which knows
+        # whether the stream "isatty", and used by other handlers without parsing the message
+        access: AccessFields = {
+            "ts": monotonic(),
+            "server": self.server,
+            "time": fmt_time(time_now() - time),
+            "prefix": self.prefix,
+            "dim": (response.status, response.body_length) == (304, 0) or pqs.startswith(dbtb) or pqs.endswith(check),
+            "method": request.method,
+            "path": pqs,
+            "status": response.status,
+            "size": response.body_length,
+            "duration": time,
+            "repeats": 1,
+        }
+        if self.collapse and terminal:
+            repeats = self._repeats
+            key = (request.method, pqs, response.status)
+            if key == repeats.key:
+                repeats.add(self.logger, access)
+                terminal = False
+            else:
+                repeats.flush()
+                repeats.key = key
+        extra: Dict[str, object] = {"access": access, "terminal": terminal}
+        if terminal:
+            details = self.extra(request, response, time)
+            if details:
+                extra.update(details)
+        self.logger.info(msg, extra=extra)
 
 
 class AccessLogger(_AccessLogger):
     prefix = '●'
+    server = "main"
+    # garbage collection during the request being logged, looked up once in log() and shown by get_msg()
+    _gc: Tuple[float, int] = (0, -1)
+
+    def log(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> None:
+        # requests from the smoke benchmark run after each restart aren't logged, exported or counted in the stats
+        if SMOKE_HEADER in request.headers:
+            return
+        self._gc = gc_stats.pauses_during(time)
+        route_stats.record(request, response.status, time, self._gc[0])
+        super().log(request, response, time)
 
-    def get_msg(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> str:
-        return '{method} {path} {code} {size} {ms:0.0f}ms'.format(
+    def get_msg(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> Optional[str]:
+        msg = '{method} {path} {code} {size} {ms:0.0f}ms'.format(
             method=request.method,
             path=request.path_qs,
             code=response.status,
             size=fmt_size(response.body_length),
             ms=time * 1000,
         )
+        gc_pause, generation = self._gc
+        if gc_pause >= GC_NOTE_THRESHOLD:
+            msg += " (gc {} gen{})".format(fmt_duration(gc_pause), generation)
+        profile = response.headers.get(PROFILE_HEADER)
+        if profile:
+            msg += " profile: " + profile
+        return msg
 
     def extra(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> Optional[Dict[str, object]]:
         if response.status <= 310:
             return None
 
-        request_body = request._read_bytes
-        body_text = response.text if isinstance(response, web.Response) else None
-        details = {
-            "request_duration_ms": round(time * 1000, 3),
-            "request_headers": dict(request.headers),
-            "request_body": parse_body(request_body, "request body"),
-            "request_size": fmt_size(0 if request_body is None else len(request_body)),
-            "response_headers": dict(response.headers),
-            "response_body": parse_body(body_text, "response body"),
-        }
-        return {"details": details}
+        allowed, suppressed = details_limiter.allow()
+        if not allowed:
+            return None
+        return {"details": ErrorDetails(request, response, time, suppressed)}
 
 
 class AuxAccessLogger(_AccessLogger):
     prefix = '◆'
+    server = "aux"
 
     def get_msg(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> Optional[str]:
         # don't log livereload
@@ -82,6 +317,26 @@ class AuxAccessLogger(_AccessLogger):
         )
 
 
+def configure_access_log(sample: int = 1, slow: int = 500, collapse: bool = False, har_entries: int = 0) -> None:
+    """
+    Configure which requests the access loggers show in the terminal, other handlers, eg. NDJSON, get every request.
+
+    :param sample: log one in every ``sample`` requests, errors and slow requests are always logged
+    :param slow: requests taking at least this many milliseconds are always logged
+    :param collapse: log identical consecutive requests (same method, path and status) once, followed by a summary
+      line with the number of repeats
+    :param har_entries: number of requests kept for the HAR export regardless of sampling, 0 to disable it
+    """
+    _AccessLogger.sample = sample
+    _AccessLogger.slow = slow / 1000
+    _AccessLogger.collapse = collapse
+    for cls in _AccessLogger.__subclasses__():
+        cls.har.configure(har_entries)
+        # drop requests left over from the previous configuration, and the flush timer on their event loop
+        cls._repeats.flush()
+        cls._seen = 0
+
+
 def fmt_size(num: int) -> str:
     if not num:
         return ''
@@ -8,7 +8,7 @@ from aiohttp.web import Application
 
 from ..logs import rs_dft_logger as logger
 from .config import Config
-from .log_handlers import AuxAccessLogger
+from .log_handlers import AuxAccessLogger, configure_access_log
 from .serve import check_port_open, create_auxiliary_app
 from .watch import AppTask, LiveReloadTask
 from ssl import SSLContext
@@ -41,6 +41,8 @@ def runserver(**config_kwargs: Any) -> RunServer:
         static_path=config.static_path_str,
         static_url=config.static_url,
         livereload=config.livereload,
+        fingerprint_static=config.fingerprint_static,
+        har_url=config.path_prefix + "/har/entries" if config.har else None,
     )
 
     main_manager = AppTask(config)
@@ -53,6 +55,17 @@ def runserver(**config_kwargs: Any) -> RunServer:
 
     url = '{0.protocol}://{0.host}:{0.aux_port}'.format(config)
     logger.info('Starting aux server at %s ◆', url)
+    if config.bench_mode:
+        logger.info("bench mode: app served without debug, livereload injection, no-cache headers, access logs "
+                    "or runtime stats")
+    configure_access_log(config.log_sample, config.log_slow, config.collapse_logs, config.har_entries)
+    if config.log_sample > 1:
+        logger.info("logging 1 in %d requests, plus errors and requests slower than %dms",
+                    config.log_sample, config.log_slow)
+
+    if config.har:
+        logger.info("recording requests for HAR export, write %s with %s://%s:%d%s/har", config.har.name,
+                    config.protocol, config.host, config.main_port, config.path_prefix)
 
     if config.static_path:
         rel_path = config.static_path.relative_to(os.getcwd())
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from typing import AsyncIterator, List, Optional, Tuple
+
+from aiohttp import web
+
+from ..logs import rs_dft_logger as logger
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None  # type: ignore[assignment]
+
+# Number of frames stored for each traced allocation, more frames means more overhead.
+TRACE_FRAMES = 10
+KEY_TYPES = {"lineno", "filename", "traceback"}
+_filters = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def start_tracing() -> None:
+    """Start tracing allocations, this should be called as early as possible so the app's imports are traced."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+
+
+def fmt_bytes(num: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(num) < 1024:
+            return "{:0.1f}{}".format(num, unit)
+        num /= 1024
+    return "{:0.1f}GB".format(num)
+
+
+def rss() -> Optional[int]:
+    """Current resident set size of the process in bytes, or None if it can't be found (eg. not on linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """Maximum resident set size of the process in bytes, or None if it can't be found (eg. on windows)."""
+    if resource is None:
+        return None  # type: ignore[unreachable]
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def memory_report() -> str:
+    current, peak = tracemalloc.get_traced_memory()
+    process = rss()
+    if process is not None:
+        process_memory = "rss {}".format(fmt_bytes(process))
+    else:
+        process = peak_rss()
+        process_memory = "rss unavailable" if process is None else "peak rss {}".format(fmt_bytes(process))
+    return "memory: {}, traced {}, peak traced {}".format(process_memory, fmt_bytes(current), fmt_bytes(peak))
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_filters)
+
+
+def _changes(snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot,
+             key_type: str) -> List[tracemalloc.StatisticDiff]:
+    return [s for s in snapshot.compare_to(baseline, key_type) if s.size_diff or s.count_diff]
+
+
+class MemoryTracer:
+    """
+    Endpoints showing the top allocation sites, and how they've changed between two points.
+
+    ``{url_prefix}/snapshot`` takes a new snapshot to compare against, and shows the top allocation sites.
+    ``{url_prefix}/diff`` shows the changes since the last snapshot, or since the app started.
+
+    Both accept ``?limit=`` (default 20) and ``?key=`` one of "lineno" (default), "filename" or "traceback".
+    """
+
+    def __init__(self, url_prefix: str):
+        self.url_prefix = url_prefix
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_time = 0.0
+
+    async def _new_baseline(self) -> tracemalloc.Snapshot:
+        # taking and filtering a snapshot can take a while with lots of traces, so avoid blocking the loop
+        self._baseline = await asyncio.get_running_loop().run_in_executor(None, _take_snapshot)
+        self._baseline_time = time.monotonic()
+        return self._baseline
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        await self._new_baseline()
+        logger.debug("tracing memory allocations, see %s/diff", self.url_prefix)
+        yield
+        logger.info(memory_report())
+
+    async def snapshot(self, request: web.Request) -> web.Response:
+        key_type, limit = _params(request)
+        snapshot = await self._new_baseline()
+        # grouping the traces is as slow as taking the snapshot
+        stats = await asyncio.get_running_loop().run_in_executor(None, snapshot.statistics, key_type)
+        lines = ["{}, top {} allocation sites of {}:".format(memory_report(), limit, len(stats))]
+        lines += [str(stat) for stat in stats[:limit]]
+        return web.Response(text="\n".join(lines))
+
+    async def diff(self, request: web.Request) -> web.Response:
+        key_type, limit = _params(request)
+        baseline = self._baseline or await self._new_baseline()
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, _take_snapshot)
+        stats = await loop.run_in_executor(None, _changes, snapshot, baseline, key_type)
+        lines = ["{}, top {} changes of {} since snapshot {:0.1f}s ago:".format(
+            memory_report(), limit, len(stats), time.monotonic() - self._baseline_time)]
+        lines += [str(stat) for stat in stats[:limit]]
+        return web.Response(text="\n".join(lines))
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get(self.url_prefix + "/snapshot", self.snapshot, name="_devtools.memory_snapshot")
+        app.router.add_get(self.url_prefix + "/diff", self.diff, name="_devtools.memory_diff")
+
+
+def _params(request: web.Request) -> Tuple[str, int]:
+    key_type = request.query.get("key", "lineno")
+    if key_type not in KEY_TYPES:
+        raise web.HTTPBadRequest(text="key must be one of: {}".format(", ".join(sorted(KEY_TYPES))))
+    try:
+        limit = int(request.query.get("limit", 20))
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise web.HTTPBadRequest(text="limit must be a non-negative integer")
+    return key_type, limit
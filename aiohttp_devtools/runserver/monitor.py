@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from types import FrameType
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+
+from ..logs import rs_dft_logger as logger
+
+# Number of frames of the loop thread's stack shown when it's blocked.
+STACK_LIMIT = 12
+# Minimum seconds between heartbeats, so very low thresholds don't keep the loop and watchdog busy.
+MIN_INTERVAL = 0.01
+_library_paths = tuple({os.path.dirname(os.__file__), os.path.dirname(os.path.dirname(web.__file__))})
+
+
+class LoopMonitor:
+    """
+    Detect the event loop being blocked, eg. by sync I/O in a handler.
+
+    A timer on the loop records a heartbeat every ``interval`` seconds, the lag of each beat is how long the loop
+    was blocked. A watchdog thread checks the heartbeat and, as soon as the loop has been blocked for longer than
+    ``threshold``, logs the loop thread's stack along with the request being handled. This gives similar reporting
+    to asyncio's debug mode ``slow_callback_duration`` without its overhead.
+    """
+
+    def __init__(self, threshold: float, root_path: Optional[Path] = None):
+        self.threshold = threshold
+        self.interval = max(min(threshold / 2, 0.1), MIN_INTERVAL)
+        self.root_path = str(root_path) if root_path else None
+        # requests being handled by each task, maintained by track()
+        self.in_flight: Dict["asyncio.Task[Any]", str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._expected = 0.0
+        self._last_beat = 0.0
+        self._reported = False
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._schedule()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="adev-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        self.start()
+        yield
+        self.stop()
+
+    async def track(self, request: web.Request, handler: Handler) -> web.StreamResponse:
+        """Handle a request, recording it so it can be reported if the loop is blocked."""
+        task = asyncio.current_task()
+        assert task is not None
+        self.in_flight[task] = "{} {}".format(request.method, request.path_qs)
+        try:
+            return await handler(request)
+        finally:
+            del self.in_flight[task]
+
+    def _schedule(self) -> None:
+        assert self._loop is not None
+        self._expected = self._loop.time() + self.interval
+        self._timer = self._loop.call_at(self._expected, self._beat)
+
+    def _beat(self) -> None:
+        assert self._loop is not None
+        lag = self._loop.time() - self._expected
+        # the watchdog has usually reported the block already, with the stack, while it was happening
+        if lag >= self.threshold and not self._reported:
+            logger.warning("event loop was blocked for %0.0fms", lag * 1000)
+        self._last_beat = time.monotonic()
+        self._reported = False
+        self._schedule()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked >= self.threshold and not self._reported:
+                self._reported = self._report(blocked)
+
+    def _report(self, blocked: float) -> bool:
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return False
+        task = asyncio.current_task(self._loop)
+        request = self.in_flight.get(task) if task is not None else None
+        culprit = self._culprit(frame)
+        logger.warning("event loop blocked for over %0.0fms by %s (%s:%d) %s\n%s",
+                       blocked * 1000, culprit.f_code.co_name, culprit.f_code.co_filename, culprit.f_lineno,
+                       "while handling " + request if request else "outside of a request",
+                       "".join(traceback.format_stack(frame, limit=STACK_LIMIT)).rstrip("\n"))
+        return True
+
+    def _culprit(self, frame: FrameType) -> FrameType:
+        """Find the innermost frame from the project, or which isn't from the stdlib or an installed package."""
+        f: Optional[FrameType] = frame
+        while f is not None:
+            filename = f.f_code.co_filename
+            if (self.root_path and filename.startswith(self.root_path)) or not filename.startswith(_library_paths):
+                return f
+            f = f.f_back
+        return frame
@@ -0,0 +1,154 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Counter as CounterType, List, Optional
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+
+from ..logs import rs_dft_logger as logger
+
+# A request is profiled if it has this header, or this query parameter.
+PROFILE_HEADER = "X-Adev-Profile"
+PROFILE_QUERY = "_profile"
+PROFILE_DIR = Path(tempfile.gettempdir(), "aiohttp-devtools-profiles")
+# Seconds between samples of the loop thread's stack.
+SAMPLE_INTERVAL = 0.001
+# Number of functions shown in the text summary of a profile.
+SUMMARY_FUNCTIONS = 40
+_unsafe_chars = re.compile(r"[^\w-]+")
+
+
+def wants_profile(request: web.Request) -> bool:
+    return PROFILE_HEADER in request.headers or PROFILE_QUERY in request.query
+
+
+class StackSampler:
+    """
+    Sample a thread's stack from a separate thread, counting identical stacks.
+
+    The counts are written in the "collapsed" format used by flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: CounterType[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="adev-stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def collapsed(self) -> str:
+        return "".join("{} {}\n".format(stack, count) for stack, count in self.stacks.most_common())
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    names: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfiler:
+    """
+    Profile requests with both cProfile and a stack sampler, saving the results to ``directory``.
+
+    For each profiled request three files are saved:
+    * ``.pstats`` cProfile stats, eg. for ``python -m pstats`` or snakeviz
+    * ``.txt`` the functions with the highest cumulative time
+    * ``.collapsed`` sampled stacks of the event loop thread, for flamegraphs
+
+    Only one request is profiled at a time, profiling applies to everything running on the loop while
+    the request is handled.
+    """
+
+    def __init__(self, url_prefix: str, directory: Optional[Path] = None):
+        self.url_prefix = url_prefix
+        self.directory = directory or PROFILE_DIR
+        self._active = False
+
+    async def profile(self, request: web.Request, handler: Handler) -> web.StreamResponse:
+        if self._active:
+            logger.warning("already profiling a request, not profiling %s %s", request.method, request.path_qs)
+            return await handler(request)
+
+        self._active = True
+        response: Optional[web.StreamResponse] = None
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await handler(request)
+            return response
+        except web.HTTPException as e:
+            response = e
+            raise
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            sampler.stop()
+            self._active = False
+            name = "{}{:03.0f}-{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), time.time() % 1 * 1000, request.method,
+                                             _unsafe_chars.sub("_", request.path.strip("/")) or "index")[:120]
+            await asyncio.get_running_loop().run_in_executor(None, self._save, name, profiler, sampler, duration)
+            url = "{}/{}.txt".format(self.url_prefix, name)
+            if response is not None and not response.prepared:
+                # AccessLogger adds the url to the request's log line
+                response.headers[PROFILE_HEADER] = url
+            logger.info("profile of %s %s saved to %s, view at %s", request.method, request.path_qs,
+                        self.directory / name, url)
+
+    def _save(self, name: str, profiler: cProfile.Profile, sampler: StackSampler, duration: float) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.directory / (name + ".pstats"))
+        sio = io.StringIO()
+        sio.write("request took {:0.1f}ms\n\n".format(duration * 1000))
+        pstats.Stats(profiler, stream=sio).sort_stats("cumulative").print_stats(SUMMARY_FUNCTIONS)
+        (self.directory / (name + ".txt")).write_text(sio.getvalue())
+        (self.directory / (name + ".collapsed")).write_text(sampler.collapsed())
+
+    async def list_profiles(self, request: web.Request) -> web.Response:
+        names = sorted((p.stem for p in self.directory.glob("*.pstats")), reverse=True)
+        lines = ["{0}/{1}.txt  {0}/{1}.collapsed  {0}/{1}.pstats".format(self.url_prefix, n) for n in names]
+        return web.Response(text="\n".join(lines) or "no profiles saved yet, add ?{} to a url".format(PROFILE_QUERY))
+
+    async def get_profile(self, request: web.Request) -> web.FileResponse:
+        path = self.directory / request.match_info["name"]
+        if path.suffix not in {".txt", ".collapsed", ".pstats"} or not path.is_file():
+            raise web.HTTPNotFound()
+        response = web.FileResponse(path)
+        if path.suffix == ".pstats":
+            response.content_type = "application/octet-stream"
+        else:
+            response.content_type = "text/plain"
+        return response
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get(self.url_prefix + "/", self.list_profiles, name="_devtools.profiles")
+        app.router.add_get(self.url_prefix + r"/{name:[\w.-]+}", self.get_profile, name="_devtools.profile")
@@ -1,5 +1,6 @@
 import asyncio
 import contextlib
+import functools
 import json
 import mimetypes
 import sys
@@ -7,12 +8,13 @@ import time
 import warnings
 from errno import EADDRINUSE
 from pathlib import Path
-from typing import Any, Iterator, List, NoReturn, Optional, Set, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, NoReturn, Optional, Set, Tuple, Union
 
 from aiohttp import WSMsgType, web
-from aiohttp.hdrs import LAST_MODIFIED, CONTENT_LENGTH
+from aiohttp.hdrs import ACCEPT_ENCODING, CONTENT_LENGTH, CONTENT_TYPE, RANGE
+from aiohttp.log import access_logger
 from aiohttp.typedefs import Handler
-from aiohttp.web_exceptions import HTTPNotFound, HTTPNotModified
+from aiohttp.web_exceptions import HTTPNotFound
 from aiohttp.web_runner import GracefulExit
 from aiohttp.web_urldispatcher import StaticResource
 from yarl import URL
@@ -20,36 +22,90 @@ from yarl import URL
 from ..exceptions import AiohttpDevException
 from ..logs import rs_aux_logger as aux_logger
 from ..logs import rs_dft_logger as dft_logger
-from ..logs import setup_logging
+from ..logs import log_event, setup_logging
 from .config import AppFactory, Config
-from .log_handlers import AccessLogger
+from .har import HarExport, entries_handler, on_response_prepare
+from .hooks import HookTimer
+from .log_handlers import AccessLogger, AuxAccessLogger, configure_access_log
+from .static_cache import (IMMUTABLE_CACHE_CONTROL, CachedFile, Fingerprints, SingleFlight, StaticCache,
+                           negotiate_encoding)
+from .memory import MemoryTracer, start_tracing
+from .monitor import LoopMonitor
+from .profiling import PROFILE_HEADER, PROFILE_QUERY, RequestProfiler, wants_profile
+from .stats import RuntimeStats, gc_stats, log_route_stats, record_route_stats
+from .traffic import TrafficRecorder
 from .utils import MutableValue
 
 from ssl import SSLContext
 
 try:
-    from aiohttp_jinja2 import static_root_key
+    import jinja2
+    from aiohttp_jinja2 import APP_KEY as JINJA2_APP_KEY, static_root_key
 except ImportError:
     static_root_key = None  # type: ignore[assignment]
 
 LIVE_RELOAD_HOST_SNIPPET = '\n<script src="{}://{}:{}/livereload.js"></script>\n'
 LIVE_RELOAD_LOCAL_SNIPPET = b'\n<script src="/livereload.js"></script>\n'
+LIVERELOAD_LAST_MODIFIED = 1451606400  # Fri, 01 Jan 2016 00:00:00 GMT
+# Request key set when the handler raised an unhandled exception, so the snippet is added to aiohttp's error page.
+LIVERELOAD_ERROR_PAGE = "_adev_livereload_error_page"
 
 LAST_RELOAD = web.AppKey("LAST_RELOAD", List[float])
-LIVERELOAD_SCRIPT = web.AppKey("LIVERELOAD_SCRIPT", bytes)
+LIVERELOAD_SCRIPT = web.AppKey("LIVERELOAD_SCRIPT", CachedFile)
+STATIC_CACHE = web.AppKey("STATIC_CACHE", StaticCache)
 STATIC_PATH = web.AppKey("STATIC_PATH", str)
 STATIC_URL = web.AppKey("STATIC_URL", str)
 WS = web.AppKey("WS", Set[Tuple[web.WebSocketResponse, str]])
 
 
-def _set_static_url(app: web.Application, url: str) -> None:
+class StaticRootUrl(MutableValue[str]):
+    """``static_root_url`` which can also build urls including a hash of the file's contents."""
+
+    __slots__ = ("fingerprints",)
+
+    def __init__(self, value: str, fingerprints: Optional[Fingerprints] = None):
+        super().__init__(value)
+        self.fingerprints = fingerprints
+
+    def url_for(self, path: str) -> str:
+        url = "{}/{}".format(str(self.value).rstrip("/"), path.lstrip("/"))
+        digest = self.fingerprints and self.fingerprints.get(path)
+        if digest:
+            url += "{}v={}".format("&" if "?" in url else "?", digest)
+        return url
+
+
+def _set_static_url(app: web.Application, url: str, fingerprints: Optional[Fingerprints] = None) -> None:
     if static_root_key is None:  # TODO: Remove fallback
         with warnings.catch_warnings():  # type: ignore[unreachable]
-            app["static_root_url"] = MutableValue(url)
+            app["static_root_url"] = StaticRootUrl(url, fingerprints)
     else:
-        app[static_root_key] = MutableValue(url)  # type: ignore[misc]
+        app[static_root_key] = StaticRootUrl(url, fingerprints)  # type: ignore[misc]
+    for subapp in app._subapps:
+        _set_static_url(subapp, url, fingerprints)
+
+
+def _fingerprint_jinja2_static(app: web.Application) -> None:
+    """Replace the ``static()`` template function so templates get fingerprinted urls."""
+    if static_root_key is None:
+        return  # type: ignore[unreachable]
+
+    @jinja2.pass_context
+    def static_url(context: Dict[str, web.Application], static_file_path: str) -> str:
+        return context["app"][static_root_key].url_for(static_file_path)  # type: ignore[attr-defined,no-any-return]
+
+    env = app.get(JINJA2_APP_KEY)
+    if env is not None:
+        env.globals["static"] = static_url
     for subapp in app._subapps:
-        _set_static_url(subapp, url)
+        _fingerprint_jinja2_static(subapp)
+
+
+def _get_static_url(app: web.Application) -> Optional[str]:
+    if static_root_key is None:  # TODO: Remove fallback
+        with warnings.catch_warnings():  # type: ignore[unreachable]
+            return app["static_root_url"].value
+    return app[static_root_key].value  # type: ignore[attr-defined,no-any-return]
 
 
 def _change_static_url(app: web.Application, url: str) -> None:
@@ -67,9 +123,16 @@ def modify_main_app(app: web.Application, config: Config) -> None:  # noqa: C901
     Modify the app we're serving to make development easier, eg.
     * modify responses to add the livereload snippet
     * set ``static_root_url`` on the app (for use with aiohttp-jinja2)
+
+    In bench mode only ``static_root_url``, the shutdown endpoint, and recording requests if enabled,
+    are set up so the app performs as it would in production.
     """
-    app._debug = True
-    dft_logger.debug('livereload enabled: %s', '✓' if config.livereload else '✖')
+    static_path = config.static_url.strip('/')
+    if config.bench_mode:
+        dft_logger.debug("bench mode: not modifying responses, app debug disabled")
+    else:
+        app._debug = True
+        dft_logger.debug('livereload enabled: %s', '✓' if config.livereload else '✖')
 
     def get_host(request: web.Request) -> str:
         if config.infer_host:
@@ -77,40 +140,109 @@ def modify_main_app(app: web.Application, config: Config) -> None:  # noqa: C901
         else:
             return config.host
 
-    if config.livereload:
-        async def on_prepare(request: web.Request, response: web.StreamResponse) -> None:
-            if (not isinstance(response, web.Response)
-                    or not isinstance(response.body, bytes)  # No support for Payload
-                    or request.path.startswith("/_debugtoolbar")
-                    or "text/html" not in response.content_type):
-                return
-            lr_snippet = LIVE_RELOAD_HOST_SNIPPET.format(config.protocol, get_host(request), config.aux_port)
-            dft_logger.debug("appending live reload snippet '%s' to body", lr_snippet)
-            response.body += lr_snippet.encode()
-            response.headers[CONTENT_LENGTH] = str(len(response.body))
-        app.on_response_prepare.append(on_prepare)
-
-    if not config.browser_cache:
+    # hosts rarely change, so cache what's derived from them rather than rebuilding it for every request
+    @functools.lru_cache(maxsize=32)
+    def host_snippet(host: str) -> bytes:
+        return LIVE_RELOAD_HOST_SNIPPET.format(config.protocol, host, config.aux_port).encode()
+
+    @functools.lru_cache(maxsize=32)
+    def host_static_url(host: str) -> str:
+        return '{}://{}:{}/{}'.format(config.protocol, host, config.aux_port, static_path)
+
+    def add_livereload_snippet(request: web.Request, response: web.StreamResponse) -> None:
+        if (not isinstance(response, web.Response)
+                or not isinstance(response.body, bytes)  # No support for Payload
+                or request.path.startswith("/_debugtoolbar")
+                # the raw header is checked as response.content_type parses it on every access
+                or "text/html" not in response.headers.get(CONTENT_TYPE, "")):
+            return
+        lr_snippet = host_snippet(get_host(request))
+        dft_logger.debug("appending live reload snippet '%s' to body", lr_snippet)
+        response.body += lr_snippet
+        response.headers[CONTENT_LENGTH] = str(len(response.body))
+
+    livereload = config.livereload and not config.bench_mode
+    no_cache = not config.browser_cache and not config.bench_mode
+    # we set the app key even in middleware to make the switch to production easier and for backwards compat.
+    infer_static_url = config.infer_host and config.static_path is not None and not config.bench_mode
+    profiler = RequestProfiler(config.path_prefix + "/profiles") if config.profile_requests else None
+    monitor = None
+    if config.loop_lag_threshold:
+        monitor = LoopMonitor(config.loop_lag_threshold / 1000, config.root_path)
+        app.cleanup_ctx.append(monitor.cleanup_ctx)
+        dft_logger.debug("monitoring event loop, reporting blocks over %dms", config.loop_lag_threshold)
+
+    if config.trace_memory:
+        tracer = MemoryTracer(config.path_prefix + "/memory")
+        tracer.add_routes(app)
+        app.cleanup_ctx.append(tracer.cleanup_ctx)
+
+    if config.har:
+        app.on_response_prepare.append(on_response_prepare)
+        aux_url = "{}://{}:{}{}/har/entries".format(config.protocol, config.host, config.aux_port, config.path_prefix)
+        har_export = HarExport(AccessLogger.har, config.har, config.path_prefix + "/har", aux_url,
+                               config.client_ssl_context)
+        har_export.add_routes(app)
+
+    if livereload:
+        # aiohttp builds the error page for unhandled exceptions after the middlewares have returned
+        async def on_error_page_prepare(request: web.Request, response: web.StreamResponse) -> None:
+            if request.get(LIVERELOAD_ERROR_PAGE):
+                add_livereload_snippet(request, response)
+
+        app.on_response_prepare.append(on_error_page_prepare)
+
+    recorder = None
+    if config.record_traffic:
+        recorder = TrafficRecorder(config.record_traffic, config.path_prefix)
+        app.cleanup_ctx.append(recorder.cleanup_ctx)
+
+    if livereload or no_cache or infer_static_url or profiler or monitor or recorder:
+        # everything is done in one middleware to keep the overhead added to each request to a minimum.
         @web.middleware
-        async def no_cache_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
-            """Add no-cache header to avoid browser caching in local development."""
-            response = await handler(request)
-            response.headers["Cache-Control"] = "no-cache"
+        async def devtools_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
+            if infer_static_url:
+                static_url = host_static_url(get_host(request))
+                # only walk the sub-apps when the host has actually changed
+                if _get_static_url(request.app) != static_url:
+                    dft_logger.debug('setting app static_root_url to "%s"', static_url)
+                    _change_static_url(request.app, static_url)
+
+            if recorder is not None:
+                handler = functools.partial(recorder.record, handler)
+            try:
+                if profiler is not None and wants_profile(request):
+                    response = await profiler.profile(request, handler)
+                elif monitor is not None:
+                    response = await monitor.track(request, handler)
+                else:
+                    response = await handler(request)
+            except web.HTTPException as e:
+                if livereload:
+                    add_livereload_snippet(request, e)
+                raise
+            except Exception:
+                if livereload:
+                    request[LIVERELOAD_ERROR_PAGE] = True
+                raise
+
+            if livereload:
+                add_livereload_snippet(request, response)
+            if no_cache:
+                # Add no-cache header to avoid browser caching in local development.
+                response.headers["Cache-Control"] = "no-cache"
             return response
 
-        app.middlewares.append(no_cache_middleware)
+        app.middlewares.insert(0, devtools_middleware)
 
-    static_path = config.static_url.strip('/')
-    if config.infer_host and config.static_path is not None:
-        # we set the app key even in middleware to make the switch to production easier and for backwards compat.
-        @web.middleware
-        async def static_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
-            static_url = '{}://{}:{}/{}'.format(config.protocol, get_host(request), config.aux_port, static_path)
-            dft_logger.debug('setting app static_root_url to "%s"', static_url)
-            _change_static_url(request.app, static_url)
-            return await handler(request)
+    if profiler is not None:
+        profiler.add_routes(app)
+        dft_logger.debug("profiling requests with a %s header or ?%s, profiles at %s/",
+                         PROFILE_HEADER, PROFILE_QUERY, profiler.url_prefix)
 
-        app.middlewares.insert(0, static_middleware)
+    if not config.bench_mode:
+        runtime_stats = RuntimeStats(config.path_prefix + "/stats", config.path_prefix + "/metrics")
+        runtime_stats.add_routes(app)
 
     # Fallback option to shutdown the application if signals don't work (e.g. Windows).
     if config.shutdown_by_url:
@@ -128,7 +260,11 @@ def modify_main_app(app: web.Application, config: Config) -> None:  # noqa: C901
     if config.static_path is not None:
         static_url = '{}://{}:{}/{}'.format(config.protocol, config.host, config.aux_port, static_path)
         dft_logger.debug('settings app static_root_url to "%s"', static_url)
-        _set_static_url(app, static_url)
+        fingerprints = Fingerprints(config.static_path) if config.fingerprint_static else None
+        _set_static_url(app, static_url, fingerprints)
+        if fingerprints is not None:
+            _fingerprint_jinja2_static(app)
+            app.cleanup_ctx.append(fingerprints.cleanup_ctx)
 
 
 async def check_port_open(port: int, host: str = "0.0.0.0", delay: float = 1) -> None:
@@ -166,7 +302,10 @@ def set_tty(tty_path: Optional[str]) -> Iterator[None]:
 
 def serve_main_app(config: Config, tty_path: Optional[str]) -> None:
     with set_tty(tty_path):
-        setup_logging(config.verbose)
+        setup_logging(config.verbose, config.queue_logs, config.log_ndjson)
+        configure_access_log(config.log_sample, config.log_slow, config.collapse_logs, config.har_entries)
+        if config.trace_memory:
+            start_tracing()
         module = config.import_module()
         app_factory = config.get_app_factory(module)
         ssl_context = config.get_ssl_context(module)
@@ -195,11 +334,23 @@ def serve_main_app(config: Config, tty_path: Optional[str]) -> None:
 
 
 async def create_main_app(config: Config, app_factory: AppFactory) -> web.AppRunner:
+    start = time.perf_counter()
     app = await config.load_app(app_factory)
+    factory_time = time.perf_counter() - start
     modify_main_app(app, config)
+    if not config.bench_mode:
+        # route latencies are recorded by AccessLogger, so aren't available in bench mode, and timing each
+        # garbage collection would add overhead production doesn't have
+        app.cleanup_ctx.append(log_route_stats)
+        app.cleanup_ctx.append(gc_stats.cleanup_ctx)
+        if config.history is not None:
+            app.cleanup_ctx.append(record_route_stats(config.history))
+    if config.time_hooks and not HookTimer(config.history).install(app, factory_time):
+        dft_logger.warning("app signals are frozen, not timing startup and shutdown hooks")
 
     await check_port_open(config.main_port, host=config.bind_address)
-    return web.AppRunner(app, access_log_class=AccessLogger, shutdown_timeout=0.1)
+    return web.AppRunner(app, access_log_class=AccessLogger, shutdown_timeout=0.1,
+                         access_log=None if config.bench_mode else access_logger)
 
 
 async def start_main_app(runner: web.AppRunner, host: str, port: int, ssl_context: Union[SSLContext, None]) -> None:
@@ -248,12 +399,20 @@ async def src_reload(app: web.Application, path: Optional[str] = None) -> int:
 
     app[LAST_RELOAD][0] = len(app[WS])
     app[LAST_RELOAD][1] = time.time()
+    log_event("reload", path=path, clients=cli_count, reloads=reloads)
     if reloads:
         s = '' if reloads == 1 else 's'
         aux_logger.info('prompted reload of %s on %d client%s', path or 'page', reloads, s)
     return reloads
 
 
+def invalidate_static(app: web.Application, changes: Iterable[Tuple[object, str]]) -> None:
+    """Drop cached static responses for changed files before browsers are prompted to reload."""
+    cache = app.get(STATIC_CACHE)
+    if cache is not None:
+        cache.invalidate(path for _, path in changes)
+
+
 async def cleanup_aux_app(app: web.Application) -> None:
     aux_logger.debug('closing %d websockets...', len(app[WS]))
     await asyncio.gather(*(ws.close() for ws, _ in app[WS]))
@@ -261,7 +420,8 @@ async def cleanup_aux_app(app: web.Application) -> None:
 
 def create_auxiliary_app(
         *, static_path: Optional[str], static_url: str = "/", livereload: bool = True,
-        browser_cache: bool = False) -> web.Application:
+        browser_cache: bool = False, fingerprint_static: bool = False,
+        har_url: Optional[str] = None) -> web.Application:
     app = web.Application()
     ws: Set[Tuple[web.WebSocketResponse, str]] = set()
     app[LAST_RELOAD] = [0, 0.]
@@ -272,11 +432,17 @@ def create_auxiliary_app(
 
     if livereload:
         lr_path = Path(__file__).resolve().parent / 'livereload.js'
-        app[LIVERELOAD_SCRIPT] = lr_path.read_bytes()
+        app[LIVERELOAD_SCRIPT] = CachedFile(lr_path.read_bytes(), "application/javascript",
+                                            LIVERELOAD_LAST_MODIFIED)
         app.router.add_route('GET', '/livereload.js', livereload_js)
         app.router.add_route('GET', '/livereload', websocket_handler)
         aux_logger.debug('enabling livereload on auxiliary app')
 
+    if har_url:
+        # the main app's HAR export includes the aux app's requests, fetched from here
+        app.on_response_prepare.append(on_response_prepare)
+        app.router.add_get(har_url, entries_handler(AuxAccessLogger.har))
+
     if static_path:
         route = CustomStaticResource(
             static_url.rstrip('/'),
@@ -284,20 +450,19 @@ def create_auxiliary_app(
             name='static-router',
             add_tail_snippet=livereload,
             follow_symlinks=True,
-            browser_cache=browser_cache
+            browser_cache=browser_cache,
+            fingerprint_static=fingerprint_static,
         )
         app.router.register_resource(route)
+        app[STATIC_CACHE] = route.cache
 
     return app
 
 
 async def livereload_js(request: web.Request) -> web.Response:
-    if request.if_modified_since:
-        raise HTTPNotModified()
-
     lr_script = request.app[LIVERELOAD_SCRIPT]
-    return web.Response(body=lr_script, content_type='application/javascript',
-                        headers={LAST_MODIFIED: 'Fri, 01 Jan 2016 00:00:00 GMT'})
+    encoding = negotiate_encoding(request.headers.get(ACCEPT_ENCODING, ""), lr_script.encodings)
+    return lr_script.response(request, encoding)
 
 WS_TYPE_LOOKUP = {k.value: v for v, k in WSMsgType.__members__.items()}
 
@@ -352,9 +517,13 @@ async def websocket_handler(request: web.Request) -> web.WebSocketResponse:
 
 class CustomStaticResource(StaticResource):
     def __init__(self, *args: Any, add_tail_snippet: bool = False,
-                 browser_cache: bool = False, **kwargs: Any):
+                 browser_cache: bool = False, fingerprint_static: bool = False, **kwargs: Any):
         self._add_tail_snippet = add_tail_snippet
         self._browser_cache = browser_cache
+        self._fingerprint_static = fingerprint_static
+        self.cache = StaticCache()
+        self._reads: SingleFlight[Tuple[Optional[str], Optional[CachedFile]]] = SingleFlight()
+        self._compressions: SingleFlight[bytes] = SingleFlight()
         super().__init__(*args, **kwargs)
         self._show_index = True
 
@@ -384,48 +553,71 @@ class CustomStaticResource(StaticResource):
                         pass
         return raw_path
 
-    def _insert_footer(self, response: web.StreamResponse) -> web.StreamResponse:
-        if not isinstance(response, web.FileResponse) or not self._add_tail_snippet:
-            return response
+    def _resolve(self, request: web.Request) -> Tuple[Path, Path]:
+        """
+        Apply path conventions to the request and resolve the file to serve, this is run in an executor.
 
-        filepath = response._path
-        ct, encoding = mimetypes.guess_type(str(response._path))
-        if ct != 'text/html':
-            return response
+        :return: tuple of (path as requested, resolved path of the file to serve)
+        """
+        raw_path = self.modify_request(request)
+        return raw_path, self._directory.joinpath(request.match_info["filename"]).resolve()
 
-        with filepath.open('rb') as f:
-            body = f.read() + LIVE_RELOAD_LOCAL_SNIPPET
+    def _read(self, path: Path, inject: bool, use_cache: bool) -> Tuple[Optional[str], Optional[CachedFile]]:
+        """
+        Read (or find in the cache) a file, this is run in an executor.
 
-        resp = web.Response(body=body, content_type="text/html")
-        # Mypy bug: https://github.com/python/mypy/issues/11892
-        resp.last_modified = filepath.stat().st_mtime  # type: ignore[assignment]
-        return resp
+        :return: tuple of (404 message if the file doesn't exist, cached file)
+        """
+        if not path.is_file():
+            return self._not_found_text(path), None
+        if not use_cache:
+            return None, None
+        return None, self.cache.get(path, LIVE_RELOAD_LOCAL_SNIPPET if inject else None)
+
+    async def _cached_response(self, request: web.Request, response: web.StreamResponse,
+                               path: Path) -> web.StreamResponse:
+        """
+        Serve the file from the in-memory cache, compressed if the client accepts it.
 
-    def _insert_footer_if_exists(
-        self, filename: str, response: web.StreamResponse
-    ) -> web.StreamResponse:
-        """Insert the footer if the file exists, otherwise return a 404 response."""
-        resolved_path = self._directory.joinpath(filename).resolve()
-        if not resolved_path.is_file():
-            return self._make_not_found_response(resolved_path)
-        return self._insert_footer(response)
+        Html files get the livereload snippet appended, other files fall back to the original
+        response if they're too large to cache or a range is requested. Concurrent requests for
+        the same file share a single read, and a single compression per encoding.
+        """
+        inject = self._add_tail_snippet and mimetypes.guess_type(request.match_info["filename"])[0] == "text/html"
+        use_cache = isinstance(response, web.FileResponse) and (inject or RANGE not in request.headers)
+        not_found, entry = await self._reads.run((path, inject, use_cache), self._read, path, inject, use_cache)
+        if not_found is not None:
+            return web.Response(text=not_found, status=404, content_type="text/plain")
+        if entry is None:
+            return response
 
-    def _make_not_found_response(self, raw_path: Path) -> web.StreamResponse:
-        """Create a 404 response with a list of available files under the requested path."""
+        encoding = negotiate_encoding(request.headers.get(ACCEPT_ENCODING, ""), entry.encodings)
+        if not entry.is_encoded(encoding):
+            # compress here rather than when building the response so it's done once, off the event loop
+            await self._compressions.run((entry, encoding), entry.encoded, encoding)
+        response = entry.response(request, encoding)
+        if self._fingerprint_static and not inject and request.query.get("v") == entry.digest:
+            # the url refers to this exact version of the file, so it can be cached forever.
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def _not_found_text(self, raw_path: Path) -> str:
         while not raw_path.is_dir():
             raw_path = raw_path.parent
-        paths = "\n".join(
-            " {}{}".format(p.relative_to(self._directory), "/" if p.is_dir() else "")
-            for p in raw_path.iterdir()
-        )
-        msg = "404: Not Found\n\nAvailable files under '{}/':\n{}\n".format(
-            raw_path.relative_to(self._directory), paths
-        )
-        return web.Response(text=msg, status=404, content_type="text/plain")
+        rel_path = raw_path.relative_to(self._directory)
+        names, total = self.cache.listing(raw_path)
+        paths = "\n".join(" {}".format(rel_path / name) + ("/" if name.endswith("/") else "") for name in names)
+        if total > len(names):
+            paths += "\n ... and {} more".format(total - len(names))
+        return "404: Not Found\n\nAvailable files under '{}/':\n{}\n".format(rel_path, paths)
+
+    def _make_not_found_response(self, raw_path: Path) -> web.StreamResponse:
+        """Create a 404 response with a list of available files under the requested path."""
+        return web.Response(text=self._not_found_text(raw_path), status=404, content_type="text/plain")
 
     async def _handle(self, request: web.Request) -> web.StreamResponse:
         loop = asyncio.get_running_loop()
-        raw_path = await loop.run_in_executor(None, self.modify_request, request)
+        raw_path, path = await loop.run_in_executor(None, self._resolve, request)
         try:
             response = await super()._handle(request)
         except HTTPNotFound:
@@ -436,17 +628,12 @@ class CustomStaticResource(StaticResource):
             # With aiohttp 3.10+, we need to also check if the file actually
             # exists since the base class does not check this anymore as its
             # done in the response to enable handling various compressed files.
-            response = await loop.run_in_executor(
-                None,
-                self._insert_footer_if_exists,
-                request.match_info["filename"],
-                response,
-            )
+            response = await self._cached_response(request, response, path)
             # Inject CORS headers to allow webfonts to load correctly
             response.headers["Access-Control-Allow-Origin"] = "*"
 
         if not self._browser_cache:
             # Add no-cache header to avoid browser caching in local development.
-            response.headers["Cache-Control"] = "no-cache"
+            response.headers.setdefault("Cache-Control", "no-cache")
 
         return response
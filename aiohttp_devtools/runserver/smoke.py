@@ -0,0 +1,102 @@
+import asyncio
+import statistics
+import time
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+from aiohttp import ClientError, ClientSession
+from ssl import SSLContext
+from yarl import URL
+
+from ..exceptions import AiohttpDevException
+from ..history import History
+from ..logs import fmt_duration, rs_dft_logger as logger
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+# Header sent with smoke benchmark requests, so they aren't shown in the access log.
+SMOKE_HEADER = "X-Adev-Smoke"
+# Requests timed for each route after each restart, the median is compared with the previous build's.
+SMOKE_REQUESTS = 10
+# Routes must be at least this many seconds slower than the previous build to be reported, smaller
+# differences are noise.
+MIN_REGRESSION = 0.002
+
+Target = Tuple[str, str]
+
+
+def parse_targets(urls: Iterable[str], routes_file: Optional[TextIO], base_url: str) -> List[Target]:
+    """
+    Build the list of (method, url) to request from urls and lines of the routes file.
+
+    Each may be prefixed with a method, eg. "POST /login", and may be a path relative to ``base_url``.
+    Blank lines and lines starting with "#" in the routes file are ignored.
+    """
+    lines = list(urls)
+    if routes_file is not None:
+        lines += [line.strip() for line in routes_file]
+    targets = []
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        method, _, url = line.partition(" ")
+        if method.upper() not in METHODS or not url:
+            method, url = "GET", line
+        url = url.strip()
+        if url.startswith("/"):
+            url = base_url.rstrip("/") + url
+        elif "://" not in url:
+            raise AiohttpDevException('"{}" is not a url or a path starting with "/"'.format(url))
+        targets.append((method.upper(), url))
+    if not targets:
+        raise AiohttpDevException("no urls to request")
+    return targets
+
+
+class SmokeBench:
+    """
+    Time a short list of requests once the app has restarted, and warn about routes which have got slower than
+    they were for the previous build, eg. because of an accidentally quadratic handler.
+
+    ``run()`` is called by ``AppTask`` once the app is responding.
+
+    :param threshold: percentage slower than the previous build a route must be to be reported
+    """
+
+    def __init__(self, targets: List[Target], threshold: int, history: Optional[History] = None):
+        self.targets = targets
+        self.threshold = threshold
+        self.history = history
+        self.previous: Dict[str, float] = {}
+
+    async def run(self, session: ClientSession, ssl: Union[SSLContext, bool] = True) -> None:
+        latencies: Dict[str, float] = {}
+        for method, url in self.targets:
+            name = "{} {}".format(method, URL(url).path_qs)
+            try:
+                # the first request isn't counted so one-off work, eg. compiling templates, isn't included
+                await self._request(session, method, url, ssl)
+                times = [await self._request(session, method, url, ssl) for _ in range(SMOKE_REQUESTS)]
+            except (ClientError, asyncio.TimeoutError, OSError) as e:
+                logger.warning("smoke benchmark: %s failed, %s: %s", name, type(e).__name__, e)
+            else:
+                latencies[name] = statistics.median(times)
+        self.compare(latencies)
+        if self.history is not None:
+            await self.history.record_async("smoke", [(name, "median", latency) for name, latency in latencies.items()])
+
+    async def _request(self, session: ClientSession, method: str, url: str, ssl: Union[SSLContext, bool]) -> float:
+        start = time.perf_counter()
+        async with session.request(method, url, ssl=ssl, allow_redirects=False, headers={SMOKE_HEADER: "1"}) as r:
+            await r.read()
+        return time.perf_counter() - start
+
+    def compare(self, latencies: Dict[str, float]) -> None:
+        """Warn about any routes slower than the previous build, these latencies become the new baseline."""
+        for name, latency in latencies.items():
+            previous = self.previous.get(name)
+            if (previous is not None and latency - previous >= MIN_REGRESSION
+                    and latency > previous * (1 + self.threshold / 100)):
+                logger.warning("smoke benchmark: %s is slower than the previous build, %s → %s (+%0.0f%%)",
+                               name, fmt_duration(previous), fmt_duration(latency), (latency / previous - 1) * 100)
+        logger.debug("smoke benchmark: %s", ", ".join("{} {}".format(n, fmt_duration(t)) for n, t in latencies.items()))
+        # routes which failed keep their last latency to compare against
+        self.previous.update(latencies)
@@ -0,0 +1,360 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from threading import Lock
+from typing import Any, AsyncIterator, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from aiohttp import web
+from aiohttp.hdrs import CONTENT_ENCODING, ETAG, VARY
+from watchfiles import awatch
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_T = TypeVar("_T")
+
+# Encodings we can produce on the fly, in order of preference.
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    ENCODERS["br"] = brotli.compress
+if zstandard is not None:
+    ENCODERS["zstd"] = zstandard.ZstdCompressor().compress
+ENCODERS["gzip"] = lambda data: gzip.compress(data, compresslevel=6)
+
+# File extensions of pre-built compressed siblings, eg. app.js.gz next to app.js, in order of preference.
+PRECOMPRESSED_EXTENSIONS = {"br": ".br", "zstd": ".zst", "gzip": ".gz"}
+
+COMPRESSIBLE_TYPES = frozenset((
+    "application/javascript", "application/json", "application/manifest+json", "application/wasm",
+    "application/xml", "image/svg+xml", "image/x-icon",
+))
+MIN_COMPRESS_SIZE = 256
+# Maximum number of entries shown when listing a directory on a 404 page.
+MAX_LISTING = 200
+# Maximum number of files fingerprinted for cache-busting urls.
+MAX_FINGERPRINTS = 10000
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """
+    Pick the best content-coding from an ``Accept-Encoding`` header.
+
+    :param accept_encoding: value of the request's ``Accept-Encoding`` header
+    :param available: encodings which can be served, in order of server preference
+    :return: the chosen encoding, or None to send the identity representation
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CachedFile:
+    """A static file held in memory along with any compressed variants of it."""
+
+    __slots__ = ("body", "content_type", "last_modified", "digest", "encodings", "_variants", "_lock")
+
+    def __init__(self, body: bytes, content_type: str, last_modified: float, path: Optional[Path] = None):
+        self.body = body
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.digest = content_hash(body)
+        # path is only set when the body is the unmodified file, so pre-built siblings can be used.
+        self._variants = _read_precompressed(path, last_modified) if path is not None else {}
+        compress = len(body) >= MIN_COMPRESS_SIZE and is_compressible(content_type)
+        # siblings are offered whatever the file's size or type, and even if we couldn't compress it ourselves
+        self.encodings = tuple(
+            e for e in PRECOMPRESSED_EXTENSIONS if e in self._variants or (compress and e in ENCODERS))
+        self._lock = Lock()
+
+    def is_encoded(self, encoding: Optional[str]) -> bool:
+        """Whether the body is already available in the given encoding, without compressing it."""
+        return encoding is None or encoding in self._variants
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """Return the body in the given encoding, compressing it the first time it's requested."""
+        if encoding is None:
+            return self.body
+        with self._lock:
+            data = self._variants.get(encoding)
+            if data is None:
+                data = ENCODERS[encoding](self.body)
+                self._variants[encoding] = data
+        return data
+
+    def etag(self, encoding: Optional[str]) -> str:
+        """Strong etag, each encoding is a different representation so gets a different tag."""
+        return self.digest if encoding is None else "{}-{}".format(self.digest, encoding)
+
+    def not_modified(self, request: web.BaseRequest, encoding: Optional[str]) -> bool:
+        """
+        Whether the client's cached copy is still valid.
+
+        If-Modified-Since is only considered when there's no If-None-Match as it has a granularity of
+        1 second, and so can't detect multiple saves in quick succession.
+        """
+        if_none_match = request.if_none_match
+        if if_none_match is not None:
+            etag = self.etag(encoding)
+            return any(tag.value == etag or tag.value == "*" for tag in if_none_match)
+        if_modified_since = request.if_modified_since
+        if if_modified_since is not None:
+            return int(self.last_modified) <= if_modified_since.timestamp()
+        return False
+
+    def response(self, request: web.BaseRequest, encoding: Optional[str]) -> web.Response:
+        if self.not_modified(request, encoding):
+            resp = web.Response(status=304)
+        else:
+            resp = web.Response(body=self.encoded(encoding), content_type=self.content_type)
+            if encoding is not None:
+                resp.headers[CONTENT_ENCODING] = encoding
+        if self.encodings:
+            resp.headers[VARY] = "Accept-Encoding"
+        resp.headers[ETAG] = '"{}"'.format(self.etag(encoding))
+        # Mypy bug: https://github.com/python/mypy/issues/11892
+        resp.last_modified = self.last_modified  # type: ignore[assignment]
+        return resp
+
+
+class StaticCache:
+    """
+    Bounded LRU cache of static files served by the auxiliary app.
+
+    Entries are checked against the file's mtime and size on each lookup and are also dropped
+    by the watcher as soon as files change. ``max_size`` bounds the total size of uncompressed bodies.
+    """
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024, max_file_size: int = 4 * 1024 * 1024):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self._entries: "OrderedDict[Tuple[Path, bool], Tuple[Tuple[int, int], CachedFile]]" = OrderedDict()
+        self._listings: Dict[Path, Tuple[int, List[str], int]] = {}
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, path: Path, snippet: Optional[bytes] = None) -> Optional[CachedFile]:
+        """
+        Get the cached version of a file, reading it from disk if it isn't cached or has changed.
+
+        :param path: resolved path of the file
+        :param snippet: bytes to append to the file's contents, eg. the livereload script tag
+        :return: the cached file or None if the file is too large to be cached
+        """
+        st = path.stat()
+        if st.st_size > self.max_file_size:
+            return None
+        key = (path, snippet is not None)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        body = path.read_bytes()
+        ct = mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+        if snippet is None:
+            entry = CachedFile(body, ct, st.st_mtime, path)
+        else:
+            entry = CachedFile(body + snippet, ct, st.st_mtime)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (stamp, entry)
+            self._size += len(entry.body)
+            while self._size > self.max_size and len(self._entries) > 1:
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def listing(self, directory: Path) -> Tuple[List[str], int]:
+        """
+        List a directory's contents, directories have a trailing "/".
+
+        :return: tuple of the first ``MAX_LISTING`` names sorted, and the total number of entries
+        """
+        mtime = directory.stat().st_mtime_ns
+        cached = self._listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        # scandir avoids a stat() call per entry, which matters for very large directories
+        with os.scandir(directory) as it:
+            names = [e.name + "/" if e.is_dir() else e.name for e in it]
+        listing = sorted(names)[:MAX_LISTING]
+        with self._lock:
+            self._listings[directory] = (mtime, listing, len(names))
+        return listing, len(names)
+
+    def _discard(self, key: Tuple[Path, bool]) -> None:
+        cached = self._entries.pop(key, None)
+        if cached is not None:
+            self._size -= len(cached[1].body)
+
+    def invalidate(self, paths: Optional[Iterable[str]] = None) -> None:
+        """Drop cached entries for the given paths, or everything if no paths are given."""
+        with self._lock:
+            if paths is None:
+                self._entries.clear()
+                self._listings.clear()
+                self._size = 0
+                return
+            changed = {os.path.realpath(p) for p in paths}
+            for parent in {os.path.dirname(p) for p in changed}:
+                self._listings.pop(Path(parent), None)
+            for key in [k for k in self._entries if str(k[0]) in changed or _is_sibling(k[0], changed)]:
+                self._discard(key)
+
+
+def _read_precompressed(path: Path, last_modified: float) -> Dict[str, bytes]:
+    """Read the pre-built compressed siblings of a file, eg. app.js.br, which are up to date."""
+    variants = {}
+    for encoding, ext in PRECOMPRESSED_EXTENSIONS.items():
+        sibling = path.with_name(path.name + ext)
+        try:
+            if sibling.stat().st_mtime < last_modified:
+                # stale sibling left over from an earlier build, ignore it
+                continue
+            variants[encoding] = sibling.read_bytes()
+        except OSError:
+            continue
+    return variants
+
+
+def _is_sibling(path: Path, changed: Set[str]) -> bool:
+    """Whether a pre-built compressed version of path has changed."""
+    return any(str(path) + ext in changed for ext in PRECOMPRESSED_EXTENSIONS.values())
+
+
+class Fingerprints:
+    """
+    Content hashes of files under a directory, used to build cache-busting urls.
+
+    Hashes are calculated in an executor when the app starts and again for files the watcher sees change,
+    so looking one up while rendering a template doesn't touch the disk. At most ``max_files`` files are
+    fingerprinted, urls for other files are left as they are. Hashes match ``CachedFile.digest`` so the
+    auxiliary app can tell if a url refers to the current version of a file.
+    """
+
+    def __init__(self, directory: Path, max_files: int = MAX_FINGERPRINTS):
+        self.directory = directory
+        self.max_files = max_files
+        self._hashes: Dict[str, str] = {}
+
+    def get(self, rel_path: str) -> Optional[str]:
+        return self._hashes.get(rel_path.split("?", 1)[0].lstrip("/"))
+
+    def update(self, paths: Optional[Iterable[str]] = None) -> None:
+        """
+        Hash the given files, or every file under the directory if no paths are given, this is run in an executor.
+
+        Files which no longer exist are dropped.
+        """
+        root = os.path.realpath(self.directory)
+        if paths is None:
+            hashes: Dict[str, str] = {}
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames[:self.max_files - len(hashes)]:
+                    self._hash(hashes, root, os.path.join(dirpath, name))
+                if len(hashes) >= self.max_files:
+                    break
+            self._hashes = hashes
+            return
+        for path in paths:
+            self._hash(self._hashes, root, os.path.realpath(path))
+
+    def _hash(self, hashes: Dict[str, str], root: str, path: str) -> None:
+        rel_path = os.path.relpath(path, root)
+        if rel_path.startswith(os.pardir):
+            return
+        rel_path = Path(rel_path).as_posix()
+        try:
+            with open(path, "rb") as f:
+                digest = content_hash(f.read())
+        except OSError:
+            hashes.pop(rel_path, None)
+            return
+        if rel_path in hashes or len(hashes) < self.max_files:
+            hashes[rel_path] = digest
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        """Hash every file when the app starts, then rehash files as they change until it's cleaned up."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.update)
+        stopper = asyncio.Event()
+
+        async def watch() -> None:
+            async for changes in awatch(self.directory, stop_event=stopper, step=250):
+                await loop.run_in_executor(None, self.update, [c[1] for c in changes])
+
+        task = asyncio.create_task(watch())
+        yield
+        stopper.set()
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+class SingleFlight(Generic[_T]):
+    """
+    Run a function in the default executor, sharing the result between concurrent callers with the same key.
+
+    Used so a burst of requests for the same file (eg. every browser reloading at once) results in one
+    read and compression rather than one per request.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Future[_T]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, func: Callable[..., _T], *args: Any) -> _T:
+        fut = self._calls.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().run_in_executor(None, func, *args)
+            self._calls[key] = fut
+            fut.add_done_callback(lambda f: self._done(key, f))
+        # shield so one waiter being cancelled doesn't cancel the call for the others
+        return await asyncio.shield(fut)
+
+    def _done(self, key: Hashable, fut: "asyncio.Future[_T]") -> None:
+        if self._calls.get(key) is fut:
+            del self._calls[key]
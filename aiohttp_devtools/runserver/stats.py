@@ -0,0 +1,363 @@
+import asyncio
+import gc
+import json
+import math
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from ..history import History, Sample
+from ..logs import fmt_duration, rs_dft_logger as logger
+from .memory import rss
+
+# Seconds between summaries of the routes requested since the last summary.
+ROUTE_STATS_INTERVAL = 60
+# Maximum number of routes shown in a summary, the slowest are shown.
+MAX_SUMMARY_ROUTES = 20
+# Number of recent garbage collections kept to attribute their pauses to the requests they interrupted.
+GC_HISTORY = 1000
+# Histogram buckets are spaced so each is 2**(1/8) (~9%) wider than the last, starting at 10µs.
+_BUCKET_BASE = 1e-5
+_BUCKETS_PER_DOUBLING = 8
+
+
+class Histogram:
+    """Latency histogram with logarithmic buckets, percentiles are accurate to within ~9%."""
+
+    __slots__ = ("count", "errors", "total", "gc_total", "max", "_buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        # time spent in garbage collection while these requests were being handled
+        self.gc_total = 0.0
+        self.max = 0.0
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, duration: float, error: bool = False, gc_pause: float = 0.0) -> None:
+        self.count += 1
+        self.errors += error
+        self.total += duration
+        self.gc_total += gc_pause
+        if duration > self.max:
+            self.max = duration
+        index = int(math.log2(duration / _BUCKET_BASE) * _BUCKETS_PER_DOUBLING) if duration > _BUCKET_BASE else 0
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.gc_total += other.gc_total
+        self.max = max(self.max, other.max)
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+
+    def counts(self, per_doubling: int = _BUCKETS_PER_DOUBLING) -> List[Tuple[float, int]]:
+        """
+        :param per_doubling: number of buckets for each doubling of latency, must be a divisor of 8 so buckets
+          can be merged into wider ones
+        :return: (upper bound in seconds, count) for each non-empty bucket, fastest first
+        """
+        merge = _BUCKETS_PER_DOUBLING // per_doubling
+        counts: Dict[int, int] = {}
+        for index, count in self._buckets.items():
+            counts[index // merge] = counts.get(index // merge, 0) + count
+        return [(_BUCKET_BASE * 2 ** ((index + 1) / per_doubling), count) for index, count in sorted(counts.items())]
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: percentile between 0 and 100
+        :return: upper bound of the bucket containing the percentile in seconds, or 0 if nothing has been recorded
+        """
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(_BUCKET_BASE * 2 ** ((index + 1) / _BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+
+class RouteStats:
+    """
+    Request counts and latencies for each route of the main app.
+
+    Routes are identified by method and the matched resource's canonical path, eg. "GET /users/{id}",
+    so requests for different ids are grouped together.
+    """
+
+    def __init__(self) -> None:
+        self.window: Dict[str, Histogram] = {}
+        self.totals: Dict[str, Histogram] = {}
+
+    def record(self, request: web.BaseRequest, status: int, duration: float, gc_pause: float = 0.0) -> None:
+        match_info = getattr(request, "match_info", None)
+        resource = match_info.route.resource if match_info is not None else None
+        route = "{} {}".format(request.method, resource.canonical if resource is not None else "(no route)")
+        hist = self.window.get(route)
+        if hist is None:
+            hist = self.window[route] = Histogram()
+        hist.add(duration, status >= 500, gc_pause)
+
+    def _flush_window(self) -> Dict[str, Histogram]:
+        window, self.window = self.window, {}
+        for route, hist in window.items():
+            total = self.totals.get(route)
+            if total is None:
+                total = self.totals[route] = Histogram()
+            total.merge(hist)
+        return window
+
+    def all(self) -> Dict[str, Histogram]:
+        """All requests recorded since start, without resetting the window."""
+        routes: Dict[str, Histogram] = {}
+        for source in (self.totals, self.window):
+            for route, hist in source.items():
+                merged = routes.get(route)
+                if merged is None:
+                    merged = routes[route] = Histogram()
+                merged.merge(hist)
+        return routes
+
+    def summary(self, title: str, totals: bool = False) -> Optional[str]:
+        """
+        Build a table of the routes' latencies, slowest first. Requests recorded since the last summary are
+        shown unless ``totals`` is set, in which case all requests are shown.
+
+        :return: the table, or None if there are no requests to show
+        """
+        window = self._flush_window()
+        routes = self.totals if totals else window
+        if not routes:
+            return None
+        rows = sorted(routes.items(), key=lambda r: r[1].percentile(95), reverse=True)
+        width = max(len("route"), *(len(route) for route, _ in rows[:MAX_SUMMARY_ROUTES]))
+        lines: List[str] = [
+            title,
+            "  {:<{w}} {:>7} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                "route", "count", "5xx", "p50", "p95", "p99", "max", "gc/req", w=width),
+        ]
+        for route, hist in rows[:MAX_SUMMARY_ROUTES]:
+            lines.append("  {:<{w}} {:>7} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                route, hist.count, hist.errors, fmt_duration(hist.percentile(50)), fmt_duration(hist.percentile(95)),
+                fmt_duration(hist.percentile(99)), fmt_duration(hist.max), fmt_duration(hist.gc_total / hist.count),
+                w=width))
+        if len(rows) > MAX_SUMMARY_ROUTES:
+            lines.append("  ...and {} more routes".format(len(rows) - MAX_SUMMARY_ROUTES))
+        return "\n".join(lines)
+
+
+class GCStats:
+    """
+    Number of garbage collections and the time spent in them for each generation, recorded via ``gc.callbacks``.
+
+    The most recent collections are also kept so their pauses can be attributed to the requests being handled
+    at the time, see ``pauses_during()``.
+    """
+
+    def __init__(self) -> None:
+        self.collections = [0] * 3
+        self.pause_total = [0.0] * 3
+        self.pause_max = [0.0] * 3
+        # (end, pause, generation) of recent collections, oldest first
+        self.recent: Deque[Tuple[float, float, int]] = deque(maxlen=GC_HISTORY)
+        self._start = 0.0
+
+    def start(self) -> None:
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+
+    def stop(self) -> None:
+        with suppress(ValueError):
+            gc.callbacks.remove(self._callback)
+
+    def _callback(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == "start":
+            self._start = time.perf_counter()
+            return
+        end = time.perf_counter()
+        pause = end - self._start
+        generation = info["generation"]
+        self.collections[generation] += 1
+        self.pause_total[generation] += pause
+        if pause > self.pause_max[generation]:
+            self.pause_max[generation] = pause
+        self.recent.append((end, pause, generation))
+
+    def pauses_during(self, duration: float) -> Tuple[float, int]:
+        """
+        Time spent in garbage collection during the last ``duration`` seconds, eg. while a request which has
+        just finished was being handled. Collections which only partially overlap are counted in full.
+
+        :return: total pause in seconds and the oldest generation collected, or -1 if there were no collections
+        """
+        since = time.perf_counter() - duration
+        while True:
+            total = 0.0
+            generation = -1
+            try:
+                for end, pause, gen in reversed(self.recent):
+                    if end < since:
+                        break
+                    total += pause
+                    if gen > generation:
+                        generation = gen
+            except RuntimeError:
+                # a collection in another thread was recorded while iterating
+                continue
+            return total, generation
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        self.start()
+        yield
+        self.stop()
+
+
+# shared between connections since an AccessLogger is created for each one
+route_stats = RouteStats()
+gc_stats = GCStats()
+
+
+async def log_route_stats(app: web.Application) -> AsyncIterator[None]:
+    """Cleanup context logging a summary of route latencies periodically, and for the whole run on shutdown."""
+    async def log_periodically() -> None:
+        while True:
+            await asyncio.sleep(ROUTE_STATS_INTERVAL)
+            summary = route_stats.summary("route latencies, last {}s:".format(ROUTE_STATS_INTERVAL))
+            if summary:
+                logger.info(summary)
+
+    task = asyncio.create_task(log_periodically())
+    yield
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    summary = route_stats.summary("route latencies since start:", totals=True)
+    if summary:
+        logger.info(summary)
+
+
+def record_route_stats(history: History) -> Callable[[web.Application], AsyncIterator[None]]:
+    """Create a cleanup context recording the latencies of each route since start to ``history`` on shutdown."""
+    async def ctx(app: web.Application) -> AsyncIterator[None]:
+        yield
+        samples: List[Sample] = []
+        for route, hist in route_stats.all().items():
+            samples += [(route, "count", hist.count), (route, "p50", hist.percentile(50)),
+                        (route, "p95", hist.percentile(95)), (route, "p99", hist.percentile(99)),
+                        (route, "max", hist.max)]
+        await history.record_async("routes", samples)
+    return ctx
+
+
+class RuntimeStats:
+    """
+    Read-only endpoints describing the running app, for charting the dev server during load tests.
+
+    ``{url_prefix}`` returns JSON, ``{metrics_url}`` returns the same values in Prometheus' text format.
+    """
+
+    def __init__(self, url_prefix: str, metrics_url: str):
+        self.url_prefix = url_prefix
+        self.metrics_url = metrics_url
+        self.started = time.monotonic()
+
+    def collect(self, request: web.Request) -> Dict[str, Any]:
+        # the Server which created this request's protocol knows about all the open connections
+        manager = getattr(request.protocol, "_manager", None)
+        gc_counts = gc.get_stats()
+        return {
+            "uptime": time.monotonic() - self.started,
+            "tasks": len(asyncio.all_tasks()),
+            "connections": len(manager.connections) if manager is not None else None,
+            "rss": rss(),
+            "gc": [
+                {
+                    "generation": generation,
+                    "collections": gc_counts[generation]["collections"],
+                    "collected": gc_counts[generation]["collected"],
+                    "timed_collections": gc_stats.collections[generation],
+                    "pause_total": gc_stats.pause_total[generation],
+                    "pause_max": gc_stats.pause_max[generation],
+                }
+                for generation in range(3)
+            ],
+            "routes": {
+                route: {
+                    "count": hist.count,
+                    "errors": hist.errors,
+                    "mean": hist.total / hist.count,
+                    "gc_mean": hist.gc_total / hist.count,
+                    "p50": hist.percentile(50),
+                    "p95": hist.percentile(95),
+                    "p99": hist.percentile(99),
+                    "max": hist.max,
+                }
+                for route, hist in sorted(route_stats.all().items())
+            },
+        }
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.collect(request), dumps=lambda v: json.dumps(v, indent=2))
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=prometheus_text(self.collect(request)),
+                            content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    def add_routes(self, app: web.Application) -> None:
+        app.router.add_get(self.url_prefix, self.stats, name="_devtools.stats")
+        app.router.add_get(self.metrics_url, self.metrics, name="_devtools.metrics")
+
+
+def prometheus_text(stats: Dict[str, Any]) -> str:
+    """Render the values from ``RuntimeStats.collect()`` in Prometheus' text exposition format."""
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Dict[str, Any], Any]]) -> None:
+        """Add a metric, each sample is a (name suffix, labels, value) tuple, samples with no value are skipped."""
+        samples = [s for s in samples if s[2] is not None]
+        if not samples:
+            return
+        lines.append("# HELP adev_{} {}".format(name, help_text))
+        lines.append("# TYPE adev_{} {}".format(name, kind))
+        for suffix, labels, value in samples:
+            label_str = ",".join('{}="{}"'.format(k, _escape_label(str(v))) for k, v in labels.items())
+            lines.append("adev_{}{}{} {}".format(name, suffix, "{" + label_str + "}" if label_str else "", value))
+
+    metric("uptime_seconds", "gauge", "Seconds since the app started.", [("", {}, stats["uptime"])])
+    metric("tasks", "gauge", "Tasks on the event loop.", [("", {}, stats["tasks"])])
+    metric("connections", "gauge", "Open connections to the app.", [("", {}, stats["connections"])])
+    metric("resident_memory_bytes", "gauge", "Resident set size of the app process.", [("", {}, stats["rss"])])
+    gcs = stats["gc"]
+    metric("gc_collections_total", "counter", "Garbage collections by generation.",
+           [("", {"generation": g["generation"]}, g["collections"]) for g in gcs])
+    metric("gc_collected_total", "counter", "Objects freed by garbage collections by generation.",
+           [("", {"generation": g["generation"]}, g["collected"]) for g in gcs])
+    metric("gc_pause_seconds_total", "counter", "Time spent in garbage collections by generation.",
+           [("", {"generation": g["generation"]}, g["pause_total"]) for g in gcs])
+    metric("gc_pause_max_seconds", "gauge", "Longest garbage collection by generation.",
+           [("", {"generation": g["generation"]}, g["pause_max"]) for g in gcs])
+
+    routes = stats["routes"]
+    durations: List[Tuple[str, Dict[str, Any], Any]] = []
+    for route, r in routes.items():
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+            durations.append(("", {"route": route, "quantile": quantile}, r[key]))
+        durations.append(("_sum", {"route": route}, r["mean"] * r["count"]))
+        durations.append(("_count", {"route": route}, r["count"]))
+    metric("request_duration_seconds", "summary", "Request latency by route.", durations)
+    metric("request_gc_seconds_total", "counter", "Time spent in garbage collection during requests by route.",
+           [("", {"route": route}, r["gc_mean"] * r["count"]) for route, r in routes.items()])
+    metric("request_errors_total", "counter", "Requests with a 5xx response by route.",
+           [("", {"route": route}, r["errors"]) for route, r in routes.items()])
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
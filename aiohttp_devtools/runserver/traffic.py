@@ -0,0 +1,99 @@
+import base64
+import json
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, TextIO
+
+from aiohttp import hdrs, web
+from aiohttp.typedefs import Handler
+
+from ..logs import rs_dft_logger as logger
+from .smoke import SMOKE_HEADER
+
+# Header sent with replayed requests, so replaying a recording doesn't record the requests again.
+REPLAY_HEADER = "X-Adev-Replay"
+# Requests with larger bodies aren't recorded.
+MAX_RECORD_BODY = 1024 * 1024
+# Headers which describe the connection rather than the request, the client sets its own when replaying.
+SKIP_HEADERS = {"host", "content-length", "transfer-encoding", "connection", "keep-alive", "te", "upgrade"}
+
+
+class TrafficRecorder:
+    """
+    Append each request the app handles to ``path`` as a line of JSON, so a dev session can be replayed later
+    with "adev replay".
+
+    Each line has the time the request was received, method, raw path and query, headers, body (as text or
+    base64 if it isn't utf-8) and the status and seconds taken by the app to respond, which replayed latencies
+    are compared with. Requests to devtools endpoints, websockets, smoke benchmark and replayed requests aren't
+    recorded, nor are requests with multipart or chunked bodies, since recording the body would stop the handler
+    streaming it.
+    """
+
+    def __init__(self, path: Path, skip_prefix: str):
+        self.path = path
+        self.skip_prefix = skip_prefix
+        self._file: Optional[TextIO] = None
+
+    async def cleanup_ctx(self, app: web.Application) -> AsyncIterator[None]:
+        # appended to so recordings continue across restarts
+        self._file = self.path.open("a", encoding="utf-8")
+        logger.debug("recording requests to %s", self.path)
+        yield
+        self._file.close()
+        self._file = None
+
+    def wants(self, request: web.Request) -> bool:
+        return (self._file is not None
+                and not request.path.startswith(self.skip_prefix)
+                and SMOKE_HEADER not in request.headers
+                and REPLAY_HEADER not in request.headers
+                and hdrs.UPGRADE not in request.headers)
+
+    async def record(self, handler: Handler, request: web.Request) -> web.StreamResponse:
+        """Handle a request, recording it once the app has responded."""
+        if not self.wants(request):
+            return await handler(request)
+        if request.body_exists:
+            # reading the body drains request.content, only read()/text()/json()/post() still work in the handler
+            # afterwards, so multipart requests (usually uploads read with multipart()) and chunked requests
+            # (usually streamed, and of unknown size) aren't recorded
+            if request.content_length is None or request.content_type.startswith("multipart/"):
+                logger.debug("not recording %s %s, body is streamed", request.method, request.path_qs)
+                return await handler(request)
+            if request.content_length > MAX_RECORD_BODY:
+                logger.debug("not recording %s %s, body too large", request.method, request.path_qs)
+                return await handler(request)
+
+        ts = time.time()
+        body = await request.read() if request.body_exists else b""
+        entry: Dict[str, Any] = {
+            "ts": round(ts, 3),
+            "method": request.method,
+            "path": request.raw_path,
+            "headers": [[k, v] for k, v in request.headers.items() if k.lower() not in SKIP_HEADERS],
+        }
+        try:
+            entry["body"] = body.decode()
+        except UnicodeDecodeError:
+            entry["body64"] = base64.b64encode(body).decode()
+
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            entry["status"] = status
+            entry["duration"] = round(time.perf_counter() - start, 6)
+            self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
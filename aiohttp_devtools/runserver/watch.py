@@ -13,9 +13,11 @@ from aiohttp.client_exceptions import ClientError, ClientConnectionError
 from watchfiles import awatch
 
 from ..exceptions import AiohttpDevException
-from ..logs import rs_dft_logger as logger
+from ..logs import log_event, rs_dft_logger as logger
 from .config import Config
-from .serve import LAST_RELOAD, STATIC_PATH, WS, serve_main_app, src_reload
+from .hooks import STOP_TIMEOUT
+from .serve import LAST_RELOAD, STATIC_PATH, WS, invalidate_static, serve_main_app, src_reload
+from .smoke import SmokeBench
 from ssl import SSLContext
 
 
@@ -63,6 +65,10 @@ class AppTask(WatchTask):
         self._session: Optional[ClientSession] = None
         self._runner = None
         self._client_ssl_context: Union[bool, SSLContext] = True
+        self._smoke: Optional[SmokeBench] = None
+        self._smoke_task: Optional["asyncio.Task[None]"] = None
+        if self._config.smoke_targets:
+            self._smoke = SmokeBench(self._config.smoke_targets, self._config.smoke_threshold, self._config.history)
         assert self._config.watch_path
 
         super().__init__(self._config.watch_path)
@@ -74,11 +80,16 @@ class AppTask(WatchTask):
         self._client_ssl_context = self._config.client_ssl_context
 
         try:
+            await self._update_commit()
             self._start_dev_server()
+            # waited for in the background, so changes are watched for while the app starts
+            self._start_smoke_bench(live_checks)
 
             async for changes in self._awatch:
                 self._reloads += 1
                 logger.debug("file changes: %s", changes)
+                invalidate_static(self._app, changes)
+                log_event("watch", changes=len(changes))
                 if any(f.endswith('.py') for _, f in changes):
                     logger.debug('%d changes, restarting server', len(changes))
 
@@ -92,9 +103,13 @@ class AppTask(WatchTask):
                             if len(self._app[WS]) >= count:
                                 break
 
+                    start = time.monotonic()
                     await self._stop_dev_server()
+                    await self._update_commit()
                     self._start_dev_server()
-                    await self._src_reload_when_live(live_checks)
+                    log_event("restart", changes=len(changes), duration_ms=round((time.monotonic() - start) * 1000, 3))
+                    if await self._src_reload_when_live(live_checks):
+                        self._start_smoke_bench()
                     # Pause to allow the browser to reload and reconnect. This avoids
                     # multiple changes causing the app to restart before WS reconnection.
                     await asyncio.sleep(1)
@@ -109,23 +124,50 @@ class AppTask(WatchTask):
             await self._session.close()
             raise AiohttpDevException('error running dev server')
 
-    async def _src_reload_when_live(self, checks: int) -> None:
-        assert self._app is not None and self._session is not None
+    async def _src_reload_when_live(self, checks: int) -> bool:
+        """
+        Wait for the app to respond, then prompt any connected browsers to reload.
 
-        if self._app[WS]:
-            url = "{0.protocol}://{0.host}:{0.main_port}/?_checking_alive=1".format(self._config)
-            logger.debug('checking app at "%s" is running before prompting reload...', url)
-            for i in range(checks):
-                await asyncio.sleep(0.1)
-                try:
-                    async with self._session.get(url, ssl=self._client_ssl_context):
-                        pass
-                except OSError as e:
-                    logger.debug('try %d | OSError %d app not running', i, e.errno)
-                else:
-                    logger.debug('try %d | app running, reloading...', i)
-                    await src_reload(self._app)
-                    return
+        :return: whether the app is responding, it's only checked if browsers are connected or there's a smoke
+          benchmark to run
+        """
+        assert self._app is not None
+
+        if (self._app[WS] or self._smoke is not None) and await self._wait_live(checks):
+            logger.debug("app running, reloading...")
+            await src_reload(self._app)
+            return True
+        return False
+
+    async def _wait_live(self, checks: int) -> bool:
+        """Poll the app until it responds, return False if it doesn't after ``checks`` tries."""
+        assert self._session is not None
+
+        url = "{0.protocol}://{0.host}:{0.main_port}/?_checking_alive=1".format(self._config)
+        logger.debug('checking app at "%s" is running...', url)
+        for i in range(checks):
+            await asyncio.sleep(0.1)
+            try:
+                async with self._session.get(url, ssl=self._client_ssl_context):
+                    pass
+            except OSError as e:
+                logger.debug('try %d | OSError %d app not running', i, e.errno)
+            else:
+                logger.debug("try %d | app running", i)
+                return True
+        return False
+
+    async def _run_smoke_bench(self, live_checks: int) -> None:
+        assert self._smoke is not None and self._session is not None
+        # browsers are already showing the app which has just started, so they aren't prompted to reload
+        if live_checks and not await self._wait_live(live_checks):
+            return
+        await self._smoke.run(self._session, self._client_ssl_context)
+
+    async def _update_commit(self) -> None:
+        if self._config.history is not None:
+            # looked up once for each app process, which gets it with the config, rather than for every sample
+            await asyncio.get_running_loop().run_in_executor(None, self._config.history.update_commit)
 
     def _start_dev_server(self) -> None:
         act = 'Start' if self._reloads == 0 else 'Restart'
@@ -144,7 +186,19 @@ class AppTask(WatchTask):
         self._process = Process(target=serve_main_app, args=(self._config, tty_path))
         self._process.start()
 
+    def _start_smoke_bench(self, live_checks: int = 0) -> None:
+        """:param live_checks: if set, first wait for the app to respond"""
+        if self._smoke is not None:
+            self._smoke_task = asyncio.create_task(self._run_smoke_bench(live_checks))
+
     async def _stop_dev_server(self) -> None:
+        if self._smoke_task is not None:
+            # results from a process which is being stopped would be meaningless
+            self._smoke_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._smoke_task
+            self._smoke_task = None
+
         if self._process.is_alive():
             logger.debug('stopping server process...')
             if self._config.shutdown_by_url:  # Workaround for signals not working on Windows
@@ -164,7 +218,7 @@ class AppTask(WatchTask):
                         logger.warning(msg.format(type(ex), ex), exc_info=True)
                         return
                 else:
-                    self._process.join(5)
+                    self._process.join(STOP_TIMEOUT)
                     if self._process.exitcode is None:
                         logger.warning("shutdown endpoint did not terminate process, trying signals")
                     else:
@@ -173,7 +227,7 @@ class AppTask(WatchTask):
             if self._process.pid:
                 logger.debug("sending SIGINT")
                 os.kill(self._process.pid, signal.SIGINT)
-            self._process.join(5)
+            self._process.join(STOP_TIMEOUT)
             if self._process.exitcode is None:
                 logger.warning('process has not terminated, sending SIGKILL')
                 self._process.kill()
@@ -194,6 +248,8 @@ class AppTask(WatchTask):
 class LiveReloadTask(WatchTask):
     async def _run(self) -> None:
         async for changes in self._awatch:
+            invalidate_static(self._app, changes)
+            log_event("watch", changes=len(changes))
             if len(changes) > 1:
                 await src_reload(self._app)
             else:
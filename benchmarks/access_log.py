@@ -0,0 +1,52 @@
+"""
+Measure access log throughput, from ``AccessLogger.log`` through ``AccessFormatter`` to a stream.
+
+Usage:
+
+    python benchmarks/access_log.py [records]
+
+Records are written to os.devnull, both with and without colour, the best of 3 rounds is reported.
+"""
+import logging
+import os
+import sys
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from aiohttp_devtools.logs import AccessFormatter, HighlightStreamHandler
+from aiohttp_devtools.runserver.log_handlers import AccessLogger
+
+
+def time_log(n: int, tty: bool) -> float:
+    with open(os.devnull, "w") as stream:
+        handler = HighlightStreamHandler(stream)
+        formatter = AccessFormatter()
+        formatter.stream_is_tty = tty
+        handler.setFormatter(formatter)
+        logger = logging.getLogger("bench.access")
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        access_logger = AccessLogger(logger, "")
+        request = make_mocked_request("GET", "/foo/bar?v=1")
+        response = web.Response(text="hello world")
+        start = time.perf_counter()
+        for _ in range(n):
+            access_logger.log(request, response, 0.0123)
+        elapsed = time.perf_counter() - start
+        logger.handlers = []
+    return elapsed / n
+
+
+def main(n: int) -> None:
+    print("{} records".format(n))
+    for tty in (False, True):
+        best = min(time_log(n, tty) for _ in range(3))
+        print("{:<9} {:6.2f}µs/record  {:9,.0f} records/s".format("colour" if tty else "plain", best * 1e6, 1 / best))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
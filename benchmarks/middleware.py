@@ -0,0 +1,94 @@
+"""
+Measure the per-request overhead added to an app by ``modify_main_app``.
+
+Usage:
+
+    python benchmarks/middleware.py [requests]
+
+Requests are timed two ways against a bare app and the same app modified by adev, the best of 3 rounds
+is reported:
+* dispatch: ``Application._handle`` called directly, isolating the middleware cost
+* http: real requests over a keep-alive connection to a ``web.AppRunner``
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import make_mocked_request
+
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.serve import modify_main_app
+
+HTML = "<html><body>{}</body></html>".format("<p>hello world</p>" * 50)
+
+
+async def html(request: web.Request) -> web.Response:
+    return web.Response(text=HTML, content_type="text/html")
+
+
+def create_app(modified: bool, config: Config) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/", html)
+    if modified:
+        modify_main_app(app, config)
+    return app
+
+
+async def time_dispatch(app: web.Application, n: int) -> float:
+    app.freeze()
+    await app.startup()
+    requests = [make_mocked_request("GET", "/", headers={"Host": "localhost:8000"}, app=app) for _ in range(n)]
+    start = time.perf_counter()
+    for request in requests:
+        await app._handle(request)
+    elapsed = time.perf_counter() - start
+    await app.cleanup()
+    return elapsed / n
+
+
+async def time_http(app: web.Application, n: int) -> float:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = "http://127.0.0.1:{}/".format(port)
+    async with ClientSession() as session:
+        for _ in range(min(n // 10, 200)):  # warmup
+            async with session.get(url) as r:
+                await r.read()
+        start = time.perf_counter()
+        for _ in range(n):
+            async with session.get(url) as r:
+                await r.read()
+        elapsed = time.perf_counter() - start
+    await runner.cleanup()
+    return elapsed / n
+
+
+async def compare(name: str, n: int, config: Config,
+                  timer: Callable[[web.Application, int], Awaitable[float]], rounds: int = 3) -> None:
+    # alternate between the apps and take the best round of each to reduce noise
+    bare = modified = float("inf")
+    for _ in range(rounds):
+        bare = min(bare, await timer(create_app(False, config), n))
+        modified = min(modified, await timer(create_app(True, config), n))
+    print("{:<9} bare {:8.1f}µs  adev {:8.1f}µs  overhead {:+7.1f}µs/request ({:+.1f}%)".format(
+        name, bare * 1e6, modified * 1e6, (modified - bare) * 1e6, (modified / bare - 1) * 100))
+
+
+async def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "app.py").write_text("")
+        config = Config(app_path=str(Path(tmpdir, "app.py")), root_path=tmpdir, static_path=tmpdir)
+        print("{} requests, livereload injection, no-cache headers and static url inference enabled".format(n))
+        await compare("dispatch", n, config, time_dispatch)
+        await compare("http", n, config, time_http)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,117 @@
+import io
+import pytest
+from aiohttp import web
+from click.testing import CliRunner
+
+from aiohttp_devtools.bench import Bench, BenchResult, parse_targets
+from aiohttp_devtools.cli import cli
+from aiohttp_devtools.exceptions import AiohttpDevException
+
+
+def test_parse_targets():
+    routes = io.StringIO("# comment\n\nPOST /login\n  delete http://example.com/x  \n/foo bar\n")
+    assert parse_targets(["/", "http://localhost:9000/a"], routes, "http://localhost:8000/") == [
+        ("GET", "http://localhost:8000/"),
+        ("GET", "http://localhost:9000/a"),
+        ("POST", "http://localhost:8000/login"),
+        ("DELETE", "http://example.com/x"),
+        ("GET", "http://localhost:8000/foo bar"),
+    ]
+
+
+def test_parse_targets_invalid():
+    with pytest.raises(AiohttpDevException, match='"foo" is not a url or a path starting with "/"'):
+        parse_targets(["foo"], None, "http://localhost:8000")
+    with pytest.raises(AiohttpDevException, match="no urls to request"):
+        parse_targets([], io.StringIO("# nothing\n"), "http://localhost:8000")
+
+
+async def test_bench(aiohttp_server):
+    async def hello(request):
+        return web.Response(text="hello")
+
+    async def error(request):
+        raise web.HTTPInternalServerError()
+
+    app = web.Application()
+    app.router.add_get("/", hello)
+    app.router.add_post("/error", error)
+    server = await aiohttp_server(app)
+    targets = parse_targets(["/", "POST /error", "/missing"], None, str(server.make_url("/")))
+    result = await Bench(targets, concurrency=3, duration=0.2, warmup=0.05).run()
+
+    assert result.latency.count > 30
+    assert 0.2 <= result.elapsed < 0.5
+    assert set(result.statuses) == {200, 404, 500}
+    assert set(result.errors) == {"404 Not Found", "500 Internal Server Error"}
+    assert result.latency.errors == sum(result.errors.values())
+    assert result.bytes >= result.statuses[200] * 5
+
+    lines = result.report().split("\n")
+    assert lines[0].startswith("{} requests in ".format(result.latency.count))
+    assert " requests/s, " in lines[0]
+    assert lines[1].startswith("latency: mean ")
+    assert any(line.startswith("  ≤") and "█" in line for line in lines)
+    assert lines[-3].startswith("errors: ")
+    errors = {line.rsplit(" ×", 1)[0] for line in lines[-2:]}
+    assert errors == {"  404 Not Found", "  500 Internal Server Error"}
+
+
+async def test_bench_rate(aiohttp_server):
+    async def hello(request):
+        return web.Response(text="hello")
+
+    app = web.Application()
+    app.router.add_get("/", hello)
+    server = await aiohttp_server(app)
+    result = await Bench([("GET", str(server.make_url("/")))], concurrency=5, duration=0.3, rate=50,
+                         warmup=0).run()
+    assert 10 <= result.latency.count <= 17
+    assert not result.errors
+
+
+async def test_bench_connection_error(unused_tcp_port_factory):
+    url = "http://localhost:{}/".format(unused_tcp_port_factory())
+    result = await Bench([("GET", url)], concurrency=1, duration=0.05, warmup=0).run()
+    assert result.latency.count == result.latency.errors > 0
+    assert list(result.errors)[0].startswith("ClientConnectorError: ")
+    assert not result.statuses
+
+
+def test_bench_result_empty():
+    result = BenchResult()
+    result.elapsed = 1
+    assert result.report() == "no requests completed in 1.0s"
+
+
+def test_cli_bench(mocker):
+    result = BenchResult()
+    result.elapsed = 1
+    result.add(0.01, 200, 100, None)
+    # asyncio.run() would replace the test's event loop
+    mocker.patch("aiohttp_devtools.cli.asyncio.run", return_value=result)
+    mock_bench = mocker.patch("aiohttp_devtools.cli.Bench")
+    runner = CliRunner()
+    output = runner.invoke(cli, ["bench", "/", "-c", "2", "-d", "5", "--rate", "100"])
+    assert output.exit_code == 0, output.output
+    lines = output.output.split("\n")
+    assert lines[0] == "sending requests to 1 url from 2 connections for 5.0s after 1.0s warmup..."
+    assert lines[1] == "1 requests in 1.0s, 1.0 requests/s, 100.0B received (100.0B/s)"
+    mock_bench.assert_called_once_with([("GET", "http://localhost:8000/")], concurrency=2, duration=5, rate=100,
+                                       warmup=1, timeout=10)
+
+
+def test_cli_bench_errors(mocker):
+    runner = CliRunner()
+    output = runner.invoke(cli, ["bench"])
+    assert output.exit_code == 2
+    assert "Error: no urls to request" in output.output
+
+    result = BenchResult()
+    result.elapsed = 1
+    result.add(0.01, None, 0, "ClientConnectorError")
+    mocker.patch("aiohttp_devtools.cli.asyncio.run", return_value=result)
+    mocker.patch("aiohttp_devtools.cli.Bench")
+    output = runner.invoke(cli, ["bench", "/"])
+    assert output.exit_code == 1
+    assert "  ClientConnectorError ×1" in output.output
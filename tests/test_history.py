@@ -0,0 +1,200 @@
+import sqlite3
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiohttp import ClientSession, web
+from click.testing import CliRunner
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.bench import BenchResult
+from aiohttp_devtools.cli import cli
+from aiohttp_devtools.exceptions import AiohttpDevException
+from aiohttp_devtools.history import History, Series, fmt_diff, fmt_trends, git_commit
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.hooks import HookTimer
+from aiohttp_devtools.runserver.smoke import SmokeBench
+from aiohttp_devtools.runserver.stats import RouteStats, record_route_stats
+
+from .conftest import SIMPLE_APP
+
+
+def _history(tmpdir, mocker, commits):
+    mocker.patch("aiohttp_devtools.history.git_commit", side_effect=commits)
+    return History(tmpdir.join("history.sqlite3"))
+
+
+def test_git_commit(tmpdir):
+    assert git_commit(tmpdir) == (None, False)
+
+
+def test_record_trends(tmpdir, mocker):
+    history = _history(tmpdir, mocker, [("a" * 40, False), ("a" * 40, False), ("b" * 40, True)])
+    history.record("routes", [("GET /", "p95", 0.01), ("GET /users/{id}", "p95", 0.1)])
+    history.record("routes", [("GET /", "p95", 0.03)])
+    history.record("routes", [("GET /", "p95", 0.05), ("GET /", "count", 12)])
+    history.record("routes", [])
+
+    trends = history.trends(metric="p95")
+    assert trends == {
+        Series("routes", "GET /", "p95"): [("aaaaaaaa", 0.02), ("bbbbbbbb+", 0.05)],
+        Series("routes", "GET /users/{id}", "p95"): [("aaaaaaaa", 0.1)],
+    }
+    assert list(history.trends(name="GET /users/*")) == [Series("routes", "GET /users/{id}", "p95")]
+    assert history.trends(name="GET /", metric="p95", commits=1) == {
+        Series("routes", "GET /", "p95"): [("bbbbbbbb+", 0.05)]
+    }
+    assert history.trends(source="bench") == {}
+    assert fmt_trends(trends) == (
+        "routes GET / p95:\n"
+        "  aaaaaaaa 20ms, bbbbbbbb+ 50ms\n"
+        "routes GET /users/{id} p95:\n"
+        "  aaaaaaaa 100ms"
+    )
+    assert fmt_trends({}) == "no samples recorded"
+
+    with sqlite3.connect(str(history.path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM samples").fetchone() == (5,)
+
+
+def test_diff(tmpdir, mocker):
+    history = _history(tmpdir, mocker, [("a" * 40, False), ("b" * 40, False)])
+    history.record("bench", [("GET /", "p50", 0.01), ("GET /", "rps", 500), ("GET /", "errors", 0)])
+    history.record("bench", [("GET /", "p50", 0.02), ("GET /", "rps", 400), ("GET /", "errors", 3),
+                             ("GET /new", "p50", 0.01)])
+    rows = history.diff("aaaa", "bbbb")
+    assert rows == [
+        (Series("bench", "GET /", "errors"), 0, 3),
+        (Series("bench", "GET /", "p50"), 0.01, 0.02),
+        (Series("bench", "GET /", "rps"), 500, 400),
+    ]
+    assert fmt_diff(rows, "aaaa", "bbbb") == (
+        "series                   aaaa       bbbb   change\n"
+        "bench GET / errors          0          3      new\n"
+        "bench GET / p50          10ms       20ms    +100%\n"
+        "bench GET / rps           500        400     -20%"
+    )
+    assert history.diff("aaaa", "cccc") == []
+    assert fmt_diff([], "aaaa", "cccc") == "no series recorded for both aaaa and cccc"
+
+
+def test_diff_ambiguous(tmpdir, mocker):
+    a1, a2, b = "a1" + "0" * 38, "a2" + "0" * 38, "b" * 40
+    history = _history(tmpdir, mocker, [(a1, False), (a2, False), (b, False)])
+    for _ in range(3):
+        history.record("bench", [("GET /", "p50", 0.01)])
+    with pytest.raises(AiohttpDevException, match="commit 'a' is ambiguous, it could be: {}, {}$".format(a1, a2)):
+        history.diff("a", "b")
+    assert history.diff("a1", "b") == [(Series("bench", "GET /", "p50"), 0.01, 0.01)]
+    # "_" isn't a wildcard
+    assert history.diff("a_", "b") == []
+
+    result = CliRunner().invoke(cli, ["history", "-f", str(history.path), "diff", "a", "b"])
+    assert result.exit_code == 1
+    assert result.output == "Error: commit 'a' is ambiguous, it could be: {}, {}\n".format(a1, a2)
+
+
+async def test_hooks_recorded(tmpdir, mocker):
+    history = _history(tmpdir, mocker, [("a" * 40, False)])
+    timer = HookTimer(history)
+    timer.timings = [("app factory", 0.5), ("on_startup connect", 0.25)]
+    timer._report("startup")
+    await timer._cleanup_done(web.Application())
+    assert history.trends(source="startup") == {
+        Series("startup", "app factory", "duration"): [("aaaaaaaa", 0.5)],
+        Series("startup", "on_startup connect", "duration"): [("aaaaaaaa", 0.25)],
+        Series("startup", "total", "duration"): [("aaaaaaaa", 0.75)],
+    }
+
+
+async def test_routes_recorded(tmpdir, mocker):
+    history = _history(tmpdir, mocker, [("a" * 40, False)])
+    route_stats = RouteStats()
+    for _ in range(4):
+        route_stats.record(MagicMock(method="GET", match_info=None), 200, 0.01)
+    mocker.patch("aiohttp_devtools.runserver.stats.route_stats", route_stats)
+    ctx = record_route_stats(history)(web.Application())
+    await ctx.__anext__()
+    with pytest.raises(StopAsyncIteration):
+        await ctx.__anext__()
+    trends = history.trends(source="routes")
+    assert trends[Series("routes", "GET (no route)", "count")] == [("aaaaaaaa", 4)]
+    assert set(s.metric for s in trends) == {"count", "p50", "p95", "p99", "max"}
+
+
+def test_history_config(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", history="history.sqlite3")
+    assert config.history is not None
+    assert config.history.path == Path(str(tmpworkdir.join("history.sqlite3")))
+    assert Config(app_path="app.py").history is None
+
+
+async def test_smoke_recorded(aiohttp_server):
+    async def handler(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = await aiohttp_server(app)
+    url = str(server.make_url("/"))
+    history = MagicMock(record_async=AsyncMock())
+    async with ClientSession() as session:
+        await SmokeBench([("GET", url)], 50, history).run(session)
+    (source, samples), _ = history.record_async.call_args
+    assert source == "smoke"
+    assert [(name, metric) for name, metric, _ in samples] == [("GET /", "median")]
+
+
+def test_commit_looked_up_once(tmpdir, mocker):
+    mock_git_commit = mocker.patch("aiohttp_devtools.history.git_commit", return_value=("a" * 40, True))
+    history = History(tmpdir.join("history.sqlite3"))
+    history.update_commit()
+    history.record("routes", [("GET /", "p95", 0.01)])
+    history.record("routes", [("GET /", "p95", 0.03)])
+    assert mock_git_commit.call_count == 1
+    assert history.trends() == {Series("routes", "GET /", "p95"): [("aaaaaaaa+", 0.02)]}
+
+
+def test_bench_samples():
+    result = BenchResult()
+    assert result.samples("GET /") == [("GET /", "requests", 0), ("GET /", "errors", 0), ("GET /", "bytes", 0)]
+    result.add(0.01, 200, 100, None)
+    result.elapsed = 2
+    samples = dict((metric, value) for _, metric, value in result.samples("GET /"))
+    assert samples["requests"] == 1
+    assert samples["rps"] == 0.5
+    assert samples["bytes"] == 100
+    assert 0.009 < samples["p95"] < 0.011
+
+
+def test_history_cli(tmpdir, mocker):
+    history = _history(tmpdir, mocker, [("a" * 40, False), ("b" * 40, False)])
+    history.record("bench", [("GET /", "p50", 0.01)])
+    history.record("bench", [("GET /", "p50", 0.03)])
+    runner = CliRunner()
+    result = runner.invoke(cli, ["history", "--file", str(history.path), "trend", "--metric", "p50"])
+    assert result.exit_code == 0, result.output
+    assert result.output == "bench GET / p50:\n  aaaaaaaa 10ms, bbbbbbbb 30ms\n"
+
+    result = runner.invoke(cli, ["history", "-f", str(history.path), "diff", "aaaa", "bbbb"])
+    assert result.exit_code == 0, result.output
+    assert result.output.split("\n")[1] == "bench GET / p50       10ms       30ms    +200%"
+
+    result = runner.invoke(cli, ["history", "-f", str(tmpdir.join("missing.sqlite3")), "trend"])
+    assert result.exit_code == 2
+
+
+def test_bench_cli_history(tmpdir, mocker):
+    result = BenchResult()
+    result.add(0.01, 200, 100, None)
+    result.elapsed = 1
+    mocker.patch("aiohttp_devtools.cli.asyncio.run", return_value=result)
+    mocker.patch("aiohttp_devtools.cli.Bench")
+    mocker.patch("aiohttp_devtools.history.git_commit", return_value=("a" * 40, False))
+    path = tmpdir.join("history.sqlite3")
+    runner = CliRunner()
+    r = runner.invoke(cli, ["bench", "/", "/api?x=1", "--history", str(path)])
+    assert r.exit_code == 0, r.output
+    trends = History(path).trends(metric="rps")
+    assert trends == {Series("bench", "GET /, GET /api?x=1", "rps"): [("aaaaaaaa", 1)]}
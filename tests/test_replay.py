@@ -0,0 +1,116 @@
+import io
+import json
+
+import pytest
+from aiohttp import web
+from click.testing import CliRunner
+
+from aiohttp_devtools.cli import cli
+from aiohttp_devtools.exceptions import AiohttpDevException
+from aiohttp_devtools.replay import RecordedRequest, Replay, ReplayResult, load_recording, report
+from aiohttp_devtools.runserver.traffic import REPLAY_HEADER
+
+
+def _recorded(ts, path="/", method="GET", body=b"", status=200, duration=0.01, headers=()):
+    return RecordedRequest(ts, method, path, [list(h) for h in headers], body, status, duration)
+
+
+def test_load_recording():
+    lines = [
+        {"ts": 2.5, "method": "POST", "path": "/b", "headers": [["X-Foo", "1"]], "body": "hi", "status": 201,
+         "duration": 0.02},
+        {"ts": 1.0, "method": "GET", "path": "/a?x=1", "headers": [], "body64": "/wA=", "status": 200,
+         "duration": 0.01},
+    ]
+    f = io.StringIO("\n".join(json.dumps(line) for line in lines) + "\n\n")
+    assert load_recording(f) == [
+        RecordedRequest(1.0, "GET", "/a?x=1", [], b"\xff\x00", 200, 0.01),
+        RecordedRequest(2.5, "POST", "/b", [["X-Foo", "1"]], b"hi", 201, 0.02),
+    ]
+
+    with pytest.raises(AiohttpDevException, match="line 1 is not a recorded request"):
+        load_recording(io.StringIO('{"ts": 1}\n'))
+    with pytest.raises(AiohttpDevException, match="line 2 is not a recorded request"):
+        load_recording(io.StringIO(json.dumps(lines[0]) + "\nfoobar\n"))
+    with pytest.raises(AiohttpDevException, match="no requests recorded"):
+        load_recording(io.StringIO(""))
+
+
+def test_offsets():
+    requests = [_recorded(100.0), _recorded(100.5), _recorded(100.6), _recorded(200.0), _recorded(201.0)]
+    assert Replay(requests, "").offsets() == pytest.approx([0, 0.5, 0.6, 5.6, 6.6])
+    assert Replay(requests, "", max_gap=0).offsets() == [0, 0, 0, 0, 0]
+
+
+def test_report():
+    results = [
+        ReplayResult(_recorded(1, "/a"), 0.015, 200, None),
+        ReplayResult(_recorded(2, "/users/1", method="POST", status=201, duration=0.02), 0.01, 500, None),
+        ReplayResult(_recorded(3, "/c"), 10, None, "TimeoutError"),
+    ]
+    assert report(results, 2.04) == (
+        "request        recorded  replayed   change  status\n"
+        "GET /a             10ms      15ms     +50%  200\n"
+        "POST /users/1      20ms      10ms     -50%  500 (was 201)\n"
+        "GET /c             10ms         -           TimeoutError\n"
+        "3 requests replayed in 2.0s, median latency 15ms → 12ms (-17%), 1 with a different status, 1 failed"
+    )
+
+
+@pytest.mark.parametrize("fast", [True, False])
+async def test_replay(aiohttp_server, fast):
+    received = []
+
+    async def handler(request):
+        received.append((request.method, request.path_qs, request.headers.get("X-Foo"),
+                         request.headers.get(REPLAY_HEADER), await request.read()))
+        return web.Response(status=201 if request.method == "POST" else 200)
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", handler)
+    server = await aiohttp_server(app)
+    requests = [
+        _recorded(1.0, "/a?x=%20y", headers=[("X-Foo", "bar")]),
+        _recorded(1.1, "/b", method="POST", body=b"\xff\x00", status=200),
+    ]
+    results = await Replay(requests, str(server.make_url("/")), fast=fast).run()
+    assert received == [
+        ("GET", "/a?x=%20y", "bar", "1", b""),
+        ("POST", "/b", None, "1", b"\xff\x00"),
+    ]
+    assert [(r.status, r.error) for r in results] == [(200, None), (201, None)]
+    assert all(0 < r.duration < 1 for r in results)
+
+
+async def test_replay_failed(unused_tcp_port_factory):
+    url = "http://localhost:{}".format(unused_tcp_port_factory())
+    results = await Replay([_recorded(1.0)], url, fast=True).run()
+    assert results[0].status is None
+    error = results[0].error
+    assert error is not None and error.startswith("ClientConnectorError: ")
+
+
+def test_replay_cli(tmpdir, mocker):
+    recording = tmpdir.join("traffic.ndjson")
+    recording.write(json.dumps({"ts": 1.0, "method": "GET", "path": "/", "headers": [], "body": "", "status": 200,
+                                "duration": 0.01}) + "\n")
+    request = _recorded(1.0)
+    # asyncio.run() would replace the test's event loop
+    mock_run = mocker.patch("aiohttp_devtools.cli.asyncio.run", return_value=[ReplayResult(request, 0.02, 200, None)])
+    mock_replay = mocker.patch("aiohttp_devtools.cli.Replay")
+    runner = CliRunner()
+    result = runner.invoke(cli, ["replay", str(recording), "--fast", "--base-url", "http://localhost:9000"])
+    assert result.exit_code == 0, result.output
+    mock_replay.assert_called_once_with([request], "http://localhost:9000", fast=True, max_gap=5.0, timeout=10.0)
+    lines = result.output.split("\n")
+    assert lines[0] == "replaying 1 request as fast as possible..."
+    assert lines[2] == "GET /        10ms      20ms    +100%  200"
+
+    mock_run.return_value = [ReplayResult(request, 0.02, None, "ClientConnectorError")]
+    result = runner.invoke(cli, ["replay", str(recording)])
+    assert result.exit_code == 1
+
+    recording.write("foobar\n")
+    result = runner.invoke(cli, ["replay", str(recording)])
+    assert result.exit_code == 2
+    assert "Error: line 1 is not a recorded request" in result.output
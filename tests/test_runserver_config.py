@@ -31,6 +31,15 @@ def test_host_override_addr(tmpworkdir):
     assert config.bind_address == "192.168.1.1"
 
 
+def test_str(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", log_sample=10, collapse_logs=True, log_ndjson="log.ndjson")
+    assert str(config).startswith("Config:\n  py_file: ")
+    assert "\n  log_sample: 10\n  log_slow: 500\n  collapse_logs: True\n" in str(config)
+    assert "\n  log_ndjson: 'log.ndjson'\n" in str(config)
+    assert str(config).endswith("\n  record_traffic: None\n  har: None")
+
+
 @forked
 async def test_create_app_wrong_name(tmpworkdir):
     mktree(tmpworkdir, SIMPLE_APP)
@@ -0,0 +1,135 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.log_handlers import AccessLogger, AuxAccessLogger, configure_access_log
+from aiohttp_devtools.runserver.serve import create_auxiliary_app, modify_main_app
+from aiohttp_devtools.runserver.smoke import SMOKE_HEADER
+
+from .conftest import SIMPLE_APP
+
+
+@pytest.fixture
+def har_entries():
+    yield lambda n: configure_access_log(har_entries=n)
+    configure_access_log()
+
+
+def _response(status=200, size=2, **headers):
+    return MagicMock(status=status, reason="OK", body_length=size, headers=headers)
+
+
+def test_har_disabled():
+    AccessLogger(MagicMock(), "").log(make_mocked_request("GET", "/"), _response(), 0.01)
+    assert not AccessLogger.har.enabled
+    assert len(AccessLogger.har.entries) == 0
+
+
+def test_har_ring_buffer(har_entries):
+    har_entries(2)
+    logger = AccessLogger(MagicMock(), "")
+    for path in ("/a", "/b?x=1&y=2", "/c"):
+        logger.log(make_mocked_request("GET", path), _response(), 0.01)
+    logger.log(make_mocked_request("GET", "/smoke", headers={SMOKE_HEADER: "1"}), _response(), 0.01)
+    request = make_mocked_request("POST", "/upload", headers={"Content-Length": "5", "X-Foo": "bar"})
+    response = _response(201, 107, **{"Content-Type": "text/plain", "Content-Length": "7"})
+    AuxAccessLogger(MagicMock(), "").log(request, response, 0.02)
+    entries = AccessLogger.har.render()
+    assert [e["request"]["url"] for e in entries] == ["http://localhost/b?x=1&y=2", "http://localhost/c"]
+    # the body's size isn't known without Content-Length
+    assert entries[0]["response"]["bodySize"] == -1
+    assert entries[0]["response"]["_transferSize"] == 2
+    entry, = AuxAccessLogger.har.render()
+    assert entry["time"] == 20
+    assert entry["_server"] == "aux"
+    assert entry["request"]["method"] == "POST"
+    assert entry["request"]["httpVersion"] == "HTTP/1.1"
+    assert {"name": "X-Foo", "value": "bar"} in entry["request"]["headers"]
+    assert entry["request"]["bodySize"] == 5
+    assert entry["response"]["status"] == 201
+    assert entry["response"]["content"] == {"size": 7, "mimeType": "text/plain"}
+    assert (entry["response"]["headersSize"], entry["response"]["bodySize"]) == (100, 7)
+    # without the prepare timestamp all the time is counted as waiting
+    assert entry["timings"] == {"blocked": -1, "dns": -1, "connect": -1, "send": 0, "wait": 20, "receive": 0}
+
+    har_entries(3)
+    logger.log(make_mocked_request("GET", "/d?x=1"), _response(), 0.01)
+    entries = AccessLogger.har.render()
+    assert [e["request"]["url"] for e in entries] == [
+        "http://localhost/b?x=1&y=2", "http://localhost/c", "http://localhost/d?x=1"]
+    assert entries[0]["request"]["queryString"] == [{"name": "x", "value": "1"}, {"name": "y", "value": "2"}]
+
+
+async def test_har_export(tmpworkdir, aiohttp_server, aiohttp_client, har_entries):
+    mktree(tmpworkdir, dict(SIMPLE_APP, static={"styles.css": "body {}"}))
+    har_entries(100)
+
+    async def page(request):
+        return web.Response(text="<h1>hi</h1>", content_type="text/html")
+
+    aux_app = create_auxiliary_app(static_path=str(tmpworkdir.join("static")), static_url="/static/",
+                                   livereload=False, har_url="/_devtools/har/entries")
+    aux_server = await aiohttp_server(aux_app, access_log_class=AuxAccessLogger)
+    app = web.Application()
+    app.router.add_get("/", page)
+    config = Config(app_path="app.py", livereload=False, aux_port=aux_server.port, har="page.har")
+    assert config.har_entries == 1000
+    modify_main_app(app, config)
+    client = await aiohttp_client(await aiohttp_server(app, access_log_class=AccessLogger))
+    aux_client = await aiohttp_client(aux_server)
+
+    async with client.get("/") as r:
+        assert r.status == 200
+    async with aux_client.get("/static/styles.css") as r:
+        assert r.status == 200
+
+    async with client.get("/_devtools/har") as r:
+        assert r.status == 200
+        har = await r.json()
+    assert har == json.loads(tmpworkdir.join("page.har").read())
+    log = har["log"]
+    assert log["version"] == "1.2"
+    assert log["creator"]["name"] == "aiohttp-devtools"
+    urls = [(e["_server"], e["request"]["url"].split("/", 3)[3]) for e in log["entries"]]
+    assert urls == [("main", ""), ("aux", "static/styles.css")]
+    timings = log["entries"][0]["timings"]
+    assert timings["wait"] + timings["receive"] == pytest.approx(log["entries"][0]["time"], abs=0.01)
+    assert log["entries"][1]["response"]["content"]["size"] == 7
+
+    async with client.get("/_devtools/har?clear=1") as r:
+        assert r.status == 200
+    # the previous export's request, the aux app's entries were cleared
+    async with client.get("/_devtools/har") as r:
+        har = await r.json()
+    assert [e["request"]["url"].split("/", 3)[3] for e in har["log"]["entries"]] == ["_devtools/har?clear=1"]
+
+
+async def test_har_export_aux_down(tmpworkdir, aiohttp_client, unused_tcp_port_factory, mocker, har_entries):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.har.logger.warning")
+    mktree(tmpworkdir, SIMPLE_APP)
+    har_entries(10)
+    app = web.Application()
+    modify_main_app(app, Config(app_path="app.py", aux_port=unused_tcp_port_factory(), har="page.har"))
+    client = await aiohttp_client(app)
+    async with client.get("/_devtools/har") as r:
+        assert r.status == 200
+        har = await r.json()
+    assert har["log"]["entries"] == []
+    assert mock_warning.call_args[0][0] == "HAR export: aux app requests not included, %s: %s"
+
+
+def test_har_bench_mode(tmpworkdir, mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.config.logger.warning")
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", har="page.har", bench_mode=True)
+    assert config.har is None
+    assert config.har_entries == 0
+    mock_warning.assert_called_once_with("HAR export disabled in bench mode, requests to the app aren't logged")
+    app = web.Application()
+    modify_main_app(app, config)
+    assert "_devtools.har" not in app.router.named_resources()
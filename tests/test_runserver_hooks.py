@@ -0,0 +1,155 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver import hooks
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.hooks import HookTimer
+from aiohttp_devtools.runserver.serve import create_main_app
+
+from .conftest import SIMPLE_APP
+
+
+def create_app(calls):
+    def hook(name):
+        async def callback(app):
+            calls.append(name)
+        callback.__qualname__ = name
+        return callback
+
+    def ctx(name):
+        async def callback(app):
+            calls.append(name + " start")
+            yield
+            calls.append(name + " end")
+        callback.__qualname__ = name
+        return callback
+
+    inner = web.Application()
+    inner.on_startup.append(hook("inner_startup"))
+    inner.cleanup_ctx.append(ctx("inner_ctx"))
+    inner.on_cleanup.append(hook("inner_cleanup"))
+    sub = web.Application()
+    sub.on_startup.append(hook("sub_startup"))
+    sub.on_shutdown.append(hook("sub_shutdown"))
+    sub.add_subapp("/inner/", inner)
+
+    app = web.Application()
+    app.on_startup.append(hook("startup"))
+    app.cleanup_ctx.append(ctx("ctx"))
+    app.add_subapp("/sub/", sub)
+    app.on_shutdown.append(hook("shutdown"))
+    app.on_cleanup.append(hook("cleanup"))
+    return app
+
+
+async def _run(app):
+    server = TestServer(app)
+    await server.start_server()
+    await server.close()
+
+
+async def test_hook_timer_order(mocker):
+    mock_info = mocker.patch("aiohttp_devtools.runserver.hooks.logger.info")
+    plain_calls: List[str] = []
+    timed_calls: List[str] = []
+    await _run(create_app(plain_calls))
+    timed_app = create_app(timed_calls)
+    assert HookTimer().install(timed_app, 0.25)
+    await _run(timed_app)
+    assert timed_calls == plain_calls
+    assert plain_calls[:5] == ["ctx start", "startup", "sub_startup", "inner_ctx start", "inner_startup"]
+
+    assert mock_info.call_count == 2
+    msg, *args = mock_info.call_args_list[0][0]
+    startup = msg % tuple(args)
+    assert startup.startswith("startup took 25")
+    assert "slowest: app factory 250ms, " in startup
+    msg, *args = mock_info.call_args_list[1][0]
+    assert (msg % tuple(args)).startswith("shutdown took ")
+
+
+async def test_hook_timer_names(mocker):
+    timer = HookTimer()
+    reports = []
+    mocker.patch.object(timer, "_report", lambda title: reports.append([name for name, _ in timer.timings]))
+    app = create_app([])
+    timer.install(app)
+    await _run(app)
+    # the sub-apps' callbacks are timed together, as they're run by a callback on the main app
+    assert sorted(reports[0]) == ["/sub on_startup", "cleanup_ctx ctx", "on_startup startup"]
+    assert sorted(reports[1][len(reports[0]):]) == [
+        "/sub on_cleanup", "/sub on_shutdown", "cleanup_ctx ctx", "on_cleanup cleanup", "on_shutdown shutdown",
+    ]
+
+
+async def test_hook_timer_slow_shutdown(mocker):
+    mocker.patch.object(hooks, "SLOW_HOOK", 0.01)
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.hooks.logger.warning")
+
+    async def slow_cleanup(app):
+        await asyncio.sleep(0.05)
+
+    app = web.Application()
+    app.on_cleanup.append(slow_cleanup)
+    HookTimer().install(app)
+    await _run(app)
+    assert mock_warning.call_count == 1
+    msg, *args = mock_warning.call_args[0]
+    assert (msg % tuple(args)).startswith("on_cleanup test_hook_timer_slow_shutdown.<locals>.slow_cleanup has been "
+                                          "running for ")
+    assert (msg % tuple(args)).endswith(", the app process is killed if it takes over 5s to stop")
+
+
+async def test_hook_timer_ctx_errors():
+    async def broken(app):
+        yield
+        raise ValueError("broken")
+
+    async def two_yields(app):
+        yield
+        yield
+
+    app = web.Application()
+    app.cleanup_ctx.append(broken)
+    HookTimer().install(app)
+    app.freeze()
+    await app.startup()
+    with pytest.raises(ValueError, match="broken"):
+        await app.cleanup()
+
+    app = web.Application()
+    app.cleanup_ctx.append(two_yields)
+    HookTimer().install(app)
+    app.freeze()
+    await app.startup()
+    with pytest.raises(RuntimeError, match="has more than one 'yield'"):
+        await app.cleanup()
+
+
+def test_hook_timer_frozen():
+    app = web.Application()
+    app.freeze()
+    assert not HookTimer().install(app)
+
+
+async def test_hook_timer_bench_mode(tmpworkdir, mocker):
+    mktree(tmpworkdir, SIMPLE_APP)
+    mock_install = mocker.patch.object(HookTimer, "install", return_value=True)
+    config = Config(app_path="app.py", main_port=0)
+    await create_main_app(config, web.Application)
+    # opt-in
+    assert mock_install.call_count == 0
+
+    config = Config(app_path="app.py", main_port=0, time_hooks=True)
+    await create_main_app(config, web.Application)
+    assert mock_install.call_count == 1
+
+    config = Config(app_path="app.py", main_port=0, time_hooks=True, bench_mode=True)
+    assert not config.time_hooks
+    await create_main_app(config, web.Application)
+    assert mock_install.call_count == 1
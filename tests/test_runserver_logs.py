@@ -1,14 +1,20 @@
+import asyncio
 import json
 import logging
 import re
 import sys
-from unittest.mock import MagicMock
+import time
+from io import StringIO
+from unittest.mock import MagicMock, patch
 
 from aiohttp import web
 import pytest
 
-from aiohttp_devtools.logs import AccessFormatter, DefaultFormatter
-from aiohttp_devtools.runserver.log_handlers import AccessLogger, AuxAccessLogger, parse_body
+from aiohttp_devtools.logs import (AccessFormatter, DefaultFormatter, HighlightStreamHandler, LogQueue, NDJSONHandler,
+                                   QueueDispatchHandler, TerminalFilter, log_event, rs_aux_logger, setup_logging)
+from aiohttp_devtools.runserver import log_handlers
+from aiohttp_devtools.runserver.log_handlers import (AccessLogger, AuxAccessLogger, _RateLimiter, _TimeCache,
+                                                     configure_access_log, parse_body)
 
 
 def test_aiohttp_std():
@@ -19,17 +25,26 @@ def test_aiohttp_std():
     request.method = 'GET'
     request.path_qs = '/foobar?v=1'
     response = MagicMock()
+    response.headers = {}
     response.status = 200
     response.body_length = 100
     logger.log(request, response, 0.15)
     assert info.call_count == 1
-    log = json.loads(info.call_args[0][0])
-    time = log.pop('time')
+    assert info.call_args[0][0] == 'GET /foobar?v=1 200 100B 150ms'
+    access = info.call_args[1]['extra']['access']
+    time = access.pop('time')
+    assert isinstance(access.pop('ts'), float)
     assert re.fullmatch(r'\[\d\d:\d\d:\d\d\]', time)
-    assert log == {
+    assert access == {
+        'server': 'main',
         'prefix': '●',
-        'msg': 'GET /foobar?v=1 200 100B 150ms',
         'dim': False,
+        'method': 'GET',
+        'path': '/foobar?v=1',
+        'status': 200,
+        'size': 100,
+        'duration': 0.15,
+        'repeats': 1,
     }
 
 
@@ -41,17 +56,26 @@ def test_aiohttp_debugtoolbar():
     request.method = 'GET'
     request.path_qs = '/_debugtoolbar/whatever'
     response = MagicMock()
+    response.headers = {}
     response.status = 200
     response.body_length = 100
     logger.log(request, response, 0.15)
     assert info.call_count == 1
-    log = json.loads(info.call_args[0][0])
-    time = log.pop('time')
+    assert info.call_args[0][0] == 'GET /_debugtoolbar/whatever 200 100B 150ms'
+    access = info.call_args[1]['extra']['access']
+    time = access.pop('time')
+    assert isinstance(access.pop('ts'), float)
     assert re.fullmatch(r'\[\d\d:\d\d:\d\d\]', time)
-    assert log == {
+    assert access == {
+        'server': 'main',
         'prefix': '●',
-        'msg': 'GET /_debugtoolbar/whatever 200 100B 150ms',
         'dim': True,
+        'method': 'GET',
+        'path': '/_debugtoolbar/whatever',
+        'status': 200,
+        'size': 100,
+        'duration': 0.15,
+        'repeats': 1,
     }
 
 
@@ -64,17 +88,26 @@ def test_aux_logger():
     request.path = '/'
     request.path_qs = '/'
     response = MagicMock()
+    response.headers = {}
     response.status = 200
     response.body_length = 100
     logger.log(request, response, 0.15)
     assert info.call_count == 1
-    log = json.loads(info.call_args[0][0])
-    time = log.pop('time')
+    assert info.call_args[0][0] == 'GET / 200 100B'
+    access = info.call_args[1]['extra']['access']
+    time = access.pop('time')
+    assert isinstance(access.pop('ts'), float)
     assert re.fullmatch(r'\[\d\d:\d\d:\d\d\]', time)
-    assert log == {
+    assert access == {
+        'server': 'aux',
         'prefix': '◆',
-        'msg': 'GET / 200 100B',
         'dim': False,
+        'method': 'GET',
+        'path': '/',
+        'status': 200,
+        'size': 100,
+        'duration': 0.15,
+        'repeats': 1,
     }
 
 
@@ -87,30 +120,45 @@ def test_aux_logger_livereload():
     request.path = '/livereload.js'
     request.path_qs = '/livereload.js'
     response = MagicMock()
+    response.headers = {}
     response.status = 200
     response.body_length = 100
     logger.log(request, response, 0.15)
     assert info.call_count == 0
 
 
-def test_extra():
-    info = MagicMock()
-    logger_type = type("Logger", (), {"info": info})
-    logger = AccessLogger(logger_type(), "")
+@pytest.fixture
+def details_limiter(mocker):
+    limiter = _RateLimiter(limit=2, period=10.0)
+    mocker.patch("aiohttp_devtools.runserver.log_handlers.details_limiter", limiter)
+    return limiter
+
+
+def _error_request(request_body=b"testing", response_body=b"testing"):
     request = MagicMock(spec=web.Request)
     request.method = 'GET'
     request.headers = {'Foo': 'Bar'}
     request.path_qs = '/foobar?v=1'
-    request._read_bytes = b'testing'
+    request._read_bytes = request_body
     response = MagicMock(spec=web.Response)
     response.status = 500
     response.body_length = 100
     response.headers = {'Foo': 'Spam'}
-    response.text = 'testing'
+    response.body = response_body
+    response.charset = None
+    return request, response
+
+
+def test_extra(details_limiter):
+    info = MagicMock()
+    logger_type = type("Logger", (), {"info": info})
+    logger = AccessLogger(logger_type(), "")
+    request, response = _error_request()
     logger.log(request, response, 0.15)
     assert info.call_count == 1
-    assert info.call_args[1]['extra'] == {
-        'details': {
+    extra = info.call_args[1]['extra']
+    assert extra['access']['status'] == 500
+    assert extra['details']() == {
             'request_duration_ms': 150.0,
             'request_headers': {
                 'Foo': 'Bar',
@@ -121,10 +169,38 @@ def test_extra():
                 'Foo': 'Spam',
             },
             'response_body': 'testing',
-        }
     }
 
 
+def _log_extra(request, response):
+    logger = MagicMock()
+    AccessLogger(logger, "").log(request, response, 0.15)
+    return logger.info.call_args[1]["extra"]
+
+
+def test_extra_truncated(details_limiter):
+    request, response = _error_request(b"x" * 5000, json.dumps({"a": "y" * 5000}).encode())
+    details = _log_extra(request, response)["details"]()
+    assert details["request_body"] == "x" * 4096 + "... (904B truncated)"
+    assert details["request_size"] == "4.9KB"
+    assert details["response_body"].startswith('{"a": "yyy')
+    assert details["response_body"].endswith("yyy... (913B truncated)")
+
+
+def test_extra_rate_limited(details_limiter):
+    request, response = _error_request()
+    assert "details" in _log_extra(request, response)
+    assert "details" in _log_extra(request, response)
+    assert "details" not in _log_extra(request, response)
+    assert "details" not in _log_extra(request, response)
+    assert details_limiter.suppressed == 2
+
+    details_limiter._window_start -= 10
+    details = _log_extra(request, response)["details"]()
+    assert details["suppressed"] == "2 earlier error details not shown"
+    assert details_limiter.suppressed == 0
+
+
 @pytest.mark.parametrize('value,result', [
     (None, None),
     ('foobar', 'foobar'),
@@ -174,13 +250,25 @@ def test_dft_formatter_colour_time():
     assert f.format(_mk_record('[time] testing')) == '\x1b[35m[time]\x1b[0m\x1b[32m testing\x1b[0m'
 
 
+ACCESS = {"time": "_time_", "prefix": "_p_", "dim": False}
+
+
 def test_access_formatter():
     f = AccessFormatter()
-    msg = json.dumps({'time': '_time_', 'prefix': '_p_', 'msg': '_msg_', 'dim': False})
-    assert f.format(_mk_record(msg)) == '_time_ _p_ _msg_'
+    assert f.format(_mk_record("_msg_", access=ACCESS)) == "_time_ _p_ _msg_"
+
+
+def test_time_cache():
+    fmt = _TimeCache()
+    with patch("aiohttp_devtools.runserver.log_handlers.strftime", return_value="[12:00:00]") as mock_strftime:
+        assert fmt(1000.1) == "[12:00:00]"
+        assert fmt(1000.9) == "[12:00:00]"
+        assert mock_strftime.call_count == 1
+        fmt(1001.0)
+        assert mock_strftime.call_count == 2
 
 
-def test_access_formatter_no_json():
+def test_access_formatter_no_access():
     f = AccessFormatter()
     assert f.format(_mk_record('foobar')) == 'foobar'
 
@@ -188,19 +276,31 @@ def test_access_formatter_no_json():
 def test_access_formatter_colour():
     f = AccessFormatter()
     f.stream_is_tty = True
-    msg = json.dumps({'time': '_time_', 'prefix': '_p_', 'msg': '_msg_', 'dim': False})
-    assert f.format(_mk_record(msg)) == '\x1b[35m_time_\x1b[0m \x1b[34m_p_\x1b[0m \x1b[0m_msg_\x1b[0m'
+    assert f.format(_mk_record("_msg_", access=ACCESS)) == (
+        '\x1b[35m_time_\x1b[0m \x1b[34m_p_\x1b[0m \x1b[0m_msg_\x1b[0m'
+    )
 
 
 def test_access_formatter_extra():
     f = AccessFormatter()
-    msg = json.dumps({'time': '_time_', 'prefix': '_p_', 'msg': '_msg_', 'dim': False})
-    assert f.format(_mk_record(msg, details={'foo': 'bar'})) == (
+    assert f.format(_mk_record("_msg_", access=ACCESS, details={"foo": "bar"})) == (
+        'details: {\n'
+        "    'foo': 'bar',\n"
+        '}\n'
+        '_time_ _p_ _msg_'
+    )
+
+
+def test_access_formatter_lazy_details():
+    f = AccessFormatter()
+    details = MagicMock(return_value={"foo": "bar"})
+    assert f.format(_mk_record("_msg_", access=ACCESS, details=details)) == (
         'details: {\n'
         "    'foo': 'bar',\n"
         '}\n'
         '_time_ _p_ _msg_'
     )
+    details.assert_called_once_with()
 
 
 def test_access_formatter_exc():
@@ -221,3 +321,222 @@ def test_access_formatter_exc_colour():
     except RuntimeError:
         stack = f.formatException(sys.exc_info())
         assert stack.startswith('\x1b[38;5;26mTraceback')
+
+
+def _stream_handler():
+    sio = StringIO()
+    handler = logging.StreamHandler(sio)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    return sio, handler
+
+
+def test_log_queue():
+    sio, handler = _stream_handler()
+    log_queue = LogQueue([handler])
+    log_queue.start()
+    logger = logging.getLogger("adev.test_queue")
+    logger.handlers = [QueueDispatchHandler(log_queue, [handler])]
+    logger.propagate = False
+    try:
+        args = ["foo"]
+        logger.warning("args: %s", args)
+        args.append("bar")
+    finally:
+        log_queue.stop()
+        logger.handlers = []
+    assert sio.getvalue() == "WARNING args: ['foo']\n"
+
+
+def test_log_queue_handler_level():
+    sio, handler = _stream_handler()
+    handler.setLevel(logging.WARNING)
+    log_queue = LogQueue([])
+    log_queue.start()
+    log_queue.put([handler], logging.makeLogRecord({"msg": "ignored", "levelno": logging.INFO}))
+    log_queue.put([handler], logging.makeLogRecord({"msg": "shown", "levelno": logging.WARNING,
+                                                    "levelname": "WARNING"}))
+    log_queue.stop()
+    assert sio.getvalue() == "WARNING shown\n"
+
+
+def test_log_queue_dropped():
+    sio, handler = _stream_handler()
+    log_queue = LogQueue([handler], maxsize=2)
+    for i in range(5):
+        log_queue.put([handler], logging.makeLogRecord({"msg": "record %d" % i, "levelname": "INFO",
+                                                        "levelno": logging.INFO}))
+    assert log_queue.dropped == 3
+    log_queue.start()
+    log_queue.stop()
+    assert sio.getvalue() == (
+        "INFO record 0\n"
+        "WARNING 3 log messages dropped, the terminal isn't keeping up\n"
+        "INFO record 1\n"
+    )
+    assert log_queue.dropped == 0
+
+
+def test_setup_logging_queue():
+    setup_logging(False, queue_logs=True)
+    try:
+        (handler,) = rs_aux_logger.handlers
+        assert isinstance(handler, QueueDispatchHandler)
+        assert [type(h) for h in handler.handlers] == [HighlightStreamHandler]
+    finally:
+        setup_logging(False)
+    assert [type(h) for h in rs_aux_logger.handlers] == [HighlightStreamHandler]
+
+
+def test_ndjson_handler(tmpdir, mocker):
+    mocker.patch("aiohttp_devtools.logs.NDJSON_FLUSH_INTERVAL", 100)
+    path = str(tmpdir.join("log.ndjson"))
+    handler = NDJSONHandler(path)
+    access = {"ts": 12.5, "server": "main", "time": "[12:00:00]", "prefix": "●", "dim": False, "method": "GET",
+              "path": "/foo?v=1", "status": 200, "size": 100, "duration": 0.0123, "repeats": 1}
+    handler.handle(logging.makeLogRecord({"msg": "GET /foo?v=1", "access": access}))
+    handler.handle(logging.makeLogRecord({"msg": "restart", "event": {"ts": 13.5, "event": "restart"}}))
+    handler.handle(logging.makeLogRecord({"msg": "not an access record or event"}))
+    assert tmpdir.join("log.ndjson").read() == ""
+    handler.close()
+    lines = [json.loads(line) for line in tmpdir.join("log.ndjson").read().splitlines()]
+    assert lines == [
+        {"ts": 12.5, "event": "request", "server": "main", "method": "GET", "path": "/foo?v=1", "status": 200,
+         "bytes": 100, "duration_ms": 12.3},
+        {"ts": 13.5, "event": "restart"},
+    ]
+
+
+def test_log_queue_flushes_ndjson(tmpdir, mocker):
+    mocker.patch("aiohttp_devtools.logs.NDJSON_FLUSH_INTERVAL", 0.05)
+    path = tmpdir.join("log.ndjson")
+    handler = NDJSONHandler(str(path))
+    log_queue = LogQueue([])
+    log_queue.handlers.add(handler)
+    log_queue.start()
+    try:
+        event = {"ts": 1.5, "event": "watch"}
+        record = logging.makeLogRecord({"msg": "watch", "levelno": logging.INFO, "event": event})
+        log_queue.put([handler], record)
+        # written by the listener without another record being logged
+        for _ in range(50):
+            time.sleep(0.01)
+            if path.read():
+                break
+        assert json.loads(path.read()) == event
+    finally:
+        log_queue.stop()
+        handler.close()
+
+
+def test_setup_logging_ndjson(tmpdir):
+    path = str(tmpdir.join("log.ndjson"))
+    log_event("not configured")
+    setup_logging(False, log_ndjson=path)
+    try:
+        log_event("watch", changes=3)
+        request, response = _error_request()
+        response.status = 200
+        AccessLogger(logging.getLogger("aiohttp.access"), "").log(request, response, 0.15)
+    finally:
+        # stopping the queue flushes the handler
+        setup_logging(False)
+    watch, request_line = [json.loads(line) for line in tmpdir.join("log.ndjson").read().splitlines()]
+    assert watch.pop("ts") <= request_line.pop("ts")
+    assert watch == {"event": "watch", "changes": 3}
+    assert request_line == {"event": "request", "server": "main", "method": "GET", "path": "/foobar?v=1",
+                            "status": 200, "bytes": 100, "duration_ms": 150.0}
+
+
+@pytest.fixture
+def access_log_config():
+    yield configure_access_log
+    configure_access_log()
+
+
+def test_setup_logging_ndjson_sampled(tmpdir, capsys, access_log_config):
+    path = str(tmpdir.join("log.ndjson"))
+    access_log_config(sample=2)
+    setup_logging(False, log_ndjson=path)
+    try:
+        logger = AccessLogger(logging.getLogger("aiohttp.access"), "")
+        for p in ("/a", "/b", "/c", "/d"):
+            request, response = _error_request()
+            request.path_qs = p
+            response.status = 200
+            logger.log(request, response, 0.01)
+    finally:
+        setup_logging(False)
+    lines = [json.loads(line) for line in tmpdir.join("log.ndjson").read().splitlines()]
+    assert [line["path"] for line in lines] == ["/a", "/b", "/c", "/d"]
+    terminal = capsys.readouterr().err
+    assert "/b" in terminal and "/d" in terminal
+    assert "/a" not in terminal and "/c" not in terminal
+
+
+def _log_requests(logger_cls, requests):
+    info = MagicMock()
+    logger = logger_cls(type("Logger", (), {"info": info})(), "")
+    for path, status, duration in requests:
+        request = MagicMock()
+        request.method = "GET"
+        request.path = request.path_qs = path
+        response = MagicMock()
+        response.headers = {}
+        response.status = status
+        response.body_length = 100
+        logger.log(request, response, duration)
+    # records sampled out or collapsed are still logged for other handlers, but not shown in the terminal
+    return [c[0][0] for c in info.call_args_list if TerminalFilter().filter(logging.makeLogRecord(c[1]["extra"]))]
+
+
+def test_sample(access_log_config):
+    access_log_config(sample=3, slow=100)
+    requests = [("/{}".format(i), 200, 0.01) for i in range(6)] + [("/slow", 200, 0.1), ("/error", 500, 0.01)]
+    assert _log_requests(AccessLogger, requests) == [
+        "GET /2 200 100B 10ms",
+        "GET /5 200 100B 10ms",
+        "GET /slow 200 100B 100ms",
+        "GET /error 500 100B 10ms",
+    ]
+
+
+def test_sample_per_logger(access_log_config):
+    access_log_config(sample=2)
+    assert _log_requests(AccessLogger, [("/foo", 200, 0.01)]) == []
+    assert _log_requests(AuxAccessLogger, [("/foo", 200, 0.01)]) == []
+    assert _log_requests(AccessLogger, [("/foo", 200, 0.01)]) == ["GET /foo 200 100B 10ms"]
+
+
+def test_collapse(access_log_config):
+    access_log_config(collapse=True)
+    requests = [("/foo", 200, 0.01), ("/foo", 200, 0.02), ("/foo", 200, 0.04), ("/bar", 200, 0.01),
+                ("/foo", 200, 0.01), ("/bar", 200, 0.01)]
+    assert _log_requests(AccessLogger, requests) == [
+        "GET /foo 200 100B 10ms",
+        "GET /foo 200 ×2 avg 30ms",
+        "GET /bar 200 100B 10ms",
+        "GET /foo 200 100B 10ms",
+        "GET /bar 200 100B 10ms",
+    ]
+
+
+async def test_collapse_timer(access_log_config, mocker):
+    mocker.patch.object(log_handlers, "COLLAPSE_INTERVAL", 0.01)
+    access_log_config(collapse=True)
+    info = MagicMock()
+    logger = AuxAccessLogger(type("Logger", (), {"info": info})(), "")
+    request = MagicMock()
+    request.method = "GET"
+    request.path = request.path_qs = "/foo"
+    response = MagicMock()
+    response.headers = {}
+    response.status = 200
+    response.body_length = 100
+    for _ in range(3):
+        logger.log(request, response, 0.01)
+    assert info.call_count == 3
+    await asyncio.sleep(0.05)
+    assert info.call_count == 4
+    assert info.call_args[0][0] == "GET /foo 200 ×2 avg 10ms"
+    access = info.call_args[1]["extra"]["access"]
+    assert (access["repeats"], access["dim"], access["server"]) == (2, True, "aux")
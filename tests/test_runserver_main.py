@@ -1,6 +1,7 @@
 import asyncio
 import json
 import ssl
+import warnings
 from unittest import mock
 
 import aiohttp
@@ -14,6 +15,7 @@ from aiohttp_devtools.runserver import runserver
 from aiohttp_devtools.runserver.config import Config
 from aiohttp_devtools.runserver.serve import (
     WS, create_auxiliary_app, create_main_app, modify_main_app, src_reload, start_main_app)
+from aiohttp_devtools.runserver.stats import gc_stats
 from aiohttp_devtools.runserver.watch import AppTask
 
 from .conftest import SIMPLE_APP, forked, linux_forked
@@ -97,6 +99,11 @@ def create_app():
 
 @forked
 def test_start_runserver_app_instance(tmpworkdir):
+    # runserver() replaces the current event loop, close the one pytest-asyncio leaves set
+    # rather than leaving it to be garbage collected mid-test
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        asyncio.get_event_loop_policy().get_event_loop().close()
     mktree(tmpworkdir, {
         'app.py': """\
 from aiohttp import web
@@ -191,6 +198,34 @@ async def test_run_app_browser_cache(tmpworkdir, aiohttp_client):
     assert "Cache-Control" not in r.headers
 
 
+@forked
+async def test_run_app_bench_mode(tmpworkdir, aiohttp_client):
+    mktree(tmpworkdir, {
+        "app.py": """\
+from aiohttp import web
+
+async def hello(request):
+    return web.Response(text='<h1>hello world</h1>', content_type='text/html')
+
+app = web.Application()
+app.router.add_get('/', hello)
+"""
+    })
+    config = Config(app_path="app.py", bench_mode=True, main_port=0)
+    module = config.import_module()
+    runner = await create_main_app(config, config.get_app_factory(module))
+    assert runner.app._debug is not True
+    assert runner._kwargs["access_log"] is None
+    assert gc_stats.cleanup_ctx not in runner.app.cleanup_ctx
+    cli = await aiohttp_client(runner.app)
+    r = await cli.get("/")
+    assert r.status == 200
+    assert "Cache-Control" not in r.headers
+    assert await r.text() == "<h1>hello world</h1>"
+    r = await cli.get("/_devtools/stats")
+    assert r.status == 404
+
+
 async def test_aux_app(tmpworkdir, aiohttp_client):
     mktree(tmpworkdir, {
         'test.txt': 'test value',
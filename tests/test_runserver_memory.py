@@ -0,0 +1,98 @@
+import tracemalloc
+
+import pytest
+from aiohttp import web
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver import memory
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.memory import fmt_bytes, memory_report, peak_rss, rss, start_tracing
+from aiohttp_devtools.runserver.serve import modify_main_app
+
+from .conftest import SIMPLE_APP
+
+leaked = []
+
+
+async def leak(request):
+    leaked.append(bytearray(2 * 1024 * 1024))
+    return web.Response(text="leaked")
+
+
+@pytest.fixture
+def tracing():
+    start_tracing()
+    yield
+    tracemalloc.stop()
+    leaked.clear()
+
+
+async def test_memory_endpoints(aiohttp_client, tmpworkdir, tracing, mocker):
+    mock_info = mocker.patch("aiohttp_devtools.runserver.memory.logger.info")
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    app.router.add_get("/leak", leak)
+    modify_main_app(app, Config(app_path="app.py", trace_memory=True))
+    client = await aiohttp_client(app)
+
+    async with client.get("/leak") as r:
+        assert r.status == 200
+    async with client.get("/_devtools/memory/diff?limit=3") as r:
+        assert r.status == 200
+        text = await r.text()
+    header, *lines = text.split("\n")
+    assert header.startswith("memory: rss ")
+    assert " top 3 changes of " in header
+    assert len(lines) == 3
+    assert "test_runserver_memory.py:18: size=2048 KiB (+2048 KiB), count=" in lines[0]
+
+    async with client.get("/_devtools/memory/snapshot?key=filename&limit=5") as r:
+        assert r.status == 200
+        header, *lines = (await r.text()).split("\n")
+    assert " top 5 allocation sites of " in header
+    assert len(lines) == 5
+
+    # the snapshot is now the baseline, so the earlier leak isn't shown
+    async with client.get("/_devtools/memory/diff") as r:
+        assert "test_runserver_memory.py:18" not in await r.text()
+
+    async with client.get("/_devtools/memory/diff?key=foobar") as r:
+        assert r.status == 400
+        assert await r.text() == "key must be one of: filename, lineno, traceback"
+    async with client.get("/_devtools/memory/diff?limit=x") as r:
+        assert r.status == 400
+    async with client.get("/_devtools/memory/snapshot?limit=-1") as r:
+        assert r.status == 400
+        assert await r.text() == "limit must be a non-negative integer"
+
+    await client.close()
+    assert mock_info.call_count == 1
+    assert mock_info.call_args[0][0].startswith("memory: rss ")
+
+
+def test_memory_report(tracing):
+    report = memory_report()
+    assert report.startswith("memory: rss ")
+    assert ", traced " in report and ", peak traced " in report
+
+
+def test_memory_report_no_proc(tracing, mocker):
+    mocker.patch.object(memory, "rss", return_value=None)
+    mocker.patch.object(memory, "peak_rss", return_value=3 * 1024 * 1024)
+    assert memory_report().startswith("memory: peak rss 3.0MB, traced ")
+    memory.peak_rss.return_value = None  # type: ignore[attr-defined]
+    assert memory_report().startswith("memory: rss unavailable, traced ")
+
+
+def test_rss():
+    value = rss()
+    assert value is None or value > 1024 * 1024
+    peak = peak_rss()
+    assert peak is None or peak > 1024 * 1024
+
+
+def test_fmt_bytes():
+    assert fmt_bytes(100) == "100.0B"
+    assert fmt_bytes(2048) == "2.0KB"
+    assert fmt_bytes(-3 * 1024 * 1024) == "-3.0MB"
+    assert fmt_bytes(5 * 1024 ** 3) == "5.0GB"
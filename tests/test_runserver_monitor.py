@@ -0,0 +1,101 @@
+import asyncio
+import json
+import sys
+import time
+
+from aiohttp import web
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.monitor import LoopMonitor
+from aiohttp_devtools.runserver.serve import modify_main_app
+
+from .conftest import SIMPLE_APP
+
+
+def blocking_call():
+    time.sleep(0.2)
+
+
+async def test_loop_monitor_blocked(mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.monitor.logger.warning")
+    monitor = LoopMonitor(0.05)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        assert mock_warning.call_count == 0
+        blocking_call()
+        await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    # reported once by the watchdog, not again by the heartbeat after the block
+    assert mock_warning.call_count == 1
+    msg, *args = mock_warning.call_args_list[0][0]
+    report = msg % tuple(args)
+    assert report.startswith("event loop blocked for over ")
+    assert " by blocking_call (" in report
+    line = blocking_call.__code__.co_firstlineno + 1
+    assert "test_runserver_monitor.py:{}) outside of a request\n".format(line) in report
+    assert 'in blocking_call\n    time.sleep(0.2)' in report
+
+
+async def test_loop_monitor_beat(mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.monitor.logger.warning")
+    monitor = LoopMonitor(0.05)
+    monitor._loop = asyncio.get_running_loop()
+    try:
+        # a block the watchdog didn't report is still reported by the heartbeat
+        monitor._expected = monitor._loop.time() - 0.2
+        monitor._beat()
+        msg, lag = mock_warning.call_args[0]
+        assert msg == "event loop was blocked for %0.0fms"
+        assert 200 <= lag < 300
+        monitor._expected = monitor._loop.time() - 0.2
+        monitor._reported = True
+        monitor._beat()
+        assert mock_warning.call_count == 1
+        assert monitor._reported is False
+    finally:
+        monitor.stop()
+
+
+def test_loop_monitor_interval():
+    assert LoopMonitor(1).interval == 0.1
+    assert LoopMonitor(0.05).interval == 0.025
+    assert LoopMonitor(0.001).interval == 0.01
+
+
+async def test_loop_monitor_request(aiohttp_client, tmpworkdir, mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.monitor.logger.warning")
+
+    async def handler(request):
+        blocking_call()
+        return web.Response(text="ok")
+
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    app.router.add_get("/blocking", handler)
+    modify_main_app(app, Config(app_path="app.py", loop_lag_threshold=50))
+    client = await aiohttp_client(app)
+    async with client.get("/blocking?foo=1") as r:
+        assert r.status == 200
+
+    msg, *args = mock_warning.call_args_list[0][0]
+    assert "by blocking_call (" in msg % tuple(args)
+    assert "while handling GET /blocking?foo=1\n" in msg % tuple(args)
+
+
+def test_loop_monitor_culprit():
+    monitor = LoopMonitor(0.05)
+    frames = []
+
+    def hook(obj):
+        # the frame of json's decoder, which called this
+        frames.append(sys._getframe(1))
+        return obj
+
+    json.loads("{}", object_hook=hook)
+    assert frames[0].f_code.co_filename == json.decoder.__file__
+    # library frames are skipped in favour of the code which called them
+    assert monitor._culprit(frames[0]).f_code.co_name == "test_loop_monitor_culprit"
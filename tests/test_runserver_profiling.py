@@ -0,0 +1,126 @@
+import asyncio
+import pstats
+import threading
+import time
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver import profiling
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.profiling import PROFILE_HEADER, RequestProfiler, StackSampler, wants_profile
+from aiohttp_devtools.runserver.serve import modify_main_app
+
+from .conftest import SIMPLE_APP
+
+
+def busy_function():
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+
+
+async def slow(request):
+    busy_function()
+    return web.Response(text="slow")
+
+
+async def missing(request):
+    busy_function()
+    raise web.HTTPNotFound(text="missing")
+
+
+def create_app(tmpworkdir, mocker):
+    mocker.patch.object(profiling, "PROFILE_DIR", Path(tmpworkdir, "profiles"))
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    app.router.add_get("/slow/{id}", slow)
+    app.router.add_get("/missing", missing)
+    modify_main_app(app, Config(app_path="app.py", profile_requests=True))
+    return app
+
+
+def test_stack_sampler():
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    busy_function()
+    sampler.stop()
+    assert sum(sampler.stacks.values()) > 5
+    stack, count = sampler.collapsed().splitlines()[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("busy_function (test_runserver_profiling.py:")
+    assert int(count) > 0
+
+
+def test_wants_profile():
+    assert wants_profile(make_mocked_request("GET", "/?_profile"))
+    assert wants_profile(make_mocked_request("GET", "/?x=1&_profile=1"))
+    assert wants_profile(make_mocked_request("GET", "/", headers={PROFILE_HEADER: "1"}))
+    assert not wants_profile(make_mocked_request("GET", "/"))
+    assert not wants_profile(make_mocked_request("GET", "/?user_profile=1"))
+    assert not wants_profile(make_mocked_request("GET", "/?q=_profile"))
+
+
+async def test_profile_request(aiohttp_client, tmpworkdir, mocker):
+    client = await aiohttp_client(create_app(tmpworkdir, mocker))
+    async with client.get("/slow/1") as r:
+        assert r.status == 200
+        assert PROFILE_HEADER not in r.headers
+    assert not tmpworkdir.join("profiles").check()
+
+    async with client.get("/slow/1?_profile=1") as r:
+        assert r.status == 200
+        assert await r.text() == "slow"
+        url = r.headers[PROFILE_HEADER]
+    assert url.startswith("/_devtools/profiles/") and url.endswith("-GET-slow_1.txt")
+    name = url[len("/_devtools/profiles/"):-len(".txt")]
+
+    stats = pstats.Stats(str(tmpworkdir.join("profiles", name + ".pstats")))
+    assert any(func[2] == "busy_function" for func in stats.stats)  # type: ignore[attr-defined]
+    assert "busy_function" in tmpworkdir.join("profiles", name + ".collapsed").read()
+
+    async with client.get(url) as r:
+        assert r.status == 200
+        assert r.content_type == "text/plain"
+        text = await r.text()
+    assert text.startswith("request took ")
+    assert "busy_function" in text
+
+    async with client.get("/_devtools/profiles/") as r:
+        assert r.status == 200
+        assert await r.text() == "/_devtools/profiles/{0}.txt  /_devtools/profiles/{0}.collapsed  " \
+                                 "/_devtools/profiles/{0}.pstats".format(name)
+
+
+async def test_profile_request_header_exception(aiohttp_client, tmpworkdir, mocker):
+    client = await aiohttp_client(create_app(tmpworkdir, mocker))
+    async with client.get("/missing", headers={PROFILE_HEADER: "1"}) as r:
+        assert r.status == 404
+        assert r.headers[PROFILE_HEADER].endswith("-GET-missing.txt")
+    assert len(tmpworkdir.join("profiles").listdir()) == 3
+
+
+async def test_profile_routes_not_found(aiohttp_client, tmpworkdir, mocker):
+    client = await aiohttp_client(create_app(tmpworkdir, mocker))
+    async with client.get("/_devtools/profiles/") as r:
+        assert await r.text() == "no profiles saved yet, add ?_profile to a url"
+    tmpworkdir.join("profiles", "foo.py").write("x", ensure=True)
+    async with client.get("/_devtools/profiles/foo.py") as r:
+        assert r.status == 404
+    async with client.get("/_devtools/profiles/missing.txt") as r:
+        assert r.status == 404
+
+
+async def test_profile_one_at_a_time(tmp_path):
+    profiler = RequestProfiler("/_devtools/profiles", tmp_path)
+    mock_request = type("R", (), {"method": "GET", "path": "/foo", "path_qs": "/foo"})()
+
+    async def handler(request):
+        await asyncio.sleep(0.05)
+        return web.Response()
+
+    responses = await asyncio.gather(profiler.profile(mock_request, handler),
+                                     profiler.profile(mock_request, handler))
+    assert [PROFILE_HEADER in r.headers for r in responses] == [True, False]
+    assert len(list(tmp_path.iterdir())) == 3
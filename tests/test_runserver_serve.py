@@ -4,17 +4,21 @@ import socket
 from typing import Any, Dict
 from unittest.mock import MagicMock
 
+import aiohttp_jinja2
+import jinja2
 import pytest
-from aiohttp.web import Application, AppKey, Request, Response
+from aiohttp.web import Application, AppKey, HTTPNotFound, Request, Response
 from aiohttp_jinja2 import static_root_key
 from pytest_toolbox import mktree
 
 from aiohttp_devtools.exceptions import AiohttpDevException
 from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver import serve
 from aiohttp_devtools.runserver.log_handlers import fmt_size
 from aiohttp_devtools.runserver.serve import (
-    LAST_RELOAD, STATIC_PATH, STATIC_URL, WS, check_port_open, cleanup_aux_app,
+    LAST_RELOAD, STATIC_PATH, STATIC_URL, WS, StaticRootUrl, check_port_open, cleanup_aux_app,
     modify_main_app, src_reload)
+from aiohttp_devtools.runserver.static_cache import Fingerprints
 
 from .conftest import SIMPLE_APP, create_future
 
@@ -156,22 +160,125 @@ def test_modify_main_app_all_on(tmpworkdir):
     app.add_subapp("/sub/", subapp)
     modify_main_app(app, config)  # type: ignore[arg-type]
     assert len(app.on_response_prepare) == 1
-    assert len(app.middlewares) == 2
+    assert len(app.middlewares) == 1
     assert app[static_root_key] == "http://localhost:8001/static"
     assert subapp[static_root_key] == "http://localhost:8001/static"
     assert app._debug is True
 
 
-async def test_modify_main_app_on_prepare(tmpworkdir):
+async def test_modify_main_app_middleware(tmpworkdir):
     mktree(tmpworkdir, SIMPLE_APP)
     config = Config(app_path='app.py', host='foobar.com')
     app = DummyApplication()
     modify_main_app(app, config)  # type: ignore[arg-type]
-    on_prepare = app.on_response_prepare[0]
+    middleware = app.middlewares[0]
     request = MagicMock(spec=Request)
     request.path = '/'
-    response = MagicMock(spec=Response)
-    response.body = b'<h1>body</h1>'
-    response.content_type = 'text/html'
-    await on_prepare(request, response)
+    response = Response(body=b'<h1>body</h1>', content_type='text/html')
+
+    async def handler(request):
+        return response
+
+    assert await middleware(request, handler) is response
     assert response.body == b'<h1>body</h1>\n<script src="http://foobar.com:8001/livereload.js"></script>\n'
+    assert response.headers["Content-Length"] == "75"
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+async def test_modify_main_app_middleware_http_exception(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", host="foobar.com")
+    app = DummyApplication()
+    modify_main_app(app, config)  # type: ignore[arg-type]
+    middleware = app.middlewares[0]
+    request = MagicMock(spec=Request)
+    request.path = "/"
+
+    async def handler(request):
+        raise HTTPNotFound(text="<h1>missing</h1>", content_type="text/html")
+
+    with pytest.raises(HTTPNotFound) as exc_info:
+        await middleware(request, handler)
+    assert exc_info.value.body == b'<h1>missing</h1>\n<script src="http://foobar.com:8001/livereload.js"></script>\n'
+
+
+async def test_modify_main_app_unhandled_exception(tmpworkdir, aiohttp_client):
+    mktree(tmpworkdir, SIMPLE_APP)
+
+    async def handler(request):
+        raise ValueError("broken")
+
+    app = Application()
+    app.router.add_get("/", handler)
+    modify_main_app(app, Config(app_path="app.py", host="foobar.com"))
+    client = await aiohttp_client(app)
+    async with client.get("/", headers={"Accept": "text/html"}) as r:
+        assert r.status == 500
+        body = await r.text()
+    assert body.endswith('</html>\n\n<script src="http://foobar.com:8001/livereload.js"></script>\n')
+    async with client.get("/", headers={"Accept": "text/plain"}) as r:
+        assert r.status == 500
+        assert "livereload.js" not in await r.text()
+
+
+async def test_modify_main_app_fingerprint(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    mktree(tmpworkdir, {"static/app.css": "a {}"})
+    config = Config(app_path="app.py", host="foobar.com", static_path="static", fingerprint_static=True)
+    app = Application()
+    aiohttp_jinja2.setup(app, loader=jinja2.DictLoader({"t.html": "{{ static('app.css') }}"}))
+    modify_main_app(app, config)
+    fingerprints = Fingerprints(pathlib.Path(tmpworkdir, "static"))
+    fingerprints.update()
+    digest = fingerprints.get("app.css")
+    assert digest is not None
+    url = "http://foobar.com:8001/static/app.css?v={}".format(digest)
+    app.freeze()
+    root: StaticRootUrl = app[static_root_key]  # type: ignore[assignment]
+    # files are hashed when the app starts
+    assert root.url_for("/app.css") == "http://foobar.com:8001/static/app.css"
+    await app.startup()
+    try:
+        assert root.url_for("/app.css") == url
+        assert aiohttp_jinja2.get_env(app).get_template("t.html").render(app=app) == url
+    finally:
+        await app.cleanup()
+
+
+def test_static_root_url():
+    root = StaticRootUrl("http://localhost:8001/static/")
+    assert root == "http://localhost:8001/static/"
+    assert root.url_for("/foo.js") == "http://localhost:8001/static/foo.js"
+
+
+async def test_modify_main_app_static_url_per_host(tmpworkdir, mocker):
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", static_path=".")
+    app = DummyApplication()
+    subapp = DummyApplication()
+    app.add_subapp("/sub/", subapp)
+    modify_main_app(app, config)  # type: ignore[arg-type]
+    static_middleware = app.middlewares[0]
+    change_static_url = mocker.spy(serve, "_change_static_url")
+
+    async def handler(request):
+        return Response()
+
+    request = MagicMock(spec=Request)
+    request.app = app
+    for host in ("example.com:8000", "example.com:8000", "other.com", "other.com"):
+        request.headers = {"host": host}
+        await static_middleware(request, handler)
+        assert subapp[static_root_key] == "http://{}:8001/static".format(host.split(":")[0])
+    assert change_static_url.call_count == 4  # 2 host changes, each walking app and subapp
+
+
+def test_modify_main_app_bench_mode(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    config = Config(app_path="app.py", static_path=".", bench_mode=True)
+    app = DummyApplication()
+    modify_main_app(app, config)  # type: ignore[arg-type]
+    assert len(app.on_response_prepare) == 0
+    assert len(app.middlewares) == 0
+    assert app[static_root_key] == "http://localhost:8001/static"
+    assert app._debug is False
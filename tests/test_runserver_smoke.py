@@ -0,0 +1,160 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import make_mocked_request
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.exceptions import AiohttpDevConfigError
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.log_handlers import AccessLogger
+from aiohttp_devtools.runserver.serve import LAST_RELOAD, WS
+from aiohttp_devtools.runserver.smoke import SMOKE_HEADER, SmokeBench
+from aiohttp_devtools.runserver.stats import RouteStats
+from aiohttp_devtools.runserver.watch import AppTask
+
+from .conftest import SIMPLE_APP
+from .test_runserver_watch import create_awatch_mock
+
+
+def _warnings(mock_warning):
+    return [args[0] % tuple(args[1:]) for args, _ in mock_warning.call_args_list]
+
+
+def test_smoke_compare(mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.smoke.logger.warning")
+    smoke = SmokeBench([], 50)
+    smoke.compare({"GET /a": 0.01, "GET /b": 0.001, "GET /c": 0.01})
+    assert mock_warning.call_count == 0
+    smoke.compare({"GET /a": 0.014, "GET /b": 0.0025, "GET /d": 0.1})
+    assert mock_warning.call_count == 0
+    # /b is 150% slower, but only by 1.5ms, which is noise
+    smoke.compare({"GET /a": 0.1, "GET /b": 0.0025})
+    assert _warnings(mock_warning) == [
+        "smoke benchmark: GET /a is slower than the previous build, 14ms → 100ms (+614%)",
+    ]
+    # the route which wasn't requested last time keeps its previous latency
+    assert smoke.previous == {"GET /a": 0.1, "GET /b": 0.0025, "GET /c": 0.01, "GET /d": 0.1}
+
+
+async def test_smoke_run(aiohttp_server, mocker):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.smoke.logger.warning")
+    delay = 0.0
+    headers = []
+
+    async def handler(request):
+        headers.append(request.headers.get(SMOKE_HEADER))
+        await asyncio.sleep(delay)
+        return web.Response(text="ok")
+
+    async def error(request):
+        raise web.HTTPInternalServerError()
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    app.router.add_post("/error", error)
+    server = await aiohttp_server(app)
+    url = str(server.make_url("/"))
+    smoke = SmokeBench([("GET", url + "?x=1"), ("POST", url + "error")], 50)
+    async with ClientSession() as session:
+        await smoke.run(session)
+        assert mock_warning.call_count == 0
+        assert headers == ["1"] * 11
+        assert set(smoke.previous) == {"GET /?x=1", "POST /error"}
+
+        delay = 0.01
+        await smoke.run(session)
+    warnings = _warnings(mock_warning)
+    assert len(warnings) == 1
+    assert warnings[0].startswith("smoke benchmark: GET /?x=1 is slower than the previous build, ")
+
+
+async def test_smoke_run_failed(mocker, unused_tcp_port_factory):
+    mock_warning = mocker.patch("aiohttp_devtools.runserver.smoke.logger.warning")
+    url = "http://localhost:{}/".format(unused_tcp_port_factory())
+    smoke = SmokeBench([("GET", url)], 50)
+    async with ClientSession() as session:
+        await smoke.run(session)
+    warnings = _warnings(mock_warning)
+    assert len(warnings) == 1
+    assert warnings[0].startswith("smoke benchmark: GET / failed, ClientConnectorError: ")
+    assert smoke.previous == {}
+
+
+def test_smoke_config(tmpworkdir):
+    mktree(tmpworkdir, SIMPLE_APP)
+    tmpworkdir.join("routes.txt").write("# routes\n/\nPOST /login\n")
+    config = Config(app_path="app.py", main_port=8080, smoke_routes="routes.txt")
+    assert config.smoke_targets == [("GET", "http://localhost:8080/"), ("POST", "http://localhost:8080/login")]
+    assert config.smoke_threshold == 50
+
+    tmpworkdir.join("routes.txt").write("foobar\n")
+    with pytest.raises(AiohttpDevConfigError, match='invalid smoke-routes file: "foobar" is not a url'):
+        Config(app_path="app.py", smoke_routes="routes.txt")
+
+
+def test_smoke_not_logged(mocker):
+    route_stats = RouteStats()
+    mocker.patch("aiohttp_devtools.runserver.log_handlers.route_stats", route_stats)
+    mock_logger = MagicMock()
+    request = make_mocked_request("GET", "/", headers={SMOKE_HEADER: "1"})
+    response = MagicMock(status=200, body_length=2, headers={})
+    AccessLogger(mock_logger, "").log(request, response, 0.01)
+    assert mock_logger.info.call_count == 0
+    assert route_stats.all() == {}
+
+
+async def test_smoke_cancelled_on_stop(tmpworkdir, mocker):
+    mktree(tmpworkdir, SIMPLE_APP)
+    tmpworkdir.join("routes.txt").write("/\n")
+    mock_process = mocker.patch("aiohttp_devtools.runserver.watch.Process")
+    mock_process.return_value.is_alive.return_value = False
+    app_task = AppTask(Config(app_path="app.py", root_path=str(tmpworkdir), smoke_routes="routes.txt"))
+    app_task._session = MagicMock()
+    started = asyncio.Event()
+
+    async def run(session, ssl):
+        started.set()
+        await asyncio.sleep(10)
+
+    mocker.patch.object(SmokeBench, "run", side_effect=run)
+    app_task._start_dev_server()
+    app_task._start_smoke_bench()
+    await started.wait()
+    smoke_task = app_task._smoke_task
+    assert smoke_task is not None
+    await app_task._stop_dev_server()
+    assert smoke_task.cancelled()
+    assert app_task._smoke_task is None
+
+
+async def test_smoke_when_live(tmpworkdir, aiohttp_server, mocker):
+    mktree(tmpworkdir, SIMPLE_APP)
+    tmpworkdir.join("routes.txt").write("/\n")
+    mocker.patch("aiohttp_devtools.runserver.watch.awatch", side_effect=create_awatch_mock({("x", "/app.py")}))
+    server = await aiohttp_server(web.Application())
+    config = Config(app_path="app.py", root_path=str(tmpworkdir), main_port=server.port, smoke_routes="routes.txt")
+    app_task = AppTask(config)
+    mocker.patch.object(app_task, "_start_dev_server")
+    mocker.patch.object(app_task, "_stop_dev_server")
+    mock_run = mocker.patch.object(SmokeBench, "run")
+    mock_src_reload = mocker.patch("aiohttp_devtools.runserver.watch.src_reload")
+    app = web.Application()
+    app[LAST_RELOAD] = [0, 0.]
+    ws: web.WebSocketResponse = MagicMock()
+    app[WS] = {(ws, "/")}
+    await app_task.start(app)
+    await app_task._task
+    # once the app has started and again after the restart, both only once it was responding
+    assert mock_run.call_count == 2
+    # browsers are only prompted to reload after the restart, not when the app first starts
+    mock_src_reload.assert_called_once_with(app)
+    assert app_task._session is not None
+    await app_task._session.close()
+
+    await server.close()
+    mock_run.reset_mock()
+    app_task._session = ClientSession()
+    assert await app_task._src_reload_when_live(2) is False
+    await app_task._session.close()
@@ -0,0 +1,185 @@
+import asyncio
+import gzip
+import os
+import threading
+
+import pytest
+
+from aiohttp_devtools.runserver.static_cache import Fingerprints, SingleFlight, StaticCache, negotiate_encoding
+
+
+@pytest.mark.parametrize("header,result", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0, deflate", None),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("*", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("GZIP", "gzip"),
+])
+def test_negotiate_encoding(header, result):
+    assert negotiate_encoding(header, ("zstd", "gzip")) == result
+
+
+def test_cache_reuse(tmp_path):
+    path = tmp_path / "foo.css"
+    path.write_text("a {}" * 100)
+    cache = StaticCache()
+    entry = cache.get(path)
+    assert entry is not None
+    assert cache.get(path) is entry
+    assert entry.encodings
+    assert gzip.decompress(entry.encoded("gzip")) == b"a {}" * 100
+
+
+def test_cache_snippet(tmp_path):
+    path = tmp_path / "index.html"
+    path.write_text("<h1>hi</h1>")
+    cache = StaticCache()
+    plain = cache.get(path)
+    injected = cache.get(path, b"<script>")
+    assert plain is not None and injected is not None
+    assert plain.body == b"<h1>hi</h1>"
+    assert injected.body == b"<h1>hi</h1><script>"
+    # too small to be worth compressing
+    assert injected.encodings == ()
+
+
+def test_cache_precompressed(tmp_path, mocker):
+    mocker.patch.dict("aiohttp_devtools.runserver.static_cache.ENCODERS", {"gzip": gzip.compress}, clear=True)
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"png")
+    (tmp_path / "logo.png.br").write_bytes(b"from br sibling")
+    stale = tmp_path / "logo.png.gz"
+    stale.write_bytes(b"stale")
+    os.utime(stale, (0, 0))
+    entry = StaticCache().get(path)
+    assert entry is not None
+    # offered even though the file is small, not compressible and brotli isn't installed
+    assert entry.encodings == ("br",)
+    assert entry.is_encoded("br")
+    assert entry.encoded("br") == b"from br sibling"
+
+
+def test_cache_modified(tmp_path):
+    path = tmp_path / "foo.js"
+    path.write_text("var a;")
+    cache = StaticCache()
+    entry = cache.get(path)
+    path.write_text("var ab;")
+    os.utime(path, ns=(0, 0))
+    assert cache.get(path) is not entry
+
+
+def test_cache_limits(tmp_path):
+    cache = StaticCache(max_size=10, max_file_size=8)
+    (tmp_path / "big").write_bytes(b"x" * 9)
+    assert cache.get(tmp_path / "big") is None
+    (tmp_path / "a").write_bytes(b"a" * 6)
+    (tmp_path / "b").write_bytes(b"b" * 6)
+    a = cache.get(tmp_path / "a")
+    cache.get(tmp_path / "b")
+    assert cache.get(tmp_path / "a") is not a
+
+
+def test_cache_invalidate(tmp_path):
+    path = tmp_path / "foo.js"
+    path.write_text("var a;")
+    cache = StaticCache()
+    entry = cache.get(path)
+    cache.invalidate([str(tmp_path / "other.js")])
+    assert cache.get(path) is entry
+    cache.invalidate([str(path) + ".gz"])
+    assert cache.get(path) is not entry
+    entry = cache.get(path)
+    cache.invalidate()
+    assert cache.get(path) is not entry
+
+
+def test_etags(tmp_path):
+    path = tmp_path / "foo.css"
+    path.write_text("a {}" * 100)
+    entry = StaticCache().get(path)
+    assert entry is not None
+    assert entry.etag(None) == entry.digest
+    assert entry.etag("gzip") == entry.digest + "-gzip"
+    other = tmp_path / "bar.css"
+    other.write_text("a {}" * 100)
+    assert StaticCache().get(other).digest == entry.digest  # type: ignore[union-attr]
+
+
+def test_fingerprints(tmp_path):
+    path = tmp_path / "foo.css"
+    path.write_text("a {}")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "bar.css").write_text("b {}")
+    fingerprints = Fingerprints(tmp_path)
+    assert fingerprints.get("foo.css") is None
+    fingerprints.update()
+    digest = fingerprints.get("/foo.css")
+    assert digest == StaticCache().get(path).digest  # type: ignore[union-attr]
+    assert fingerprints.get("foo.css?x=1") == digest
+    assert fingerprints.get("sub/bar.css") is not None
+    path.write_text("b {}")
+    # only changes the watcher reports are picked up
+    assert fingerprints.get("foo.css") == digest
+    fingerprints.update([str(path)])
+    assert fingerprints.get("foo.css") == fingerprints.get("sub/bar.css")
+    path.unlink()
+    fingerprints.update([str(path), str(tmp_path.parent / "outside.css")])
+    assert fingerprints.get("foo.css") is None
+    assert fingerprints.get("missing.css") is None
+
+
+def test_fingerprints_bounded(tmp_path):
+    for i in range(5):
+        (tmp_path / "{}.css".format(i)).write_text(str(i))
+    fingerprints = Fingerprints(tmp_path, max_files=3)
+    fingerprints.update()
+    assert sum(fingerprints.get("{}.css".format(i)) is not None for i in range(5)) == 3
+    (tmp_path / "new.css").write_text("new")
+    fingerprints.update([str(tmp_path / "new.css")])
+    assert fingerprints.get("new.css") is None
+
+
+def test_listing(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "b.txt").write_text("")
+    cache = StaticCache()
+    assert cache.listing(tmp_path) == (["b.txt", "sub/"], 2)
+    (tmp_path / "a.txt").write_text("")
+    cache.invalidate([str(tmp_path / "a.txt")])
+    assert cache.listing(tmp_path) == (["a.txt", "b.txt", "sub/"], 3)
+
+
+async def test_single_flight():
+    calls = []
+    release = threading.Event()
+
+    def load(name):
+        calls.append(name)
+        release.wait(1)
+        return name.upper()
+
+    flight: SingleFlight[str] = SingleFlight()
+    tasks = [asyncio.create_task(flight.run(k, load, k)) for k in ("a", "a", "b", "a")]
+    await asyncio.sleep(0.05)
+    assert len(flight) == 2
+    release.set()
+    assert await asyncio.gather(*tasks) == ["A", "A", "B", "A"]
+    assert sorted(calls) == ["a", "b"]
+    assert len(flight) == 0
+    assert await flight.run("a", load, "a") == "A"
+    assert len(calls) == 3
+
+
+async def test_single_flight_cancelled_waiter():
+    release = threading.Event()
+    flight: SingleFlight[int] = SingleFlight()
+    first = asyncio.create_task(flight.run("k", lambda: release.wait(1) and 42))
+    second = asyncio.create_task(flight.run("k", lambda: 0))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    release.set()
+    assert await second == 42
@@ -0,0 +1,250 @@
+import asyncio
+import gc
+from unittest.mock import MagicMock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.logs import fmt_duration
+from aiohttp_devtools.runserver import stats
+from aiohttp_devtools.runserver.log_handlers import AccessLogger
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.serve import modify_main_app
+from aiohttp_devtools.runserver.stats import GCStats, Histogram, RouteStats, log_route_stats
+
+from .conftest import SIMPLE_APP
+
+
+def test_histogram_percentiles():
+    hist = Histogram()
+    for ms in range(1, 101):
+        hist.add(ms / 1000, error=ms > 98)
+    assert hist.count == 100
+    assert hist.errors == 2
+    assert hist.max == 0.1
+    # buckets are ~9% wide, percentiles are the bucket's upper bound
+    assert 0.05 <= hist.percentile(50) <= 0.05 * 1.1
+    assert 0.095 <= hist.percentile(95) <= 0.095 * 1.1
+    assert hist.percentile(99) == hist.percentile(100) == 0.1
+
+
+def test_histogram_tiny_and_empty():
+    hist = Histogram()
+    assert hist.percentile(50) == 0
+    hist.add(0)
+    hist.add(1e-7)
+    assert hist.percentile(99) == 1e-7
+
+
+def test_histogram_merge():
+    a, b = Histogram(), Histogram()
+    a.add(0.001)
+    b.add(0.2, error=True)
+    a.merge(b)
+    assert (a.count, a.errors, a.max) == (2, 1, 0.2)
+    assert a.percentile(100) == 0.2
+
+
+async def _request(app, path, method="GET"):
+    request = make_mocked_request(method, path, app=app)
+    match_info = await app.router.resolve(request)
+    match_info.add_app(app)
+    request._match_info = match_info
+    return request
+
+
+async def test_route_stats_canonical():
+    async def handler(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get("/users/{id}", handler)
+    route_stats = RouteStats()
+    for path in ("/users/1", "/users/2", "/missing"):
+        route_stats.record(await _request(app, path), 200, 0.01)
+    route_stats.record(await _request(app, "/users/3"), 500, 0.2)
+
+    assert {r: h.count for r, h in route_stats.window.items()} == {"GET /users/{id}": 3, "GET (no route)": 1}
+    summary = route_stats.summary("title:")
+    assert summary is not None
+    title, header, slowest, fastest = summary.split("\n")
+    assert title == "title:"
+    assert header.split() == ["route", "count", "5xx", "p50", "p95", "p99", "max", "gc/req"]
+    assert slowest.split() == ["GET", "/users/{id}", "3", "1", "10ms", "200ms", "200ms", "200ms", "0.00ms"]
+    assert fastest.split() == ["GET", "(no", "route)", "1", "0", "10ms", "10ms", "10ms", "10ms", "0.00ms"]
+
+    # the window is reset after each summary, totals are kept
+    assert route_stats.summary("title:") is None
+    route_stats.record(await _request(app, "/users/4"), 200, 0.01)
+    totals = route_stats.summary("title:", totals=True)
+    assert totals is not None
+    assert totals.split("\n")[2].split()[:4] == ["GET", "/users/{id}", "4", "1"]
+
+
+async def test_route_stats_max_routes(mocker):
+    mocker.patch.object(stats, "MAX_SUMMARY_ROUTES", 2)
+    app = web.Application()
+    route_stats = RouteStats()
+    for method in ("GET", "POST", "PUT"):
+        route_stats.record(await _request(app, "/", method), 200, 0.01)
+    summary = route_stats.summary("title:")
+    assert summary is not None
+    assert summary.split("\n")[-1] == "  ...and 1 more routes"
+    assert len(summary.split("\n")) == 5
+
+
+def test_fmt_duration():
+    assert fmt_duration(0.00123) == "1.23ms"
+    assert fmt_duration(0.123) == "123ms"
+    assert fmt_duration(12.3) == "12.3s"
+
+
+async def test_access_logger_records(mocker):
+    route_stats = RouteStats()
+    mocker.patch("aiohttp_devtools.runserver.log_handlers.route_stats", route_stats)
+    request = await _request(web.Application(), "/foo", "POST")
+    response = MagicMock()
+    response.headers = {}
+    response.status = 200
+    response.body_length = 100
+    AccessLogger(MagicMock(), "").log(request, response, 0.15)
+    assert route_stats.window["POST (no route)"].count == 1
+
+
+async def test_access_logger_gc_pause(mocker):
+    route_stats = RouteStats()
+    mocker.patch("aiohttp_devtools.runserver.log_handlers.route_stats", route_stats)
+    mock_pauses = mocker.patch("aiohttp_devtools.runserver.log_handlers.gc_stats.pauses_during", return_value=(0.05, 2))
+    mock_logger = MagicMock()
+    request = await _request(web.Application(), "/foo")
+    response = MagicMock()
+    response.headers = {}
+    response.status = 200
+    response.body_length = 100
+    AccessLogger(mock_logger, "").log(request, response, 0.15)
+    assert route_stats.window["GET (no route)"].gc_total == 0.05
+    assert mock_logger.info.call_args[0][0] == "GET /foo 200 100B 150ms (gc 50ms gen2)"
+    mock_pauses.assert_called_once_with(0.15)
+
+
+async def test_log_route_stats(mocker):
+    route_stats = RouteStats()
+    mocker.patch.object(stats, "route_stats", route_stats)
+    mocker.patch.object(stats, "ROUTE_STATS_INTERVAL", 0.01)
+    mock_info = mocker.patch("aiohttp_devtools.runserver.stats.logger.info")
+
+    ctx = log_route_stats(web.Application())
+    await ctx.__anext__()
+    route_stats.record(await _request(web.Application(), "/foo"), 200, 0.01)
+    await asyncio.sleep(0.05)
+    assert mock_info.call_count == 1
+    assert mock_info.call_args[0][0].startswith("route latencies, last 0.01s:\n")
+
+    with pytest.raises(StopAsyncIteration):
+        await ctx.__anext__()
+    assert mock_info.call_count == 2
+    assert mock_info.call_args[0][0].startswith("route latencies since start:\n")
+
+
+async def test_route_stats_all():
+    route_stats = RouteStats()
+    app = web.Application()
+    route_stats.record(await _request(app, "/"), 200, 0.01)
+    route_stats.summary("title:")
+    route_stats.record(await _request(app, "/"), 500, 0.02)
+    routes = route_stats.all()
+    assert (routes["GET (no route)"].count, routes["GET (no route)"].errors) == (2, 1)
+    # the window isn't reset
+    assert route_stats.window["GET (no route)"].count == 1
+
+
+async def test_route_stats_gc():
+    route_stats = RouteStats()
+    app = web.Application()
+    route_stats.record(await _request(app, "/"), 200, 0.1, gc_pause=0.03)
+    route_stats.record(await _request(app, "/"), 200, 0.1, gc_pause=0.01)
+    summary = route_stats.summary("title:")
+    assert summary is not None
+    assert summary.split("\n")[2].split()[-1] == "20ms"
+
+
+def test_gc_stats_pauses_during(mocker):
+    gc_stats = GCStats()
+    mocker.patch("aiohttp_devtools.runserver.stats.time.perf_counter", return_value=100.0)
+    gc_stats.recent.extend([(95.0, 0.5, 2), (98.5, 0.01, 0), (99.5, 0.02, 1)])
+    assert gc_stats.pauses_during(0.1) == (0, -1)
+    assert gc_stats.pauses_during(1) == (0.02, 1)
+    assert gc_stats.pauses_during(2) == (0.03, 1)
+    assert gc_stats.pauses_during(10) == (0.53, 2)
+
+
+def test_gc_stats():
+    gc_stats = GCStats()
+    gc_stats.start()
+    gc_stats.start()
+    try:
+        assert gc.callbacks.count(gc_stats._callback) == 1
+        gc.collect(1)
+        gc.collect(2)
+    finally:
+        gc_stats.stop()
+    gc_stats.stop()
+    assert gc_stats._callback not in gc.callbacks
+    assert gc_stats.collections[1] == gc_stats.collections[2] == 1
+    assert 0 < gc_stats.pause_max[2] == gc_stats.pause_total[2]
+    # automatic gen 0 collections could also have happened
+    assert [gen for _, _, gen in gc_stats.recent if gen] == [1, 2]
+    pause, generation = gc_stats.pauses_during(60)
+    assert pause == pytest.approx(sum(gc_stats.pause_total))
+    assert generation == 2
+
+
+async def test_stats_endpoints(aiohttp_client, tmpworkdir, mocker):
+    route_stats = RouteStats()
+    mocker.patch.object(stats, "route_stats", route_stats)
+    mocker.patch.object(stats, "rss", return_value=1024)
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    modify_main_app(app, Config(app_path="app.py"))
+    client = await aiohttp_client(app)
+    route_stats.record(await _request(app, "/foo"), 200, 0.01)
+
+    async with client.get("/_devtools/stats") as r:
+        assert r.status == 200
+        data = await r.json()
+    assert data["uptime"] > 0
+    assert data["tasks"] >= 1
+    assert data["connections"] == 1
+    assert data["rss"] == 1024
+    assert [g["generation"] for g in data["gc"]] == [0, 1, 2]
+    assert set(data["gc"][0]) == {"generation", "collections", "collected", "timed_collections",
+                                  "pause_total", "pause_max"}
+    assert data["routes"] == {
+        "GET (no route)": {"count": 1, "errors": 0, "mean": 0.01, "gc_mean": 0, "p50": 0.01, "p95": 0.01,
+                           "p99": 0.01, "max": 0.01},
+    }
+
+    async with client.get("/_devtools/metrics") as r:
+        assert r.status == 200
+        assert r.content_type == "text/plain"
+        text = await r.text()
+    lines = text.split("\n")
+    assert lines[:3] == ["# HELP adev_uptime_seconds Seconds since the app started.",
+                         "# TYPE adev_uptime_seconds gauge", lines[2]]
+    assert lines[2].startswith("adev_uptime_seconds ")
+    assert "adev_connections 1" in lines
+    assert "adev_resident_memory_bytes 1024" in lines
+    assert "# TYPE adev_gc_collections_total counter" in lines
+    assert any(line.startswith('adev_gc_pause_seconds_total{generation="2"} ') for line in lines)
+    assert "# TYPE adev_request_duration_seconds summary" in lines
+    assert 'adev_request_duration_seconds{route="GET (no route)",quantile="0.95"} 0.01' in lines
+    assert 'adev_request_duration_seconds_count{route="GET (no route)"} 1' in lines
+    assert 'adev_request_errors_total{route="GET (no route)"} 0' in lines
+    assert 'adev_request_gc_seconds_total{route="GET (no route)"} 0.0' in lines
+    assert text.endswith("\n")
+
+
+def test_prometheus_escape():
+    assert stats._escape_label('GET /a"b\\c\n') == 'GET /a\\"b\\\\c\\n'
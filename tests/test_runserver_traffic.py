@@ -0,0 +1,102 @@
+import json
+
+from aiohttp import FormData, web
+from pytest_toolbox import mktree
+
+from aiohttp_devtools.runserver.config import Config
+from aiohttp_devtools.runserver.serve import modify_main_app
+from aiohttp_devtools.runserver.smoke import SMOKE_HEADER
+from aiohttp_devtools.runserver.traffic import REPLAY_HEADER
+
+from .conftest import SIMPLE_APP
+
+
+async def _echo(request):
+    return web.Response(body=await request.read())
+
+
+async def _missing(request):
+    raise web.HTTPNotFound()
+
+
+async def test_record_traffic(tmpworkdir, aiohttp_client):
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    app.router.add_post("/echo", _echo)
+    app.router.add_get("/missing", _missing)
+    modify_main_app(app, Config(app_path="app.py", record_traffic="traffic.ndjson"))
+    client = await aiohttp_client(app)
+
+    async with client.post("/echo?x=1", json={"a": 1}, headers={"X-Foo": "bar"}) as r:
+        assert await r.read() == b'{"a": 1}'
+    async with client.post("/echo", data=b"\xff\x00") as r:
+        assert await r.read() == b"\xff\x00"
+    async with client.get("/missing") as r:
+        assert r.status == 404
+    for headers in ({SMOKE_HEADER: "1"}, {REPLAY_HEADER: "1"}):
+        async with client.post("/echo", data=b"skipped", headers=headers) as r:
+            assert r.status == 200
+    async with client.get("/_devtools/stats") as r:
+        assert r.status == 200
+
+    lines = [json.loads(line) for line in tmpworkdir.join("traffic.ndjson").readlines()]
+    assert len(lines) == 3
+    first = lines[0]
+    assert first["method"] == "POST"
+    assert first["path"] == "/echo?x=1"
+    assert first["body"] == '{"a": 1}'
+    assert first["status"] == 200
+    assert 0 < first["duration"] < 1
+    headers = dict(first["headers"])
+    assert headers["X-Foo"] == "bar"
+    assert headers["Content-Type"] == "application/json"
+    assert "Host" not in headers and "Content-Length" not in headers
+    assert lines[1]["body64"] == "/wA="
+    assert "body" not in lines[1]
+    assert (lines[2]["path"], lines[2]["status"], lines[2]["body"]) == ("/missing", 404, "")
+
+
+async def test_record_traffic_streamed_bodies(tmpworkdir, aiohttp_client):
+    mktree(tmpworkdir, SIMPLE_APP)
+
+    async def upload(request):
+        reader = await request.multipart()
+        part = await reader.next()
+        return web.Response(text="{} {}".format(part.name, (await part.read()).decode()))
+
+    async def stream(request):
+        return web.Response(body=await request.content.read())
+
+    app = web.Application()
+    app.router.add_post("/upload", upload)
+    app.router.add_post("/stream", stream)
+    modify_main_app(app, Config(app_path="app.py", record_traffic="traffic.ndjson"))
+    client = await aiohttp_client(app)
+
+    form = FormData()
+    form.add_field("file", b"hello", filename="hello.txt")
+    async with client.post("/upload", data=form) as r:
+        assert r.status == 200
+        assert await r.text() == "file hello"
+
+    async def chunks():
+        yield b"abc"
+        yield b"def"
+
+    async with client.post("/stream", data=chunks()) as r:
+        assert r.status == 200
+        assert await r.read() == b"abcdef"
+    assert tmpworkdir.join("traffic.ndjson").read() == ""
+
+
+async def test_record_traffic_disabled(tmpworkdir, aiohttp_client):
+    mktree(tmpworkdir, SIMPLE_APP)
+    app = web.Application()
+    app.router.add_post("/echo", _echo)
+    config = Config(app_path="app.py")
+    assert config.record_traffic is None
+    modify_main_app(app, config)
+    client = await aiohttp_client(app)
+    async with client.post("/echo", data=b"x") as r:
+        assert r.status == 200
+    assert tmpworkdir.listdir(fil="*.ndjson") == []
@@ -36,7 +36,7 @@ async def test_single_file_change(mocker):
     mocked_awatch.side_effect = create_awatch_mock()
     mock_src_reload = mocker.patch('aiohttp_devtools.runserver.watch.src_reload', return_value=create_future())
 
-    app = MagicMock()
+    app = MagicMock(smoke_targets=[])
     app_task = AppTask(app)
     start_mock = mocker.patch.object(app_task, "_start_dev_server", autospec=True)
     stop_mock = mocker.patch.object(app_task, "_stop_dev_server", autospec=True)
@@ -58,7 +58,7 @@ async def test_single_file_change_no_static_path(mocker):
     mocked_awatch.side_effect = create_awatch_mock({("x", "/path/to/file")})
     mock_src_reload = mocker.patch("aiohttp_devtools.runserver.watch.src_reload", autospec=True, spec_set=True)
 
-    app_task = AppTask(MagicMock())
+    app_task = AppTask(MagicMock(smoke_targets=[]))
     start_mock = mocker.patch.object(app_task, "_start_dev_server", autospec=True, spec_set=True)
     mocker.patch.object(app_task, "_stop_dev_server", autospec=True, spec_set=True)
 
@@ -78,7 +78,7 @@ async def test_multiple_file_change(mocker):
     mocked_awatch = mocker.patch('aiohttp_devtools.runserver.watch.awatch')
     mocked_awatch.side_effect = create_awatch_mock({('x', '/path/to/file'), ('x', '/path/to/file2')})
     mock_src_reload = mocker.patch('aiohttp_devtools.runserver.watch.src_reload', return_value=create_future())
-    app_task = AppTask(MagicMock())
+    app_task = AppTask(MagicMock(smoke_targets=[]))
     start_mock = mocker.patch.object(app_task, "_start_dev_server", autospec=True)
     mocker.patch.object(app_task, "_stop_dev_server", autospec=True)
 
@@ -100,6 +100,7 @@ async def test_python_no_server(mocker):
     config.main_port = 8000
     config.protocol = "http"
     config.client_ssl_context = None
+    config.smoke_targets = []
 
     app_task = AppTask(config)
     start_mock = mocker.patch.object(app_task, "_start_dev_server", autospec=True)
@@ -213,7 +214,7 @@ async def test_stop_process_dirty(mocker):
 async def test_restart_after_connection_loss(mocker):
     mocked_awatch = mocker.patch("aiohttp_devtools.runserver.watch.awatch", autospec=True, spec_set=True)
     mocked_awatch.side_effect = create_awatch_mock({("x", "/path/to/file.py")})
-    app_task = AppTask(MagicMock())
+    app_task = AppTask(MagicMock(smoke_targets=[]))
     start_mock = mocker.patch.object(app_task, "_start_dev_server", autospec=True, spec_set=True)
     mock_reload = mocker.patch.object(app_task, "_src_reload_when_live", autospec=True, spec_set=True)
     mocker.patch.object(app_task, "_stop_dev_server", autospec=True, spec_set=True)
@@ -1,7 +1,14 @@
+import asyncio
+import gzip
+import pathlib
+import time
+
 import pytest
 from pytest_toolbox import mktree
 
 from aiohttp_devtools.runserver import serve_static
+from aiohttp_devtools.runserver.serve import STATIC_CACHE, create_auxiliary_app, invalidate_static
+from aiohttp_devtools.runserver.static_cache import Fingerprints
 
 
 @pytest.fixture
@@ -77,3 +84,134 @@ async def test_serve_index(aiohttp_client, tmpworkdir):
     assert r.headers['content-type'] == 'text/html'
     text = await r.text()
     assert text == '<h1>hello index</h1>'
+
+
+async def test_gzip_livereload_html(aiohttp_client, tmpworkdir):
+    args = serve_static(static_path=str(tmpworkdir), livereload=True)
+    cli = await aiohttp_client(args["app"])
+    mktree(tmpworkdir, {
+        "foo.html": "<h1>{}</h1>".format("hi " * 200),
+    })
+    r = await cli.get("/foo.html", headers={"Accept-Encoding": "gzip"})
+    assert r.status == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["Vary"] == "Accept-Encoding"
+    text = await r.text()
+    assert text.endswith('</h1>\n<script src="/livereload.js"></script>\n')
+
+    r = await cli.get("/foo.html", headers={"Accept-Encoding": "identity"})
+    assert r.status == 200
+    assert "Content-Encoding" not in r.headers
+    assert (await r.text()).startswith("<h1>hi hi")
+
+
+async def test_precompressed_sibling(cli, tmpworkdir):
+    mktree(tmpworkdir, {"app.js": "var a = 1;\n" * 100})
+    tmpworkdir.join("app.js.gz").write_binary(gzip.compress(b"from sibling"))
+    r = await cli.get("/app.js", headers={"Accept-Encoding": "gzip"})
+    assert r.status == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert await r.text() == "from sibling"
+
+
+async def test_concurrent_reads_shared(cli, tmpworkdir, mocker):
+    mktree(tmpworkdir, {"app.js": "var a = 1;\n" * 100})
+    cache = cli.server.app[STATIC_CACHE]
+    cache_get = cache.get
+
+    def slow_get(*args):
+        time.sleep(0.1)
+        return cache_get(*args)
+
+    get = mocker.patch.object(cache, "get", side_effect=slow_get)
+    headers = ("gzip", "gzip, deflate", "deflate, gzip;q=0.5", "identity")
+    rs = await asyncio.gather(*(cli.get("/app.js", headers={"Accept-Encoding": h}) for h in headers))
+    assert [r.headers.get("Content-Encoding") for r in rs] == ["gzip", "gzip", "gzip", None]
+    assert {await r.text() for r in rs} == {"var a = 1;\n" * 100}
+    # different Accept-Encoding headers still share the read
+    assert get.call_count == 1
+
+
+async def test_cache_invalidated(cli, tmpworkdir):
+    mktree(tmpworkdir, {"foo.css": "a {}"})
+    r = await cli.get("/foo.css")
+    assert await r.text() == "a {}"
+    cache = cli.server.app[STATIC_CACHE]
+    tmpworkdir.join("foo.css").write("b {}")
+    invalidate_static(cli.server.app, {("modified", str(tmpworkdir.join("foo.css")))})
+    r = await cli.get("/foo.css")
+    assert await r.text() == "b {}"
+    assert cache.get(pathlib.Path(tmpworkdir.join("foo.css")).resolve()).body == b"b {}"
+
+
+async def test_livereload_js_gzip(aiohttp_client, tmpworkdir):
+    args = serve_static(static_path=str(tmpworkdir), livereload=True)
+    cli = await aiohttp_client(args["app"])
+    r = await cli.get("/livereload.js", headers={"Accept-Encoding": "gzip"})
+    assert r.status == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["content-type"] == "application/javascript"
+
+
+async def test_etag_revalidation(aiohttp_client, tmpworkdir):
+    args = serve_static(static_path=str(tmpworkdir), livereload=True, browser_cache=True)
+    cli = await aiohttp_client(args["app"])
+    mktree(tmpworkdir, {"foo.html": "<h1>hi</h1>"})
+    r = await cli.get("/foo.html")
+    assert r.status == 200
+    etag = r.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith('W/')
+
+    r = await cli.get("/foo.html", headers={"If-None-Match": etag})
+    assert r.status == 304
+    assert r.headers["ETag"] == etag
+
+    # a second save within the same second must not be served from the browser's cache
+    tmpworkdir.join("foo.html").write("<h1>bye</h1>")
+    r = await cli.get("/foo.html", headers={"If-None-Match": etag, "If-Modified-Since": r.headers["Last-Modified"]})
+    assert r.status == 200
+    assert r.headers["ETag"] != etag
+    assert (await r.text()).startswith("<h1>bye</h1>")
+
+
+async def test_livereload_js_if_modified_since(aiohttp_client, tmpworkdir):
+    args = serve_static(static_path=str(tmpworkdir), livereload=True)
+    cli = await aiohttp_client(args["app"])
+    r = await cli.get("/livereload.js", headers={"If-Modified-Since": "Fri, 01 Jan 2016 00:00:00 GMT"})
+    assert r.status == 304
+    r = await cli.get("/livereload.js", headers={"If-Modified-Since": "Thu, 31 Dec 2015 00:00:00 GMT"})
+    assert r.status == 200
+    r = await cli.get("/livereload.js", headers={"If-None-Match": '"other"'})
+    assert r.status == 200
+    r = await cli.get("/livereload.js", headers={"If-None-Match": r.headers["ETag"]})
+    assert r.status == 304
+
+
+async def test_fingerprinted_immutable(aiohttp_client, tmpworkdir):
+    app = create_auxiliary_app(static_path=str(tmpworkdir), livereload=False, fingerprint_static=True)
+    cli = await aiohttp_client(app)
+    mktree(tmpworkdir, {"app.css": "a {}"})
+    fingerprints = Fingerprints(pathlib.Path(tmpworkdir))
+    fingerprints.update()
+    digest = fingerprints.get("app.css")
+    r = await cli.get("/app.css", params={"v": digest})
+    assert r.status == 200
+    assert r.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+    r = await cli.get("/app.css", params={"v": "outdated"})
+    assert r.status == 200
+    assert r.headers["Cache-Control"] == "no-cache"
+
+
+async def test_file_missing_large_directory(cli, tmpworkdir):
+    mktree(tmpworkdir, {"dir": {"f{:03}".format(i): "" for i in range(250)}})
+    r = await cli.get("/dir/missing")
+    assert r.status == 404
+    text = await r.text()
+    assert "Available files under 'dir/':\n dir/f000\n" in text
+    assert " dir/f199\n ... and 50 more\n" in text
+    assert "f200" not in text
+
+    tmpworkdir.join("dir", "a_new_file").write("")
+    r = await cli.get("/dir/missing")
+    assert "dir/a_new_file\n" in await r.text()